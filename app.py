@@ -1,6 +1,9 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
+from autenticacao import autenticar, gerar_hash, indice_usuarios, tokens, restaurar_sessao, encerrar_sessoes, PARAMETRO_SESSAO
+from dados import fila_escrita
+from esquemas import carregar_aba, erros_validacao
+from metricas import metricas, medir, SEGUNDO_PLANO
 
 # 1. CONFIGURAÇÃO DA PÁGINA
 st.set_page_config(
@@ -9,6 +12,7 @@ st.set_page_config(
     layout="wide",
     initial_sidebar_state="expanded"
 )
+metricas().nova_execucao()
 
 # 2. INICIALIZAÇÃO DO ESTADO DA SESSÃO
 if "logado" not in st.session_state:
@@ -19,20 +23,36 @@ if "nivel" not in st.session_state:
     st.session_state["nivel"] = "operador"
 if "paginas_permitidas" not in st.session_state:
     st.session_state["paginas_permitidas"] = []
+if "token_sessao" not in st.session_state:
+    st.session_state["token_sessao"] = ""
 
-# 3. CONEXÃO COM O GOOGLE SHEETS
-URL_PLANILHA = "https://docs.google.com/spreadsheets/d/1lIldvBHzJ3VIczDvZv-WRFtp3R7Jf5yfM2LrIlseshE/edit?usp=sharing"
-conn = st.connection("gsheets", type=GSheetsConnection)
+# --- SESSÃO (LOGIN, TOKEN NO ENDEREÇO E SAÍDA) ---
+def iniciar_sessao(registro, token=None):
+    st.session_state["logado"] = True
+    st.session_state["usuario_nome"] = registro["usuario"]
+    st.session_state["nivel"] = registro["nivel"]
+    st.session_state["paginas_permitidas"] = list(registro["paginas"])
+    st.session_state["token_sessao"] = token or tokens().emitir(registro)
 
-# --- FUNÇÃO DE CARREGAMENTO DE USUÁRIOS ---
-@st.cache_data(ttl=300)
-def buscar_usuarios():
-    try:
-        df = conn.read(spreadsheet=URL_PLANILHA, worksheet="Usuarios").fillna("")
-        return df
-    except Exception as e:
-        st.error(f"Erro ao conectar com a base de dados: {e}")
-        return pd.DataFrame()
+
+def encerrar_sessao():
+    if st.session_state["token_sessao"]:
+        # Só o token deste aparelho: contas compartilhadas continuam logadas nos outros
+        tokens().revogar(st.session_state["token_sessao"])
+    st.query_params.pop(PARAMETRO_SESSAO, None)
+    st.session_state["logado"] = False
+    st.session_state["token_sessao"] = ""
+
+
+# Reconexão ou F5: o token do endereço restaura o login (nível e páginas vêm
+# do índice de usuários em cache, não do token)
+if not st.session_state["logado"] and PARAMETRO_SESSAO in st.query_params:
+    token = st.query_params[PARAMETRO_SESSAO]
+    registro = restaurar_sessao(token)
+    if registro:
+        iniciar_sessao(registro, token)
+    else:
+        st.query_params.pop(PARAMETRO_SESSAO, None)
 
 # --- TELA DE LOGIN ---
 def tela_login():
@@ -41,29 +61,23 @@ def tela_login():
     
     with col2:
         st.title("🔐 Login")
-        df_u = buscar_usuarios()
+        try:
+            usuarios = indice_usuarios()
+        except Exception as e:
+            st.error(f"Erro ao conectar com a base de dados: {e}")
+            usuarios = {}
         
         with st.form("login_form"):
             u_input = st.text_input("Usuário").strip().lower()
             s_input = st.text_input("Senha", type="password").strip()
             
             if st.form_submit_button("Entrar", use_container_width=True):
-                if not df_u.empty:
-                    df_u['usuario'] = df_u['usuario'].astype(str).str.strip().str.lower()
-                    df_u['senha'] = df_u['senha'].astype(str).str.strip()
-                    
-                    user_match = df_u[(df_u['usuario'] == u_input) & (df_u['senha'] == s_input)]
+                if usuarios:
+                    registro = autenticar(u_input, s_input)
                     
-                    if not user_match.empty:
-                        st.session_state["logado"] = True
-                        st.session_state["usuario_nome"] = str(user_match.iloc[0]['usuario'])
-                        st.session_state["nivel"] = str(user_match.iloc[0].get('nivel', 'operador')).lower()
-                        
-                        # NOVO: Carrega a lista de páginas permitidas da planilha
-                        paginas_str = str(user_match.iloc[0].get('paginas', ''))
-                        st.session_state["paginas_permitidas"] = [p.strip().lower() for p in paginas_str.split(",") if p.strip()]
-                        
-                        st.cache_data.clear()
+                    if registro:
+                        # Só a sessão muda: o cache das abas continua valendo para todos
+                        iniciar_sessao(registro)
                         st.rerun()
                     else:
                         st.error("❌ Usuário ou senha incorretos.")
@@ -73,7 +87,7 @@ def tela_login():
 # --- PÁGINA DE GESTÃO DE USUÁRIOS ---
 def pagina_gestao():
     st.title("👥 Gerenciamento de Usuários")
-    df_u = conn.read(spreadsheet=URL_PLANILHA, worksheet="Usuarios", ttl=0).fillna("")
+    df_u = carregar_aba("Usuarios")
     
     col_cad, col_rem = st.columns(2)
     
@@ -89,11 +103,14 @@ def pagina_gestao():
             if st.form_submit_button("Salvar Novo Usuário"):
                 if n_u and n_s:
                     paginas_finais = ",".join(n_p)
-                    novo_df = pd.concat([df_u, pd.DataFrame([{"usuario": n_u, "senha": n_s, "nivel": n_v, "paginas": paginas_finais}])], ignore_index=True)
-                    conn.update(spreadsheet=URL_PLANILHA, worksheet="Usuarios", data=novo_df)
-                    st.cache_data.clear()
-                    st.success(f"Usuário {n_u} cadastrado!")
-                    st.rerun()
+                    novo_usuario = pd.DataFrame([{"usuario": n_u, "senha": gerar_hash(n_s), "nivel": n_v, "paginas": paginas_finais}])
+                    if n_u in df_u['usuario'].astype(str).tolist():
+                        st.error(f"O usuário {n_u} já existe.")
+                    else:
+                        # chave: recusa (na fila) se outra sessão cadastrar o mesmo usuário
+                        fila_escrita().anexar("Usuarios", novo_usuario, chave="usuario")
+                        st.success(f"Usuário {n_u} cadastrado!")
+                        st.rerun()
                 else:
                     st.error("Preencha todos os campos.")
     
@@ -106,17 +123,95 @@ def pagina_gestao():
             if user_del == "admin" or user_del == st.session_state["usuario_nome"]:
                 st.error("Por segurança, não é possível remover o administrador principal ou sua própria conta.")
             else:
-                df_n = df_u[df_u['usuario'] != user_del]
-                conn.update(spreadsheet=URL_PLANILHA, worksheet="Usuarios", data=df_n)
-                st.cache_data.clear()
+                fila_escrita().excluir("Usuarios", "usuario", [user_del])
                 st.success(f"Usuário {user_del} removido.")
                 st.rerun()
 
+        st.subheader("🔒 Encerrar Sessões")
+        user_sair = st.selectbox("Usuário", lista_users, key="user_encerrar")
+        # Vale para todos os aparelhos e também depois de reiniciar o app
+        if st.button("Encerrar sessões em todos os aparelhos"):
+            encerrar_sessoes(user_sair)
+            st.success(f"Sessões de {user_sair} encerradas; o próximo acesso pede login.")
+
+# --- GRAVAÇÕES EM SEGUNDO PLANO (FILA) ---
+@st.fragment(run_every=3)
+def painel_gravacoes():
+    fila = fila_escrita()
+    pendentes = fila.pendentes()
+    if pendentes:
+        repetindo = [g for g in pendentes if g.erro]
+        st.caption(f"⏳ {len(pendentes)} gravação(ões) na fila")
+        if repetindo:
+            st.caption(f"🔁 Tentativa {repetindo[0].tentativas}: {repetindo[0].erro}")
+
+    # Cada um vê as próprias falhas; o admin vê todas
+    admin = st.session_state["nivel"] == "admin"
+    for g in [g for g in fila.falhas if admin or g.autor == st.session_state["usuario_nome"]]:
+        st.error(f"Não gravado — {g.descricao()}\n\n{g.erro}")
+        c1, c2 = st.columns(2)
+        if c1.button("🔁 Repetir", key=f"repetir_{g.id}", use_container_width=True):
+            fila.tentar_novamente(g.id)
+            st.rerun(scope="fragment")
+        if c2.button("🗑️ Descartar", key=f"descartar_{g.id}", use_container_width=True):
+            fila.descartar(g.id)
+            st.rerun(scope="fragment")
+
+
+# --- DESEMPENHO (SÓ ADMIN): ETAPAS DA ÚLTIMA EXECUÇÃO, API E CACHE ---
+def _tabela_etapas(etapas):
+    linhas = [{"etapa": e, "vezes": n, "total ms": round(t * 1000, 1), "máx ms": round(m * 1000, 1)} for e, (n, t, m) in etapas.items()]
+    return pd.DataFrame(linhas).sort_values("total ms", ascending=False) if linhas else pd.DataFrame()
+
+
+def painel_desempenho():
+    etapas, contadores, execucoes = metricas().resumo()
+    with st.expander("📊 Desempenho"):
+        if execucoes:
+            _, ultima = execucoes[-1]
+            linhas = [{"etapa": "· " * nivel + etapa, "ms": round(d * 1000, 1)} for nivel, etapa, d in ultima]
+            # O que a página gastou fora das etapas medidas (widgets, filtros na tela...)
+            pagina = next((d for nivel, etapa, d in ultima if nivel == 0 and etapa.startswith("página")), None)
+            if pagina is not None:
+                medido = sum(d for nivel, _, d in ultima if nivel == 1)
+                linhas.append({"etapa": "· widgets e demais código", "ms": round((pagina - medido) * 1000, 1)})
+            st.caption("Última execução")
+            st.dataframe(pd.DataFrame(linhas), hide_index=True, use_container_width=True)
+
+        leituras, falhas = contadores["cache_leituras"], contadores["cache_falhas"]
+        c1, c2 = st.columns(2)
+        c1.metric("Chamadas à API", contadores["api_google"])
+        c2.metric("Cache de abas", f"{leituras - falhas}/{leituras}", help="acertos / leituras nesta sessão")
+        st.caption(f"↓ {contadores['bytes_recebidos'] / 1024:.0f} KB · ↑ {contadores['bytes_enviados'] / 1024:.0f} KB · "
+                   f"{contadores['gravacoes_enfileiradas']} gravação(ões) enfileirada(s)")
+        st.caption("Etapas da sessão")
+        st.dataframe(_tabela_etapas(etapas), hide_index=True, use_container_width=True)
+
+        etapas_proc, contadores_proc, _ = metricas().resumo(SEGUNDO_PLANO)
+        st.caption(f"Segundo plano (fila e observadores): {contadores_proc['api_google']} chamada(s) à API, "
+                   f"↓ {contadores_proc['bytes_recebidos'] / 1024:.0f} KB")
+        st.dataframe(_tabela_etapas(etapas_proc), hide_index=True, use_container_width=True)
+
+
+def painel_validacao():
+    erros = erros_validacao()
+    if erros:
+        with st.expander(f"🧪 Dados inválidos ({sum(len(m) for m in erros.values())})"):
+            for aba, mensagens in erros.items():
+                st.markdown(f"**{aba}**")
+                for mensagem in mensagens:
+                    st.caption(mensagem)
+
+
 # --- LÓGICA DE NAVEGAÇÃO ---
 if not st.session_state["logado"]:
     tela_login()
     st.markdown("<style>[data-testid='stSidebar'] {display: none;}</style>", unsafe_allow_html=True)
 else:
+    # Mantém o token no endereço (a troca de página pode limpá-lo)
+    if st.session_state["token_sessao"] and st.query_params.get(PARAMETRO_SESSAO) != st.session_state["token_sessao"]:
+        st.query_params[PARAMETRO_SESSAO] = st.session_state["token_sessao"]
+
     # 1. Mapa de Todas as Páginas Disponíveis
     mapa_paginas = {
         "estoque": st.Page("pages/estoque.py", title="Estoque", icon="📦"),
@@ -140,7 +235,7 @@ else:
     if not menu_paginas:
         st.error("Você não tem acesso a nenhuma página. Fale com o admin.")
         if st.sidebar.button("Sair"):
-            st.session_state["logado"] = False
+            encerrar_sessao()
             st.rerun()
     else:
         navigation = st.navigation(menu_paginas)
@@ -151,12 +246,17 @@ else:
             st.markdown(f"### Bem-vindo, **{st.session_state['usuario_nome'].capitalize()}**")
             st.info(f"Nível: {st.session_state['nivel'].upper()}")
             st.divider()
+            painel_gravacoes()
+            if st.session_state["nivel"] == "admin":
+                painel_desempenho()
+                painel_validacao()
             if st.button("🚪 Sair", use_container_width=True):
-                st.session_state["logado"] = False
+                encerrar_sessao()
                 st.rerun()
 
         # 4. Execução
         try:
-            navigation.run()
+            with medir(f"página: {navigation.title}"):
+                navigation.run()
         except Exception as e:
             st.error(f"Erro ao carregar a interface: {e}")
\ No newline at end of file
@@ -0,0 +1,73 @@
+import streamlit as st
+import pandas as pd
+from dados import anexar_linhas, cabecalho_aba, excluir_linhas, listar_abas, fila_escrita
+from esquemas import carregar_aba, aplicar_esquema
+from gspread.exceptions import WorksheetNotFound
+
+# ARQUIVO DE PEDIDOS CONCLUÍDOS (UMA ABA POR MÊS)
+# A aba Pedidos guarda só o trabalho em aberto; o que foi concluído vai
+# para Pedidos_AAAAMM, conforme o mês do pedido.
+STATUS_ABERTOS = ["Pendente", "Em Separação"]
+STATUS_CONCLUIDO = "Concluído"
+PREFIXO_ARQUIVO = "Pedidos_"
+
+
+def aba_arquivo(periodo):
+    return f"{PREFIXO_ARQUIVO}{periodo}"
+
+
+def periodo_pedido(id_pedido):
+    """AAAAMM do pedido (o id é gerado como AAAAMMDDHHMM)."""
+    return pd.Series(id_pedido, dtype=str).str.strip().str[:6]
+
+
+def concluidos(df_s):
+    """Linhas de pedidos que já saíram do fluxo (qualquer status fora dos abertos)."""
+    status = df_s['status'].astype(str).replace("", STATUS_ABERTOS[0])
+    return ~status.isin(STATUS_ABERTOS)
+
+
+def arquivar_concluidos(df_s):
+    """
+    Move os pedidos concluídos para as abas mensais e remove suas linhas
+    da aba Pedidos. Retorna a quantidade de pedidos arquivados.
+    """
+    fechados = concluidos(df_s)
+    if not fechados.any():
+        return 0
+
+    # Gravações pendentes desses pedidos chegam à planilha antes de movê-los
+    fila_escrita().aguardar()
+    ids = df_s.loc[fechados, 'id_pedido'].unique()
+    arquivar = df_s[df_s['id_pedido'].isin(ids)]
+    periodos = periodo_pedido(arquivar['id_pedido']).to_numpy()
+    # A ordem importa: grava primeiro no arquivo; se a regravação falhar,
+    # o pior caso é o pedido aparecer nos dois lugares, nunca sumir.
+    for periodo, linhas in arquivar.groupby(periodos, sort=True):
+        # so_novas: pedido já arquivado por outra sessão não é duplicado
+        anexar_linhas(aba_arquivo(periodo), linhas, criar=True, chave='id_pedido', so_novas=True)
+        # Aba do mês sem alguma coluna do pedido: não remove nada de Pedidos
+        faltam = [c for c in linhas.columns if c not in cabecalho_aba(aba_arquivo(periodo))]
+        if faltam:
+            raise ValueError(f"A aba {aba_arquivo(periodo)} ficou sem as colunas {', '.join(faltam)}; os pedidos continuam em Pedidos.")
+    excluir_linhas("Pedidos", "id_pedido", ids)
+    return len(ids)
+
+
+@st.cache_data(ttl=300, max_entries=4, show_spinner=False)
+def periodos_arquivados(token):
+    """Meses (AAAAMM) que já têm aba de arquivo, do mais recente ao mais antigo."""
+    try:
+        abas = listar_abas(PREFIXO_ARQUIVO)
+    except Exception:
+        return []
+    periodos = [a[len(PREFIXO_ARQUIVO):] for a in abas]
+    return sorted((p for p in periodos if len(p) == 6 and p.isdigit()), reverse=True)
+
+
+def ler_arquivo(periodo):
+    """Pedidos arquivados de um mês (vazio se a aba não existir)."""
+    try:
+        return carregar_aba(aba_arquivo(periodo), esquema="Pedidos")
+    except WorksheetNotFound:
+        return aplicar_esquema(None, "Pedidos")
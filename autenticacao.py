@@ -0,0 +1,219 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+import streamlit as st
+from dados import fila_escrita, versao
+from esquemas import carregar_aba
+
+# AUTENTICAÇÃO: ÍNDICE DE USUÁRIOS E SENHAS COM HASH
+# O índice usuário -> registro é montado uma vez por versão da aba Usuarios
+# (cache compartilhado); o login só consulta o dicionário e grava na sessão.
+# Senhas novas vão para a planilha como "pbkdf2_sha256$iterações$sal$hash";
+# as antigas, em texto puro, continuam valendo (hash calculado no primeiro login).
+ALGORITMO = "pbkdf2_sha256"
+ITERACOES = 100_000
+# Sal do processo para as senhas em texto puro da planilha (não sai da memória)
+_SAL_PROCESSO = os.urandom(16)
+
+# Sessões persistentes: token assinado no endereço (?sessao=...), para que uma
+# reconexão ou F5 do tablet não peça login de novo nem releia a aba Usuarios.
+PARAMETRO_SESSAO = "sessao"
+VALIDADE_TOKEN = 12 * 3600     # um turno
+
+
+def _pbkdf2(senha, sal, iteracoes):
+    return hashlib.pbkdf2_hmac("sha256", senha.encode("utf-8"), sal, iteracoes)
+
+
+def gerar_hash(senha):
+    """Texto a gravar na coluna senha da planilha."""
+    sal = os.urandom(16)
+    return f"{ALGORITMO}${ITERACOES}${sal.hex()}${_pbkdf2(senha, sal, ITERACOES).hex()}"
+
+
+def _verificador(senha_planilha):
+    """(sal, iterações, hash) da senha gravada com gerar_hash; None se for texto puro."""
+    partes = senha_planilha.split("$")
+    if len(partes) == 4 and partes[0] == ALGORITMO:
+        try:
+            return bytes.fromhex(partes[2]), int(partes[1]), bytes.fromhex(partes[3])
+        except ValueError:
+            pass
+    return None
+
+
+# Senhas antigas, em texto puro: o hash (mesmo custo do gravado, para o tempo
+# do login não distinguir um caso do outro) só é calculado no primeiro login
+# do usuário e vale entre versões da aba. Chave: (usuário, senha da planilha).
+_verificadores_texto = {}
+
+
+def _verificador_texto(usuario, senha_planilha):
+    chave = (usuario, senha_planilha)
+    if chave not in _verificadores_texto:
+        _verificadores_texto[chave] = (_SAL_PROCESSO, ITERACOES, _pbkdf2(senha_planilha, _SAL_PROCESSO, ITERACOES))
+    return _verificadores_texto[chave]
+
+
+# Usuário inexistente compara com este, para o tempo de resposta não revelar quem existe
+_VERIFICADOR_FALSO = _verificador(gerar_hash(os.urandom(8).hex()))
+
+
+@st.cache_resource(ttl=3600, max_entries=2, show_spinner=False)
+def _indice(token):
+    """
+    ({usuário: registro}, {usuário: senha em texto puro}). Objeto compartilhado
+    (não é copiado a cada login): quem usa não altera.
+    """
+    df_u = carregar_aba("Usuarios")
+    indice, textos = {}, {}
+    colunas = ["usuario", "senha", "nivel", "paginas", "sessao_desde"]
+    for usuario, senha, nivel, paginas, sessao_desde in df_u[colunas].itertuples(index=False):
+        chave = usuario.lower()
+        if chave and senha:
+            indice[chave] = {
+                "usuario": chave,
+                "nome": usuario,                    # como está na planilha
+                "sessao_desde": float(sessao_desde),
+                "verificador": _verificador(senha),
+                "nivel": nivel.lower() or "operador",
+                "paginas": [p.strip().lower() for p in paginas.split(",") if p.strip()],
+            }
+            if indice[chave]["verificador"] is None:
+                textos[chave] = senha
+    return indice, textos
+
+
+def indice_usuarios():
+    """{usuário em minúsculas: registro}, atualizado junto com a aba Usuarios."""
+    return _indice(versao("Usuarios"))[0]
+
+
+def autenticar(usuario, senha):
+    """Registro do usuário se a senha confere; senão None."""
+    indice, textos = _indice(versao("Usuarios"))
+    registro = indice.get(usuario.strip().lower())
+    if registro is None:
+        sal, iteracoes, esperado = _VERIFICADOR_FALSO
+    else:
+        sal, iteracoes, esperado = registro["verificador"] or _verificador_texto(registro["usuario"], textos[registro["usuario"]])
+    confere = hmac.compare_digest(_pbkdf2(senha, sal, iteracoes), esperado)
+    return registro if registro and confere else None
+
+
+# --- TOKENS DE SESSÃO ---
+def _segredo():
+    """
+    Chave de assinatura: SEGREDO_SESSAO ou `segredo` em [autenticacao] no
+    secrets.toml. Sem ela, uma chave aleatória do processo (os tokens deixam
+    de valer quando o app reinicia).
+    """
+    segredo = os.environ.get("SEGREDO_SESSAO")
+    if not segredo:
+        try:
+            segredo = st.secrets.get("autenticacao", {}).get("segredo")
+        except Exception:
+            segredo = None  # sem secrets.toml
+    return segredo.encode("utf-8") if segredo else _SEGREDO_PROCESSO
+
+
+_SEGREDO_PROCESSO = os.urandom(32)
+
+
+def _b64(dados):
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _assinar(corpo):
+    return _b64(hmac.new(_segredo(), corpo.encode("ascii"), hashlib.sha256).digest())
+
+
+class Tokens:
+    """Tokens já validados (e revogados) neste processo, para não reverificar a cada rerun."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._validos = {}      # token -> (expira, sessão)
+        self._revogados = {}    # token -> expira
+
+    def _limpar(self, agora):
+        # Chamar com o lock
+        self._validos = {t: v for t, v in self._validos.items() if v[0] > agora}
+        self._revogados = {t: expira for t, expira in self._revogados.items() if expira > agora}
+
+    def emitir(self, registro):
+        agora = time.time()
+        dados = {
+            "usuario": registro["usuario"],
+            "emitido": round(agora, 3),
+            "expira": int(agora + VALIDADE_TOKEN),
+        }
+        corpo = _b64(json.dumps(dados, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+        token = f"{corpo}.{_assinar(corpo)}"
+        with self._lock:
+            self._limpar(agora)
+            self._validos[token] = (dados["expira"], dados)
+        return token
+
+    def validar(self, token):
+        """Dados da sessão se o token é autêntico e não expirou; senão None."""
+        agora = time.time()
+        with self._lock:
+            if token in self._revogados:
+                return None
+            if token in self._validos:
+                expira, dados = self._validos[token]
+                return dict(dados) if expira > agora else None
+
+        corpo, _, assinatura = str(token).partition(".")
+        if not assinatura or not hmac.compare_digest(_assinar(corpo), assinatura):
+            return None
+        try:
+            dados = json.loads(base64.urlsafe_b64decode(corpo + "=" * (-len(corpo) % 4)))
+        except ValueError:
+            return None
+        with self._lock:
+            if dados["expira"] <= agora:
+                return None
+            self._validos[token] = (dados["expira"], dados)
+        return dict(dados)
+
+    def revogar(self, token):
+        with self._lock:
+            expira = self._validos.pop(token, (time.time() + VALIDADE_TOKEN,))[0]
+            self._revogados[token] = expira
+
+
+@st.cache_resource
+def tokens():
+    return Tokens()
+
+
+def restaurar_sessao(token):
+    """
+    Registro atual do usuário do token, ou None. Nível e páginas vêm do índice
+    (não do token), então conta removida ou alterada vale na hora; tokens
+    emitidos antes de `sessao_desde` (ver encerrar_sessoes) são recusados.
+    """
+    dados = tokens().validar(token)
+    if not dados:
+        return None
+    registro = indice_usuarios().get(dados["usuario"])
+    if registro is None or dados["emitido"] < registro["sessao_desde"]:
+        return None
+    return registro
+
+
+def encerrar_sessoes(usuario):
+    """
+    Invalida todos os tokens já emitidos para o usuário, em qualquer processo
+    e depois de reiniciar (o instante fica na coluna sessao_desde da aba Usuarios).
+    Ação explícita do admin; o "Sair" comum só revoga o token do aparelho.
+    """
+    registro = indice_usuarios().get(usuario.strip().lower())
+    if registro:
+        fila_escrita().atualizar("Usuarios", "usuario", [registro["nome"]], {"sessao_desde": round(time.time(), 3)})
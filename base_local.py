@@ -0,0 +1,287 @@
+import os
+import sqlite3
+import threading
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+from gspread.utils import a1_to_rowcol
+from pandas.io.parsers import TextParser
+from streamlit.connections import BaseConnection
+
+# BASE LOCAL (SQLITE) COM A MESMA INTERFACE DA CONEXÃO DO GOOGLE SHEETS
+# Cada aba vira uma tabela (colunas = cabeçalho, ordem das linhas = rowid).
+# Os objetos de aba imitam só o que a camada de dados usa do gspread, então
+# dados.py funciona igual nos dois armazenamentos.
+# Caminho relativo vale a partir da pasta do app, não de onde o processo foi iniciado
+PASTA_APP = os.path.dirname(os.path.abspath(__file__))
+ARQUIVO_PADRAO = "dados_local.db"
+COLUNAS_INDICE = ["codigo", "id_pedido", "status", "Item", "usuario"]
+# Tabela SQLite precisa de ao menos uma coluna: aba sem cabeçalho usa esta,
+# que não aparece como coluna da aba e some quando o cabeçalho é gravado
+COLUNA_PROVISORIA = "_sem_cabecalho"
+
+
+def _nome(texto):
+    return '"' + str(texto).replace('"', '""') + '"'
+
+
+def _texto(valor):
+    # Guarda como a planilha mostraria: 5.0 -> "5", vazio/NaN -> ""
+    if valor is None or (isinstance(valor, float) and pd.isna(valor)):
+        return ""
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor)
+
+
+class AbaLocal:
+    """Tabela SQLite vista como uma aba (subconjunto da API gspread.Worksheet)."""
+
+    def __init__(self, banco, titulo):
+        self.banco = banco
+        self.title = titulo
+        self.spreadsheet = banco
+
+    @property
+    def id(self):
+        return self.banco._id_aba(self.title)
+
+    def row_values(self, linha):
+        valores = self.get_all_values() if linha > 1 else [self.banco._colunas(self.title)]
+        return valores[linha - 1] if linha <= len(valores) else []
+
+    def get_all_values(self):
+        cabecalho = self.banco._colunas(self.title)
+        linhas = self.banco._executar(f"SELECT * FROM {_nome(self.title)} ORDER BY rowid").fetchall()
+        return [cabecalho] + [list(l) for l in linhas]
+
+    def batch_get(self, intervalos, **kwargs):
+        # Só colunas inteiras ("D:D"), que é o que a camada de dados pede
+        valores = self.get_all_values()
+        resultado = []
+        for intervalo in intervalos:
+            letra = intervalo.split(":")[0].rstrip("0123456789")
+            col = a1_to_rowcol(f"{letra}1")[1] - 1
+            resultado.append([[linha[col]] if col < len(linha) and linha[col] != "" else [] for linha in valores])
+        return resultado
+
+    @property
+    def col_count(self):
+        return len(self.banco._colunas(self.title))
+
+    def add_cols(self, quantidade):
+        # Sem grade fixa: as colunas nascem quando o cabeçalho é gravado
+        pass
+
+    def update(self, valores, intervalo="A1", **kwargs):
+        if intervalo != "A1" or len(valores) != 1:
+            raise ValueError(
+                f"A base local só grava o cabeçalho com update(valores, 'A1') (recebido {intervalo!r} "
+                f"com {len(valores)} linha(s)); para células use batch_update."
+            )
+        self.banco._garantir_colunas(self.title, valores[0])
+
+    def append_rows(self, valores, **kwargs):
+        self.banco._inserir(self.title, valores)
+
+    def batch_update(self, dados, **kwargs):
+        self.banco._gravar_intervalos(self.title, dados)
+
+    def clear(self):
+        self.banco._recriar(self.title, [])
+
+
+class BancoLocal:
+    """Arquivo SQLite visto como uma planilha (subconjunto da API gspread.Spreadsheet)."""
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self._lock = threading.RLock()
+        self._con = sqlite3.connect(caminho, check_same_thread=False, isolation_level=None)
+        self._con.execute("PRAGMA journal_mode=WAL")
+        self._con.execute("CREATE TABLE IF NOT EXISTS _meta (chave TEXT PRIMARY KEY, valor)")
+
+    # --- infraestrutura ---
+    def _executar(self, sql, parametros=()):
+        with self._lock:
+            return self._con.execute(sql, parametros)
+
+    def _transacao(self, comandos):
+        """Executa [(sql, parametros ou lista de parametros)] numa transação e marca a alteração."""
+        with self._lock:
+            self._con.execute("BEGIN IMMEDIATE")
+            try:
+                for sql, parametros in comandos:
+                    if parametros and isinstance(parametros[0], (list, tuple)):
+                        self._con.executemany(sql, parametros)
+                    else:
+                        self._con.execute(sql, parametros)
+                self._con.execute(
+                    "INSERT INTO _meta VALUES ('alteracao', 1) "
+                    "ON CONFLICT(chave) DO UPDATE SET valor = valor + 1"
+                )
+                self._con.execute("COMMIT")
+            except Exception:
+                self._con.execute("ROLLBACK")
+                raise
+
+    def _abas(self):
+        linhas = self._executar(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE '\\_%' ESCAPE '\\' "
+            "AND name NOT LIKE 'sqlite%' ORDER BY rowid"
+        ).fetchall()
+        return [l[0] for l in linhas]
+
+    def _id_aba(self, titulo):
+        return self._abas().index(titulo)
+
+    def _colunas_tabela(self, titulo):
+        return [c[1] for c in self._executar(f"PRAGMA table_info({_nome(titulo)})").fetchall()]
+
+    def _colunas(self, titulo):
+        return [c for c in self._colunas_tabela(titulo) if c != COLUNA_PROVISORIA]
+
+    def _indices(self, titulo, colunas):
+        return [
+            (f"CREATE INDEX IF NOT EXISTS {_nome(f'ix_{titulo}_{c}')} ON {_nome(titulo)} ({_nome(c)})", ())
+            for c in colunas if c in COLUNAS_INDICE
+        ]
+
+    def _recriar(self, titulo, colunas, linhas=()):
+        colunas = [c for c in colunas if str(c).strip() != ""] or [COLUNA_PROVISORIA]
+        comandos = [
+            (f"DROP TABLE IF EXISTS {_nome(titulo)}", ()),
+            (f"CREATE TABLE {_nome(titulo)} ({', '.join(_nome(c) for c in colunas)})", ()),
+        ] + self._indices(titulo, colunas)
+        if linhas:
+            marcadores = ", ".join("?" * len(colunas))
+            comandos.append((f"INSERT INTO {_nome(titulo)} VALUES ({marcadores})", [list(l) for l in linhas]))
+        self._transacao(comandos)
+
+    def _garantir_colunas(self, titulo, cabecalho):
+        if COLUNA_PROVISORIA in self._colunas_tabela(titulo):
+            # Aba recém-criada (sem cabeçalho ainda): a coluna provisória sai
+            self._recriar(titulo, cabecalho)
+            return
+        atuais = self._colunas(titulo)
+        novas = [c for c in cabecalho if str(c).strip() != "" and c not in atuais]
+        self._transacao(
+            [(f"ALTER TABLE {_nome(titulo)} ADD COLUMN {_nome(c)}", ()) for c in novas] + self._indices(titulo, novas)
+        )
+
+    def _inserir(self, titulo, valores):
+        colunas = self._colunas(titulo)
+        linhas = [[_texto(v) for v in (list(l) + [""] * len(colunas))[:len(colunas)]] for l in valores]
+        marcadores = ", ".join("?" * len(colunas))
+        self._transacao([(f"INSERT INTO {_nome(titulo)} VALUES ({marcadores})", linhas)])
+
+    def _rowids(self, titulo):
+        return [r[0] for r in self._executar(f"SELECT rowid FROM {_nome(titulo)} ORDER BY rowid").fetchall()]
+
+    def _gravar_intervalos(self, titulo, dados):
+        colunas = self._colunas(titulo)
+        rowids = self._rowids(titulo)
+        comandos = []
+        for d in dados:
+            inicio, fim = (d["range"].split(":") + [d["range"]])[:2]
+            (lin_i, col_i), (_, _) = a1_to_rowcol(inicio), a1_to_rowcol(fim)
+            for i, linha in enumerate(d["values"]):
+                for j, valor in enumerate(linha):
+                    comandos.append((
+                        f"UPDATE {_nome(titulo)} SET {_nome(colunas[col_i - 1 + j])} = ? WHERE rowid = ?",
+                        (_texto(valor), rowids[lin_i - 2 + i]),
+                    ))
+        self._transacao(comandos)
+
+    # --- API no formato do gspread ---
+    def worksheets(self):
+        return [AbaLocal(self, t) for t in self._abas()]
+
+    def worksheet(self, titulo):
+        if titulo not in self._abas():
+            raise WorksheetNotFound(titulo)
+        return AbaLocal(self, titulo)
+
+    def add_worksheet(self, title, rows=1, cols=1):
+        self._recriar(title, [])
+        return AbaLocal(self, title)
+
+    def get_lastUpdateTime(self):
+        linha = self._executar("SELECT valor FROM _meta WHERE chave = 'alteracao'").fetchone()
+        return str(linha[0] if linha else 0)
+
+    def batch_update(self, corpo):
+        # Só exclusão de linhas (deleteDimension), como em excluir_linhas
+        abas = self._abas()
+        comandos = []
+        for pedido in corpo["requests"]:
+            intervalo = pedido["deleteDimension"]["range"]
+            titulo = abas[intervalo["sheetId"]]
+            rowids = self._rowids(titulo)
+            apagar = rowids[intervalo["startIndex"] - 1:intervalo["endIndex"] - 1]
+            comandos.append((f"DELETE FROM {_nome(titulo)} WHERE rowid = ?", [(r,) for r in apagar]))
+        self._transacao([c for c in comandos if c[1]])
+
+
+class _ClienteLocal:
+    """Mesmos métodos internos que a camada de dados usa do cliente do GSheetsConnection."""
+
+    def __init__(self, banco):
+        self.banco = banco
+
+    def _open_spreadsheet(self, spreadsheet=None, folder_id=None):
+        return self.banco
+
+    def _select_worksheet(self, spreadsheet=None, folder_id=None, worksheet=None):
+        return self.banco.worksheet(worksheet)
+
+
+class SQLiteConnection(BaseConnection[BancoLocal]):
+    """
+    Armazenamento local com os mesmos métodos do GSheetsConnection (read,
+    update, query e client). Configuração em secrets.toml:
+
+        [connections.local]
+        database = "dados_local.db"
+    """
+
+    def _connect(self, **kwargs):
+        caminho = kwargs.get("database") or self._secrets.get("database", ARQUIVO_PADRAO)
+        return BancoLocal(os.path.join(PASTA_APP, os.path.expanduser(caminho)))
+
+    @property
+    def client(self):
+        return _ClienteLocal(self._instance)
+
+    def read(self, spreadsheet=None, worksheet=None, ttl=None, **options):
+        valores = self._instance.worksheet(worksheet).get_all_values()
+        # Mesma conversão de tipos do get_as_dataframe (texto -> número quando dá)
+        df = TextParser(valores, **options).read() if len(valores) > 1 else pd.DataFrame(columns=valores[0])
+        return df.dropna(how="all", axis=0)
+
+    def update(self, spreadsheet=None, worksheet=None, data=None, **kwargs):
+        if data is None:
+            return None
+        df = pd.DataFrame(data)
+        self._instance._recriar(worksheet, list(df.columns), [[_texto(v) for v in l] for l in df.itertuples(index=False)])
+        return df
+
+    def query(self, sql, **kwargs):
+        """SQL direto nas tabelas (usa os índices de codigo, id_pedido e status)."""
+        with self._instance._lock:
+            return pd.read_sql_query(sql, self._instance._con, params=kwargs.get("params"))
+
+
+def importar_planilha(abas=("Produtos", "Movimentacoes", "Pedidos", "Usuarios"), destino=None):
+    """
+    Copia as abas do Google Sheets para a base local (ponto de partida para
+    trabalhar offline ou em testes). Roda dentro do app ou com `streamlit run`.
+    """
+    import streamlit as st
+    from streamlit_gsheets import GSheetsConnection
+    from dados import URL_PLANILHA
+
+    origem = st.connection("gsheets", type=GSheetsConnection)
+    local = st.connection("local", type=SQLiteConnection, **({"database": destino} if destino else {}))
+    for aba in abas:
+        local.update(worksheet=aba, data=origem.read(spreadsheet=URL_PLANILHA, worksheet=aba, ttl=0))
+    return local
@@ -0,0 +1,287 @@
+"""
+Benchmarks das funções críticas com dados sintéticos baseados no catálogo real.
+
+    python benchmark.py                       # volumes padrão (1k e 100k linhas)
+    python benchmark.py --volumes 1k 1M       # volumes à escolha
+    python benchmark.py --salvar              # grava a referência em benchmark_referencia.json
+
+Os dados passam pela base local (SQLite), então a leitura também é medida sem
+depender da API do Google. Com uma referência salva, cada rodada mostra a
+variação por função e termina com erro se alguma ficar mais lenta que a tolerância.
+Antes de medir, confere a saída ZPL de uma etiqueta por tamanho com o texto esperado.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from base_local import SQLiteConnection
+from busca import IndiceBusca
+from esquemas import aplicar_esquema
+from etiquetas import gerar_etiqueta, etiqueta_zpl, _renderizar_etiqueta, _qr_imagem
+from exportacao import gerar_excel, gerar_csv, gerar_zip
+from rateio import ratear_pedido, multiplo_embalagem
+from saldos import calcular_estoque
+
+# CONFIGURAÇÃO
+PASTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "base")
+ARQUIVO_REFERENCIA = "benchmark_referencia.json"
+VOLUMES_PADRAO = ["1k", "100k"]
+TOLERANCIA_PADRAO = 0.25
+# Diferenças menores que isso (segundos) são ruído, mesmo que o percentual seja alto
+RUIDO = 0.005
+
+LOJAS = [f"Loja {i:02d}" for i in range(1, 21)]
+STATUS_PEDIDO = ["Pendente", "Em Separação", "Concluído"]
+LINHAS_POR_PEDIDO = 60
+ETIQUETAS_POR_RODADA = 100
+CONSULTAS = ["pao", "alvorada 450", "baguete levain", "queijo", "7826", "frango cong"]
+
+
+def interpretar_volume(texto):
+    """'1k' -> 1000, '1M' -> 1000000, '500' -> 500."""
+    multiplos = {"k": 1_000, "m": 1_000_000}
+    texto = texto.strip().lower()
+    if texto[-1] in multiplos:
+        return int(float(texto[:-1]) * multiplos[texto[-1]])
+    return int(texto)
+
+
+# --- GERADOR DE DADOS SINTÉTICOS ---
+def catalogo():
+    """Produtos a partir de base/BASE.csv (ou BASE.xlsx), no formato da aba Produtos."""
+    caminho_csv = os.path.join(PASTA_BASE, "BASE.csv")
+    if os.path.exists(caminho_csv):
+        base = pd.read_csv(caminho_csv, dtype=str, encoding="utf-8-sig")
+    else:
+        base = pd.read_excel(os.path.join(PASTA_BASE, "BASE.xlsx"), dtype=str)
+    base = base.fillna("")
+    return pd.DataFrame({
+        "Item": base["Item"].str.strip(),
+        "Descrição": base["Descrição"].str.strip(),
+        "Categoria": base["TIPO"].str.strip(),
+        "Embalagem": base["Embalagem"].str.strip(),
+        "Estoque_Inicial": 0,
+    })
+
+
+def gerar_dados(produtos, n, semente=42):
+    """Movimentações, pedidos e histórico de separação com `n` linhas cada."""
+    rng = np.random.default_rng(semente)
+    codigos = produtos["Item"].to_numpy()
+    descricoes = produtos["Descrição"].to_numpy()
+
+    instantes = pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(n) * 30, unit="s")
+    escolha = rng.integers(0, len(codigos), n)
+    movimentos = pd.DataFrame({
+        "id": np.asarray(instantes.strftime("%Y%m%d%H%M%S")),
+        "data": np.asarray(instantes.strftime("%d/%m/%Y %H:%M")),
+        "codigo": codigos[escolha],
+        "descricao": descricoes[escolha],
+        "tipo": rng.choice(["Entrada", "Saída"], n, p=[0.4, 0.6]),
+        "quantidade": rng.integers(1, 50, n),
+        "usuario": rng.choice(["ana", "bruno", "carla", "diego"], n),
+        "obs": "",
+    })
+
+    n_pedidos = -(-n // LINHAS_POR_PEDIDO)
+    pedido = np.arange(n) // LINHAS_POR_PEDIDO
+    ids_pedido = np.asarray(
+        (pd.Timestamp("2024-01-01") + pd.to_timedelta(np.arange(n_pedidos) * 10, unit="min")).strftime("%Y%m%d%H%M")
+    )
+    status = rng.choice(STATUS_PEDIDO, n_pedidos, p=[0.2, 0.2, 0.6])
+    escolha = rng.integers(0, len(codigos), n)
+    pedidos = pd.DataFrame({
+        "id_pedido": ids_pedido[pedido],
+        "data": movimentos["data"].to_numpy(),
+        "usuario": "ana",
+        "status": status[pedido],
+        "loja": rng.choice(LOJAS, n),
+        "item_codigo": codigos[escolha],
+        "descricao": descricoes[escolha],
+        "quantidade": rng.integers(1, 30, n),
+    })
+
+    escolha = rng.integers(0, len(codigos), n)
+    historico = pd.DataFrame({
+        "pedido": ids_pedido[pedido],
+        "item": codigos[escolha],
+        "desc": descricoes[escolha],
+        "loja": rng.choice(LOJAS, n),
+        "qtd": rng.integers(1, 30, n),
+        "hora": "08:00",
+    })
+    return movimentos, pedidos, historico
+
+
+# --- MEDIÇÃO ---
+def medir(funcao, repeticoes):
+    """Melhor tempo (segundos) entre `repeticoes` execuções."""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def _etiquetas_sem_cache(produtos):
+    # Renderização a frio: sem o LRU de etiquetas e de QR Codes
+    _renderizar_etiqueta.cache_clear()
+    _qr_imagem.cache_clear()
+    for cod, desc in produtos[["Item", "Descrição"]].head(ETIQUETAS_POR_RODADA).itertuples(index=False):
+        gerar_etiqueta(cod, desc)
+
+
+def _filtrar_produtos(df, indice):
+    # Mesmos filtros das abas de estoque: categoria e busca por texto
+    for categoria in df["Categoria"].unique()[:3]:
+        df[df["Categoria"] == categoria]
+    for consulta in CONSULTAS:
+        indice.filtrar(df, consulta)
+
+
+def rodada(n, repeticoes, pasta):
+    """Semeia a base local com `n` linhas por aba e mede cada função."""
+    produtos = catalogo()
+    movimentos, pedidos, historico = gerar_dados(produtos, n)
+
+    conn = SQLiteConnection(f"benchmark_{n}", database=os.path.join(pasta, f"benchmark_{n}.db"))
+    for aba, df in [("Produtos", produtos), ("Movimentacoes", movimentos), ("Pedidos", pedidos)]:
+        conn.update(worksheet=aba, data=df)
+
+    # Mesmo tratamento das páginas antes de calcular (conversão pelo esquema da aba)
+    df_p = aplicar_esquema(conn.read(worksheet="Produtos"), "Produtos")
+    df_m = aplicar_esquema(conn.read(worksheet="Movimentacoes"), "Movimentacoes")
+    df_s = aplicar_esquema(conn.read(worksheet="Pedidos"), "Pedidos")
+    indice = IndiceBusca(df_p)
+    em_separacao = df_s[df_s["status"] == "Em Separação"]
+    recebidos = (em_separacao["quantidade"].groupby(em_separacao["item_codigo"]).sum() * 0.8).to_dict()
+    embalagens = dict(zip(df_p["Item"], multiplo_embalagem(df_p["Embalagem"])))
+
+    casos = {
+        "leitura_produtos": lambda: conn.read(worksheet="Produtos"),
+        "leitura_movimentacoes": lambda: conn.read(worksheet="Movimentacoes"),
+        "leitura_pedidos": lambda: conn.read(worksheet="Pedidos"),
+        "esquema_movimentacoes": lambda: aplicar_esquema(conn.read(worksheet="Movimentacoes"), "Movimentacoes"),
+        "calcular_estoque": lambda: calcular_estoque(df_p, df_m),
+        "indice_busca": lambda: IndiceBusca(df_p),
+        "filtros_produtos": lambda: _filtrar_produtos(df_p, indice),
+        "ratear_pedido": lambda: ratear_pedido(em_separacao, recebidos, embalagens=embalagens),
+        "gerar_excel": lambda: gerar_excel(historico),
+        "gerar_csv": lambda: gerar_csv(historico),
+        "gerar_zip": lambda: gerar_zip(historico),
+        "gerar_etiqueta": lambda: _etiquetas_sem_cache(df_p),
+    }
+    return {nome: medir(funcao, repeticoes) for nome, funcao in casos.items()}
+
+
+# --- CONFERÊNCIA DA SAÍDA ZPL ---
+# A impressora recebe o texto exatamente como gerado: uma etiqueta por tamanho,
+# com ^, ~ e \ na descrição (escapados com ^FH) e cópias em ^PQ.
+DESCRICAO_ZPL = "PAO ^FRANCES~ 50% \\ KG"
+ZPL_ESPERADO = {
+    ("pequena", 1): (
+        "^XA\n^CI28\n^PW240\n^LL120\n"
+        "^FO8,18^BQN,2,4^FH\\^FDMA,7826^FS\n"
+        "^FO102,45^A0N,14,10^FB130,1,0,C,0^FH\\^FDPAO \\5EFRANCES\\7E^FS\n"
+        "^FO102,61^A0N,14,10^FB130,1,0,C,0^FH\\^FD50% \\5C KG^FS\n"
+        "^FO0,0^GB240,120,1^FS\n^XZ\n"
+    ),
+    ("media", 2): (
+        "^XA\n^CI28\n^PW400\n^LL180\n"
+        "^FO8,16^BQN,2,7^FH\\^FDMA,7826^FS\n"
+        "^FO165,80^A0N,19,14^FB227,1,0,C,0^FH\\^FDPAO \\5EFRANCES\\7E 50% \\5C KG^FS\n"
+        "^FO0,0^GB400,180,1^FS\n^PQ2\n^XZ\n"
+    ),
+    ("grande", 3): (
+        "^XA\n^CI28\n^PW600\n^LL240\n"
+        "^FO8,25^BQN,2,9^FH\\^FDMA,7826^FS\n"
+        "^FO207,107^A0N,25,18^FB385,1,0,C,0^FH\\^FDPAO \\5EFRANCES\\7E 50% \\5C KG^FS\n"
+        "^FO0,0^GB600,240,1^FS\n^PQ3\n^XZ\n"
+    ),
+}
+
+
+def conferir_zpl():
+    """Tamanhos cuja saída ZPL mudou em relação ao texto esperado."""
+    divergentes = []
+    for (tamanho, copias), esperado in ZPL_ESPERADO.items():
+        gerado = etiqueta_zpl("7826", DESCRICAO_ZPL, tamanho, copias)
+        if gerado != esperado:
+            divergentes.append(tamanho)
+            print(f"  ZPL {tamanho} diferente do esperado:\n    esperado {esperado!r}\n    gerado   {gerado!r}")
+    return divergentes
+
+
+# --- REFERÊNCIA (BASELINE) ---
+def carregar_referencia(caminho):
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def salvar_referencia(caminho, resultados):
+    referencia = carregar_referencia(caminho)
+    referencia.update(resultados)
+    with open(caminho, "w", encoding="utf-8") as f:
+        json.dump(referencia, f, indent=2, sort_keys=True)
+
+
+def comparar(tempos, referencia, tolerancia):
+    """Linhas do relatório e lista de funções que ficaram mais lentas que a tolerância."""
+    linhas, regressoes = [], []
+    for nome, t in tempos.items():
+        ref = referencia.get(nome)
+        if ref is None:
+            linhas.append(f"  {nome:<24}{t * 1000:>12.1f} ms")
+            continue
+        variacao = (t - ref) / ref if ref else 0.0
+        lento = variacao > tolerancia and t - ref > RUIDO
+        if lento:
+            regressoes.append(nome)
+        marca = "  ⚠️ regressão" if lento else ""
+        linhas.append(f"  {nome:<24}{t * 1000:>12.1f} ms   ref {ref * 1000:>10.1f} ms   {variacao:>+7.1%}{marca}")
+    return linhas, regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks com dados sintéticos (base local SQLite).")
+    parser.add_argument("--volumes", nargs="+", default=VOLUMES_PADRAO, help="linhas por aba, ex.: 1k 100k 1M")
+    parser.add_argument("--repeticoes", type=int, default=3, help="execuções por função (vale o melhor tempo)")
+    parser.add_argument("--referencia", default=ARQUIVO_REFERENCIA, help="arquivo JSON com os tempos de referência")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_PADRAO, help="piora aceita (0.25 = 25%%)")
+    parser.add_argument("--salvar", action="store_true", help="grava os tempos desta rodada como referência")
+    args = parser.parse_args(argv)
+
+    divergentes = conferir_zpl()
+    if divergentes:
+        print(f"\nSaída ZPL diferente do esperado: {', '.join(divergentes)}")
+        return 1
+
+    referencia = carregar_referencia(args.referencia)
+    resultados, regressoes = {}, []
+    with tempfile.TemporaryDirectory() as pasta:
+        for volume in args.volumes:
+            n = interpretar_volume(volume)
+            print(f"\n== {volume} ({n} linhas por aba) ==")
+            resultados[volume] = rodada(n, args.repeticoes, pasta)
+            linhas, lentas = comparar(resultados[volume], referencia.get(volume, {}), args.tolerancia)
+            print("\n".join(linhas))
+            regressoes += [f"{volume}/{nome}" for nome in lentas]
+
+    if args.salvar:
+        salvar_referencia(args.referencia, resultados)
+        print(f"\nReferência gravada em {args.referencia}")
+    if regressoes:
+        print(f"\nMais lentas que a referência (+{args.tolerancia:.0%}): {', '.join(regressoes)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
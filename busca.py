@@ -0,0 +1,116 @@
+import bisect
+import difflib
+import re
+import unicodedata
+import numpy as np
+import pandas as pd
+import streamlit as st
+from metricas import cronometrado
+
+# ÍNDICE DE BUSCA DE PRODUTOS (COMPARTILHADO POR TODOS OS SELETORES)
+_SEPARADORES = re.compile(r"[^0-9a-z]+")
+
+# Pesos da classificação
+PESO_CODIGO_EXATO = 100
+PESO_CODIGO_PREFIXO = 50
+PESO_TOKEN_EXATO = 3
+PESO_TOKEN_PREFIXO = 2
+PESO_TOKEN_APROXIMADO = 1
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos: 'Pão Francês' -> 'pao frances'."""
+    texto = unicodedata.normalize("NFKD", str(texto).lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def tokens(texto):
+    return [t for t in _SEPARADORES.split(normalizar(texto)) if t]
+
+
+class IndiceBusca:
+    """
+    Índice invertido (token -> linhas) de código + descrição.
+    Busca por prefixo de cada palavra digitada (todas precisam casar),
+    com tolerância a erro de digitação e classificação por relevância.
+    """
+
+    def __init__(self, df, col_codigo='Item', col_desc='Descrição'):
+        self.codigos = df[col_codigo].astype(str).str.strip().to_numpy()
+        self._codigos_norm = pd.Series([normalizar(c) for c in self.codigos], dtype=object)
+        self._textos = pd.Series(
+            [normalizar(f"{c} {d}") for c, d in zip(self.codigos, df[col_desc].astype(str))], dtype=object
+        )
+
+        postagens = {}
+        for linha, texto in enumerate(self._textos):
+            for t in set(_SEPARADORES.split(texto)):
+                if t:
+                    postagens.setdefault(t, []).append(linha)
+        self._vocab = sorted(postagens)
+        self._postagens = [np.array(postagens[t], dtype=np.int64) for t in self._vocab]
+
+    def _linhas(self, inicio, fim):
+        if fim <= inicio:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(self._postagens[inicio:fim])
+
+    def _pesos(self, termo):
+        """Peso de cada linha para um termo (0 = não casou)."""
+        pesos = np.zeros(len(self.codigos))
+        inicio = bisect.bisect_left(self._vocab, termo)
+        fim = bisect.bisect_left(self._vocab, termo + "\uffff")
+        if fim > inicio:
+            pesos[self._linhas(inicio, fim)] = PESO_TOKEN_PREFIXO
+            if self._vocab[inicio] == termo:
+                pesos[self._postagens[inicio]] = PESO_TOKEN_EXATO
+        elif len(termo) >= 4:
+            # Tolerância a erro de digitação: palavras parecidas do vocabulário
+            for parecido in difflib.get_close_matches(termo, self._vocab, n=5, cutoff=0.8):
+                pesos[self._postagens[bisect.bisect_left(self._vocab, parecido)]] = PESO_TOKEN_APROXIMADO
+        return pesos
+
+    def buscar(self, consulta):
+        """Códigos que casam com a consulta, do mais para o menos relevante."""
+        termos = tokens(consulta)
+        if not termos:
+            return list(self.codigos)
+
+        pontos = np.zeros(len(self.codigos))
+        casou = np.ones(len(self.codigos), dtype=bool)
+        for termo in termos:
+            pesos = self._pesos(termo)
+            pontos += pesos
+            casou &= pesos > 0
+            if not casou.any():
+                break
+
+        consulta_norm = normalizar(consulta).strip()
+        if not casou.any():
+            # Último recurso: trecho no meio da palavra (comportamento antigo)
+            casou = self._textos.str.contains(consulta_norm, regex=False).to_numpy()
+
+        pontos += np.where(self._codigos_norm == consulta_norm, PESO_CODIGO_EXATO,
+                           np.where(self._codigos_norm.str.startswith(consulta_norm), PESO_CODIGO_PREFIXO, 0))
+
+        linhas = np.flatnonzero(casou)
+        ordem = linhas[np.argsort(-pontos[linhas], kind="stable")]
+        return self.codigos[ordem].tolist()
+
+    def filtrar(self, df, consulta, col_codigo='Item'):
+        """Aplica a busca a um DataFrame de produtos, mantendo a ordem de relevância."""
+        if not str(consulta).strip():
+            return df
+        encontrados = self.buscar(consulta)
+        rank = pd.Series(np.arange(len(encontrados)), index=encontrados)
+        rank = rank[~rank.index.duplicated()]
+        codigos = df[col_codigo].astype(str).str.strip()
+        posicao = codigos.map(rank)
+        return df[posicao.notna().to_numpy()].iloc[np.argsort(posicao.dropna().to_numpy(), kind="stable")]
+
+
+@st.cache_resource(max_entries=4)
+@cronometrado("busca: índice de produtos")
+def indice_produtos(token, _df):
+    """Índice do catálogo, construído uma vez por versão da aba Produtos."""
+    return IndiceBusca(_df)
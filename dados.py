@@ -0,0 +1,732 @@
+import itertools
+import os
+import threading
+import time
+from functools import lru_cache
+import requests
+import streamlit as st
+from streamlit_gsheets import GSheetsConnection
+import pandas as pd
+from gspread.exceptions import APIError, WorksheetNotFound
+from gspread.utils import rowcol_to_a1, ValueRenderOption
+from base_local import SQLiteConnection
+from metricas import medir, contar, instrumentar_conexao
+
+# CAMADA DE DADOS COMPARTILHADA ENTRE AS PÁGINAS
+URL_PLANILHA = "https://docs.google.com/spreadsheets/d/1lIldvBHzJ3VIczDvZv-WRFtp3R7Jf5yfM2LrIlseshE/edit?usp=sharing"
+
+# Tempo máximo (s) que a leitura de uma aba é reaproveitada quando nada foi
+# gravado pelo app (cobre alterações feitas direto na planilha)
+VALIDADE_ABAS = {"Pedidos": 10}
+VALIDADE_PADRAO = 300
+
+# Formato das colunas de data nas abas (datetime é gravado de volta assim)
+FORMATO_DATA = "%d/%m/%Y %H:%M"
+
+
+def armazenamento():
+    """
+    "gsheets" (padrão) ou "sqlite" (base local, ver base_local.py). Definido pela
+    variável de ambiente ARMAZENAMENTO ou por `tipo` em [armazenamento] no secrets.toml.
+    """
+    tipo = os.environ.get("ARMAZENAMENTO")
+    if not tipo:
+        try:
+            tipo = st.secrets.get("armazenamento", {}).get("tipo")
+        except Exception:
+            tipo = None  # sem secrets.toml
+    return (tipo or "gsheets").strip().lower()
+
+
+def conexao():
+    # st.connection já devolve a mesma instância para todo o processo
+    if armazenamento() == "sqlite":
+        return st.connection("local", type=SQLiteConnection)
+    conn = st.connection("gsheets", type=GSheetsConnection)
+    instrumentar_conexao(conn)
+    return conn
+
+
+def _aba(worksheet, criar=False, colunas=1):
+    """
+    Retorna a aba (gspread.Worksheet) da planilha principal, criando-a se
+    pedido já com `colunas` colunas na grade.
+    """
+    client = conexao().client
+    try:
+        return client._select_worksheet(spreadsheet=URL_PLANILHA, worksheet=worksheet)
+    except WorksheetNotFound:
+        if not criar:
+            raise
+        planilha = client._open_spreadsheet(spreadsheet=URL_PLANILHA)
+        return planilha.add_worksheet(title=worksheet, rows=1, cols=max(colunas, 1))
+
+
+def _gravar_cabecalho(ws, cabecalho):
+    """
+    Grava o cabeçalho na linha 1, ampliando antes a grade da aba se ele for
+    mais largo (a API recusa intervalo além das colunas existentes).
+    """
+    faltam = len(cabecalho) - ws.col_count
+    if faltam > 0:
+        ws.add_cols(faltam)
+    ws.update([cabecalho], "A1", value_input_option="USER_ENTERED")
+
+
+def listar_abas(prefixo=""):
+    """Nomes das abas da planilha principal (1 chamada de metadados, sem baixar dados)."""
+    planilha = conexao().client._open_spreadsheet(spreadsheet=URL_PLANILHA)
+    return [w.title for w in planilha.worksheets() if w.title.startswith(prefixo)]
+
+
+def cabecalho_aba(worksheet):
+    """Colunas da linha 1 da aba (1 chamada, sem baixar dados)."""
+    return [c for c in _aba(worksheet).row_values(1) if str(c).strip() != ""]
+
+
+# --- CACHE POR ABA COM VERSÃO ---
+class _Versoes:
+    """Contador de versão por aba, compartilhado por todas as sessões do processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versoes = {}
+        self._ouvintes = {}
+
+    def atual(self, worksheet):
+        return self._versoes.get(worksheet, 0)
+
+    def incrementar(self, worksheet):
+        with self._lock:
+            self._versoes[worksheet] = self._versoes.get(worksheet, 0) + 1
+            ouvintes = list(self._ouvintes.get(worksheet, []))
+        for callback in ouvintes:
+            callback()
+
+    def ouvir(self, worksheet, callback):
+        """Registra uma função chamada sempre que a aba for gravada pelo app."""
+        with self._lock:
+            self._ouvintes.setdefault(worksheet, []).append(callback)
+
+
+@st.cache_resource
+def _versoes():
+    return _Versoes()
+
+
+def _versao_planilha(worksheet, agora):
+    return worksheet, _versoes().atual(worksheet), int(agora // VALIDADE_ABAS.get(worksheet, VALIDADE_PADRAO))
+
+
+def versao(*worksheets):
+    """
+    Token de versão das abas. Use como argumento de funções com st.cache_data
+    para que o cache delas acompanhe as escritas nessas abas (inclusive as
+    que ainda estão na fila de gravação).
+    """
+    agora = time.time()
+    return tuple(_versao_planilha(w, agora) + (fila_escrita().geracao(w),) for w in worksheets)
+
+
+def invalidar(*worksheets):
+    """Descarta o cache apenas das abas informadas."""
+    for w in worksheets:
+        _versoes().incrementar(w)
+
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _ler_aba(worksheet, token):
+    contar("cache_falhas")
+    with medir(f"leitura: {worksheet}"):
+        return conexao().read(spreadsheet=URL_PLANILHA, worksheet=worksheet, ttl=0)
+
+
+def ler_aba(worksheet):
+    """
+    Lê a aba pelo cache compartilhado (mesma entrada para todas as páginas),
+    já com as gravações que ainda estão na fila.
+    """
+    contar("cache_leituras")
+    df = _ler_aba(worksheet, _versao_planilha(worksheet, time.time()))
+    return fila_escrita().aplicar_pendentes(worksheet, df)
+
+
+# --- LEITURA EM SEGUNDO PLANO (UMA THREAD POR ABA NO PROCESSO) ---
+class ObservadorAba:
+    """
+    Mantém em memória a última leitura de uma aba, atualizada por uma única
+    thread do processo. Verifica a data de modificação da planilha a cada
+    `intervalo` segundos e só baixa a aba quando ela mudou (ou quando o
+    próprio app gravou nela). Sem sessões lendo por `ocioso` segundos, pausa.
+    """
+
+    def __init__(self, worksheet, intervalo=3, intervalo_maximo=60, ocioso=300):
+        self.worksheet = worksheet
+        self.intervalo = intervalo
+        self.intervalo_maximo = intervalo_maximo
+        self.ocioso = ocioso
+
+        self.versao = 0
+        self.atualizado_em = None
+        self.erro = None
+        self._df = None
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._ultimo_acesso = time.time()
+        self._marca = None
+
+        self._conn = conexao()
+        _versoes().ouvir(worksheet, self._acordar.set)
+        self._thread = threading.Thread(target=self._executar, name=f"observador-{worksheet}", daemon=True)
+        self._thread.start()
+
+    def _marca_planilha(self):
+        # Metadado leve do Drive (1 chamada) em vez de baixar a aba inteira
+        try:
+            planilha = self._conn.client._open_spreadsheet(spreadsheet=URL_PLANILHA)
+            return planilha.get_lastUpdateTime()
+        except Exception:
+            return None
+
+    def _atualizar(self):
+        with medir(f"leitura: {self.worksheet} (observador)"):
+            df = self._conn.read(spreadsheet=URL_PLANILHA, worksheet=self.worksheet, ttl=0)
+        with self._lock:
+            self._df = df
+            self.versao += 1
+            self.atualizado_em = time.time()
+            self.erro = None
+
+    def _executar(self):
+        while True:
+            gravado_pelo_app = self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            if time.time() - self._ultimo_acesso > self.ocioso:
+                continue
+            try:
+                marca = None if gravado_pelo_app else self._marca_planilha()
+                vencido = self.atualizado_em is None or time.time() - self.atualizado_em > self.intervalo_maximo
+                if gravado_pelo_app or vencido or (marca is not None and marca != self._marca):
+                    self._atualizar()
+                    self._marca = marca if marca is not None else self._marca_planilha()
+            except Exception as e:
+                self.erro = e
+
+    def ler(self):
+        """Retorna (versao, DataFrame) da última leitura, sem chamar a API."""
+        self._ultimo_acesso = time.time()
+        if self._df is None:
+            self._marca = self._marca_planilha()
+            self._atualizar()
+        fila = fila_escrita()
+        with self._lock:
+            versao_lida, df = (self.versao, fila.geracao(self.worksheet)), self._df
+        return versao_lida, fila.aplicar_pendentes(self.worksheet, df)
+
+
+@st.cache_resource
+def observador(worksheet):
+    """Observador único por aba para todo o processo."""
+    return ObservadorAba(worksheet)
+
+
+def _linhas_planilha(df, colunas):
+    """Converte o DataFrame em lista de linhas na ordem das colunas da aba."""
+    df = df.reindex(columns=colunas)
+    for c in df.columns[[pd.api.types.is_datetime64_any_dtype(t) for t in df.dtypes]]:
+        df[c] = df[c].dt.strftime(FORMATO_DATA)
+    df = df.astype(object)
+    df = df.where(pd.notna(df), "")
+    return df.values.tolist()
+
+
+# --- ESCRITA INCREMENTAL (APPEND) ---
+def _anexar(worksheet, novas, criar=False, chave=None, renumerar=None, so_novas=False):
+    ws = _aba(worksheet, criar=criar, colunas=len(novas.columns))
+    _cabecalhos[worksheet] = ws.row_values(1)
+    cabecalho = [c for c in _cabecalhos[worksheet] if str(c).strip() != ""]
+
+    for tentativa in range(1, TENTATIVAS_ESCRITA + 1):
+        if not chave or chave not in cabecalho:
+            break
+        existentes = {_chave(v) for v in _colunas(ws, [chave])[1][chave]}
+        repetidas = sorted({_chave(v) for v in novas[chave]} & existentes)
+        if not repetidas:
+            break
+        if so_novas:
+            novas = novas[~novas[chave].map(_chave).isin(repetidas)]
+            if novas.empty:
+                return novas
+            break
+        if renumerar is None or tentativa == TENTATIVAS_ESCRITA:
+            raise _conflito(worksheet, f"{chave} já existe na aba {worksheet}: {', '.join(repetidas)}")
+        novas = renumerar(novas, repetidas, tentativa)
+
+    faltantes = [c for c in novas.columns if c not in cabecalho]
+    if faltantes:
+        cabecalho = cabecalho + faltantes
+        _gravar_cabecalho(ws, cabecalho)
+        _cabecalhos.pop(worksheet, None)
+
+    ws.append_rows(
+        _linhas_planilha(novas, cabecalho),
+        value_input_option="USER_ENTERED",
+        table_range="A1",
+    )
+    return novas
+
+
+def anexar_linhas(worksheet, novas, criar=False, chave=None, renumerar=None, so_novas=False):
+    """
+    Acrescenta apenas as linhas novas ao final da aba, sem regravar o histórico.
+    Colunas que ainda não existem no cabeçalho são adicionadas à direita.
+
+    Com `chave`, confere na hora de gravar que nenhum valor dessa coluna já
+    existe na aba (outra sessão pode ter gravado o mesmo id). Em colisão,
+    `renumerar(novas, repetidas, tentativa)` gera novas chaves e tenta de novo;
+    com `so_novas`, as linhas repetidas são descartadas; sem nenhum dos dois,
+    levanta ConflitoEscrita. Retorna as linhas como foram gravadas.
+    """
+    if novas is None or novas.empty:
+        return novas
+    with medir(f"gravação: {worksheet}"):
+        gravadas = _anexar(worksheet, novas, criar, chave, renumerar, so_novas)
+    invalidar(worksheet)
+    return gravadas
+
+
+@lru_cache(maxsize=None)
+def renumerar_sufixo(coluna):
+    """Renumerador para anexar_linhas: acrescenta -2, -3... só aos ids que colidiram."""
+    def renumerar(novas, repetidas, tentativa):
+        chaves = novas[coluna].astype(str)
+        base = chaves.str.replace(r"-\d+$", "", regex=True)
+        colidiu = chaves.map(_chave).isin(repetidas)
+        return novas.assign(**{coluna: chaves.where(~colidiu, base + f"-{tentativa + 1}")})
+    return renumerar
+
+
+# --- ATUALIZAÇÃO/EXCLUSÃO POR LINHA ---
+# Cabeçalho de cada aba guardado no processo: as operações por linha leem só
+# as colunas envolvidas (1 chamada) e gravam só as células afetadas (1 chamada).
+_cabecalhos = {}
+
+
+def _chave(valor):
+    # O DataFrame pode trazer números como float (7746.0) e a planilha como texto (7746)
+    texto = str(valor).strip()
+    return texto[:-2] if texto.endswith(".0") else texto
+
+
+def mesmo_valor(a, b):
+    """Compara um valor do DataFrame com o da planilha ignorando '7746' x 7746.0."""
+    return _chave(a) == _chave(b)
+
+
+def _letra(cabecalho, coluna):
+    return rowcol_to_a1(1, cabecalho.index(coluna) + 1)[:-1]
+
+
+def _colunas(ws, nomes):
+    """
+    Lê apenas as colunas `nomes` da aba, em uma chamada.
+    Retorna (cabeçalho, {coluna: valores das linhas 2 em diante}).
+    """
+    for tentativa in range(2):
+        if tentativa or ws.title not in _cabecalhos:
+            _cabecalhos[ws.title] = ws.row_values(1)
+        cabecalho = _cabecalhos[ws.title]
+        if any(n not in cabecalho for n in nomes):
+            continue
+        # Sem formatação, como a leitura completa (conn.read) traz os valores
+        intervalos = ws.batch_get(
+            [f"{_letra(cabecalho, n)}:{_letra(cabecalho, n)}" for n in nomes],
+            value_render_option=ValueRenderOption.unformatted,
+        )
+        colunas = {}
+        for nome, intervalo in zip(nomes, intervalos):
+            valores = [linha[0] if linha else "" for linha in intervalo]
+            if not valores or valores[0] != nome:
+                break  # colunas mudaram de lugar: relê o cabeçalho
+            colunas[nome] = valores[1:]
+        else:
+            return cabecalho, colunas
+    raise KeyError(f"Coluna(s) {nomes} não encontrada(s) na aba {ws.title}.")
+
+
+# --- CONCORRÊNCIA OTIMISTA ---
+# O Sheets não tem transação: cada escrita confere, no momento de gravar, se a
+# aba ainda está como a sessão a viu. Se outra sessão gravou antes, a operação
+# é refeita sobre o estado novo (quando dá) ou recusada com ConflitoEscrita.
+TENTATIVAS_ESCRITA = 3
+
+
+class ConflitoEscrita(Exception):
+    """A aba foi alterada por outra sessão entre a leitura e a escrita."""
+
+
+def _conflito(worksheet, mensagem):
+    # A leitura em cache está desatualizada: a próxima execução relê a aba
+    invalidar(worksheet)
+    return ConflitoEscrita(mensagem)
+
+
+def _conferir(worksheet, colunas, coluna_chave, chaves, esperado=None):
+    """
+    Números das linhas (na planilha) cuja coluna-chave está em `chaves`.
+    Com `esperado` ({coluna: valor ou lista de valores aceitos}), confere que
+    essas linhas ainda têm os valores que a sessão leu.
+    """
+    chaves = {_chave(c) for c in chaves} - {""}
+    linhas = [i + 2 for i, v in enumerate(colunas[coluna_chave]) if _chave(v) in chaves]
+
+    for coluna, aceitos in (esperado or {}).items():
+        aceitos = {_chave(a) for a in (aceitos if isinstance(aceitos, (list, tuple, set)) else [aceitos])}
+        valores = colunas[coluna]
+        for n in linhas:
+            atual = valores[n - 2] if n - 2 < len(valores) else ""
+            if _chave(atual) not in aceitos:
+                raise _conflito(worksheet, f"'{coluna}' foi alterado por outra sessão (agora: '{atual}').")
+    return linhas
+
+
+def _aceitos(esperado, valores):
+    """Valores aceitos por coluna: o que a sessão leu ou o que ela mesma vai gravar (repetir não é conflito)."""
+    aceitos = {}
+    for coluna, lidos in (esperado or {}).items():
+        lidos = list(lidos) if isinstance(lidos, (list, tuple, set)) else [lidos]
+        aceitos[coluna] = lidos + ([valores[coluna]] if coluna in valores else [])
+    return aceitos
+
+
+def _blocos(linhas):
+    """Agrupa números de linha consecutivos em (início, fim)."""
+    blocos = []
+    for n in sorted(linhas):
+        if blocos and n == blocos[-1][1] + 1:
+            blocos[-1][1] = n
+        else:
+            blocos.append([n, n])
+    return blocos
+
+
+def _atualizar(worksheet, coluna_chave, operacoes):
+    """
+    Várias atualizações da mesma aba em uma leitura e uma escrita.
+    `operacoes` = [(chaves, valores, esperado)]. Retorna, para cada uma,
+    o número de linhas gravadas ou a ConflitoEscrita que a impediu.
+    """
+    ws = _aba(worksheet)
+    colunas_esperadas = {c for _, _, esperado in operacoes for c in (esperado or {})}
+    cabecalho, colunas = _colunas(ws, [coluna_chave] + sorted(colunas_esperadas - {coluna_chave}))
+
+    # Coluna que ainda não existe no cabeçalho é criada à direita (como em _anexar)
+    faltantes = sorted({c for _, valores, _ in operacoes for c in valores} - set(cabecalho))
+    if faltantes:
+        cabecalho = cabecalho + faltantes
+        _gravar_cabecalho(ws, cabecalho)
+        _cabecalhos[worksheet] = cabecalho
+
+    dados, resultados = [], []
+    for chaves, valores, esperado in operacoes:
+        try:
+            linhas = _conferir(ws.title, colunas, coluna_chave, chaves, _aceitos(esperado, valores))
+        except ConflitoEscrita as e:
+            resultados.append(e)
+            continue
+        for coluna, valor in (valores if linhas else {}).items():
+            letra = _letra(cabecalho, coluna)
+            for inicio, fim in _blocos(linhas):
+                dados.append({"range": f"{letra}{inicio}:{letra}{fim}", "values": [[valor]] * (fim - inicio + 1)})
+            # Operações seguintes do mesmo lote enxergam este valor
+            if coluna in colunas:
+                for n in linhas:
+                    if n - 2 < len(colunas[coluna]):
+                        colunas[coluna][n - 2] = valor
+        resultados.append(len(linhas) if valores else 0)
+
+    if dados:
+        ws.batch_update(dados, value_input_option="USER_ENTERED")
+    return resultados
+
+
+def atualizar_varias(worksheet, coluna_chave, operacoes):
+    """
+    Várias atualizações com valores diferentes ([(chaves, valores, esperado)])
+    em uma leitura e uma escrita. Retorna, para cada uma, o número de linhas
+    gravadas ou a ConflitoEscrita que a impediu.
+    """
+    if not operacoes:
+        return []
+    with medir(f"gravação: {worksheet}"):
+        resultados = _atualizar(worksheet, coluna_chave, operacoes)
+    if any(not isinstance(r, Exception) and r for r in resultados):
+        invalidar(worksheet)
+    return resultados
+
+
+def _excluir(worksheet, coluna_chave, chaves):
+    ws = _aba(worksheet)
+    _, colunas = _colunas(ws, [coluna_chave])
+    linhas = _conferir(worksheet, colunas, coluna_chave, chaves)
+    if not linhas:
+        return 0
+
+    # De baixo para cima, para que os índices dos blocos seguintes não mudem
+    pedidos = [
+        {"deleteDimension": {"range": {"sheetId": ws.id, "dimension": "ROWS", "startIndex": inicio - 1, "endIndex": fim}}}
+        for inicio, fim in reversed(_blocos(linhas))
+    ]
+    ws.spreadsheet.batch_update({"requests": pedidos})
+    return len(linhas)
+
+
+def excluir_linhas(worksheet, coluna_chave, chaves):
+    """Remove da aba apenas as linhas cuja coluna-chave está em `chaves` (uma requisição)."""
+    with medir(f"gravação: {worksheet}"):
+        removidas = _excluir(worksheet, coluna_chave, chaves)
+    if removidas:
+        invalidar(worksheet)
+    return removidas
+
+
+# --- FILA DE GRAVAÇÃO EM SEGUNDO PLANO ---
+# O operador não espera a API: a gravação entra na fila do processo e uma
+# thread grava. Gravações seguidas na mesma aba viram uma requisição só, erros
+# de cota (429) e 5xx são repetidos com espera exponencial, e as leituras já
+# enxergam o que está na fila.
+JANELA_AGRUPAMENTO = 0.5    # s esperando mais gravações antes de enviar
+ESPERA_INICIAL = 1          # s, dobra a cada nova tentativa
+MAX_TENTATIVAS_API = 6
+
+
+def _erro_temporario(e):
+    """Cota excedida, erro do servidor ou falha de rede: vale tentar de novo."""
+    if isinstance(e, APIError):
+        return e.code == 429 or e.code >= 500
+    return isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+
+
+class _Gravacao:
+    _ids = itertools.count(1)
+
+    def __init__(self, tipo, worksheet, **args):
+        self.id = next(self._ids)
+        self.tipo = tipo            # "anexar", "atualizar" ou "excluir"
+        self.worksheet = worksheet
+        self.args = args
+        self.criada_em = time.time()
+        self.autor = st.session_state.get("usuario_nome", "")
+        self.tentativas = 0
+        self.erro = None
+        self.gravadas = None        # anexar: linhas como foram gravadas (ids renumerados)
+
+    def descricao(self):
+        if self.tipo == "anexar":
+            return f"{self.worksheet}: {len(self.args['novas'])} linha(s) nova(s)"
+        chaves = ", ".join(str(c) for c in list(self.args['chaves'])[:3])
+        return f"{self.worksheet}: {self.tipo} {self.args['coluna_chave']} {chaves}"
+
+    def opcoes(self):
+        """O que precisa ser igual para duas gravações virarem uma requisição."""
+        if self.tipo == "anexar":
+            return tuple((k, v) for k, v in self.args.items() if k != "novas")
+        return (self.args["coluna_chave"],)
+
+    def chaves_novas(self):
+        chave = self.args.get("chave") if self.tipo == "anexar" else None
+        return {_chave(v) for v in self.args["novas"][chave]} if chave else set()
+
+    def aplicar(self, df):
+        """Reflete esta gravação (ainda não feita) numa leitura da aba."""
+        if self.tipo == "anexar":
+            novas = self.args["novas"]
+            chave = self.args.get("chave")
+            if chave and chave in df.columns:
+                # Já gravada (a leitura pode ser mais nova que a fila)
+                novas = novas[~novas[chave].map(_chave).isin(df[chave].map(_chave))]
+            return pd.concat([df, novas], ignore_index=True) if not novas.empty else df
+
+        coluna_chave = self.args["coluna_chave"]
+        if coluna_chave not in df.columns:
+            return df
+        alvo = df[coluna_chave].map(_chave).isin({_chave(c) for c in self.args["chaves"]})
+        if self.tipo == "excluir":
+            return df[~alvo].reset_index(drop=True)
+        valores = self.args["valores"]
+        for coluna, aceitos in _aceitos(self.args.get("esperado"), valores).items():
+            # Linha já alterada por outro: a gravação vai falhar, não reflete
+            if coluna in df.columns:
+                alvo &= df[coluna].map(_chave).isin({_chave(a) for a in aceitos})
+        df = df.copy()
+        for coluna, valor in valores.items():
+            if coluna not in df.columns:
+                df[coluna] = ""
+            df[coluna] = df[coluna].astype(object)
+            df.loc[alvo, coluna] = valor
+        return df
+
+
+class FilaEscrita:
+    """Fila de gravações do processo (uma thread grava na ordem de chegada)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pendentes = []
+        self.falhas = []
+        self._geracao = {}
+        self._acordar = threading.Event()
+        self._thread = threading.Thread(target=self._executar, name="fila-escrita", daemon=True)
+        self._thread.start()
+
+    # --- entrada ---
+    def _enfileirar(self, gravacao):
+        contar("gravacoes_enfileiradas")
+        with self._lock:
+            self._pendentes.append(gravacao)
+            self._mudou(gravacao.worksheet)
+        self._acordar.set()
+
+    def _mudou(self, worksheet):
+        self._geracao[worksheet] = self._geracao.get(worksheet, 0) + 1
+
+    def anexar(self, worksheet, novas, criar=False, chave=None, renumerar=None, so_novas=False):
+        """
+        Como anexar_linhas, mas sem esperar a gravação. Retorna a gravação
+        enfileirada: depois de feita, `gravadas` tem as linhas com as chaves
+        finais (renumeradas se colidiram).
+        """
+        if novas is None or novas.empty:
+            return None
+        gravacao = _Gravacao(
+            "anexar", worksheet, novas=novas.copy(), criar=criar, chave=chave, renumerar=renumerar, so_novas=so_novas
+        )
+        self._enfileirar(gravacao)
+        return gravacao
+
+    def atualizar(self, worksheet, coluna_chave, chaves, valores, esperado=None):
+        """Grava `valores` nas linhas de `chaves` (como atualizar_varias), sem esperar a gravação."""
+        self._enfileirar(_Gravacao(
+            "atualizar", worksheet, coluna_chave=coluna_chave, chaves=list(chaves), valores=dict(valores), esperado=esperado
+        ))
+
+    def excluir(self, worksheet, coluna_chave, chaves):
+        """Como excluir_linhas, mas sem esperar a gravação."""
+        self._enfileirar(_Gravacao("excluir", worksheet, coluna_chave=coluna_chave, chaves=list(chaves)))
+
+    # --- leitura ---
+    def geracao(self, worksheet):
+        """Muda sempre que entra ou sai algo da fila desta aba."""
+        return self._geracao.get(worksheet, 0)
+
+    def pendentes(self, worksheet=None):
+        with self._lock:
+            return [g for g in self._pendentes if worksheet is None or g.worksheet == worksheet]
+
+    def aplicar_pendentes(self, worksheet, df):
+        """A leitura da aba como ficará depois que a fila gravar."""
+        for gravacao in self.pendentes(worksheet):
+            df = gravacao.aplicar(df)
+        return df
+
+    def aguardar(self, timeout=60):
+        """Espera a fila esvaziar (antes de operações em massa). Retorna False se não deu tempo."""
+        limite = time.time() + timeout
+        while self.pendentes():
+            if time.time() > limite:
+                return False
+            time.sleep(0.1)
+        return True
+
+    # --- falhas ---
+    def tentar_novamente(self, id_gravacao):
+        with self._lock:
+            gravacao = next((g for g in self.falhas if g.id == id_gravacao), None)
+            if gravacao is None:
+                return
+            self.falhas.remove(gravacao)
+            gravacao.erro, gravacao.tentativas = None, 0
+        self._enfileirar(gravacao)
+
+    def descartar(self, id_gravacao):
+        with self._lock:
+            self.falhas = [g for g in self.falhas if g.id != id_gravacao]
+
+    # --- gravação ---
+    def _proximo_lote(self):
+        """A primeira da fila e as seguintes da mesma aba que podem ir junto."""
+        with self._lock:
+            if not self._pendentes:
+                return []
+            cabeca = self._pendentes[0]
+            lote, chaves = [cabeca], cabeca.chaves_novas()
+            for g in self._pendentes[1:]:
+                if g.worksheet != cabeca.worksheet:
+                    continue
+                # Outro tipo de gravação na mesma aba: respeita a ordem
+                if g.tipo != cabeca.tipo or g.opcoes() != cabeca.opcoes() or g.chaves_novas() & chaves:
+                    break
+                lote.append(g)
+                chaves |= g.chaves_novas()
+            return lote
+
+    def _gravar(self, lote):
+        cabeca = lote[0]
+        with medir(f"gravação: {cabeca.worksheet} (fila, {len(lote)} {cabeca.tipo})"):
+            return self._gravar_lote(lote)
+
+    def _gravar_lote(self, lote):
+        cabeca = lote[0]
+        if cabeca.tipo == "anexar":
+            opcoes = dict(cabeca.opcoes())
+            # Índice (gravação, linha): separa o que cada uma gravou de fato
+            gravadas = _anexar(cabeca.worksheet, pd.concat([g.args["novas"] for g in lote], keys=range(len(lote))), **opcoes)
+            for i, g in enumerate(lote):
+                g.gravadas = gravadas[gravadas.index.get_level_values(0) == i].reset_index(drop=True)
+            return [None] * len(lote)
+        if cabeca.tipo == "excluir":
+            _excluir(cabeca.worksheet, cabeca.args["coluna_chave"], [c for g in lote for c in g.args["chaves"]])
+            return [None] * len(lote)
+        resultados = _atualizar(
+            cabeca.worksheet, cabeca.args["coluna_chave"],
+            [(g.args["chaves"], g.args["valores"], g.args["esperado"]) for g in lote]
+        )
+        return [r if isinstance(r, Exception) else None for r in resultados]
+
+    def _executar(self):
+        while True:
+            self._acordar.wait()
+            time.sleep(JANELA_AGRUPAMENTO)
+            self._acordar.clear()
+            while lote := self._proximo_lote():
+                self._processar(lote)
+
+    def _processar(self, lote):
+        espera = ESPERA_INICIAL
+        for tentativa in range(1, MAX_TENTATIVAS_API + 1):
+            try:
+                erros = self._gravar(lote)
+                break
+            except Exception as e:
+                for g in lote:
+                    g.tentativas, g.erro = tentativa, str(e)
+                if not _erro_temporario(e) or tentativa == MAX_TENTATIVAS_API:
+                    erros = [e] * len(lote)
+                    break
+                time.sleep(espera)
+                espera *= 2
+
+        with self._lock:
+            for g, erro in zip(lote, erros):
+                self._pendentes.remove(g)
+                if erro is not None:
+                    g.erro = str(erro)
+                    self.falhas.append(g)
+            invalidar(lote[0].worksheet)
+            self._mudou(lote[0].worksheet)
+
+
+@st.cache_resource
+def fila_escrita():
+    """Fila de gravação única do processo."""
+    return FilaEscrita()
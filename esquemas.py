@@ -0,0 +1,192 @@
+import logging
+import threading
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+import streamlit as st
+from dados import FORMATO_DATA, ler_aba, versao
+from metricas import cronometrado
+
+# ESQUEMA DAS ABAS: CONVERSÃO ÚNICA PARA TIPOS COMPACTOS
+# Cada aba é convertida uma vez por versão (cache compartilhado pelas sessões):
+# códigos e textos sem espaços, categorias para colunas de poucos valores,
+# números já numéricos e datas já em datetime. Os valores que não puderam ser
+# convertidos ficam registrados em um só lugar (erros_validacao).
+TEXTO = "texto"
+CATEGORIA = "categoria"
+INTEIRO = "inteiro"
+DECIMAL = "decimal"
+DATA = "data"
+
+# padrao: valor para células vazias; categorias: valores sempre presentes
+# (para que atribuições como status = "Concluído" funcionem mesmo sem ocorrência)
+Coluna = namedtuple("Coluna", "tipo padrao categorias", defaults=(None, ()))
+
+ESQUEMAS = {
+    "Produtos": {
+        "Item": Coluna(TEXTO),
+        "Descrição": Coluna(TEXTO),
+        "Categoria": Coluna(CATEGORIA),
+        "Embalagem": Coluna(TEXTO),
+        "Estoque_Inicial": Coluna(DECIMAL),
+    },
+    "Movimentacoes": {
+        "id": Coluna(TEXTO),
+        "data": Coluna(DATA),
+        "codigo": Coluna(TEXTO),
+        "descricao": Coluna(TEXTO),
+        "tipo": Coluna(CATEGORIA, categorias=("Entrada", "Saída")),
+        "quantidade": Coluna(DECIMAL),
+        "usuario": Coluna(TEXTO),
+        "obs": Coluna(TEXTO),
+    },
+    "Pedidos": {
+        "id_pedido": Coluna(TEXTO),
+        "data": Coluna(DATA),
+        "usuario": Coluna(TEXTO),
+        "status": Coluna(CATEGORIA, "Pendente", ("Pendente", "Em Separação", "Concluído")),
+        "loja": Coluna(CATEGORIA),
+        "item_codigo": Coluna(TEXTO),
+        "descricao": Coluna(TEXTO),
+        "quantidade": Coluna(INTEIRO),
+    },
+    "Usuarios": {
+        "usuario": Coluna(TEXTO),
+        "senha": Coluna(TEXTO),
+        "nivel": Coluna(TEXTO, "operador"),
+        "paginas": Coluna(TEXTO),
+        # Tokens de sessão emitidos antes deste instante (epoch) não valem mais
+        "sessao_desde": Coluna(DECIMAL),
+    },
+    "Saldos_Fechamento": {
+        "periodo": Coluna(INTEIRO),
+        "codigo": Coluna(TEXTO),
+        "Entrada": Coluna(DECIMAL),
+        "Saída": Coluna(DECIMAL),
+    },
+}
+
+log = logging.getLogger("esquemas")
+_lock = threading.Lock()
+_erros = {}     # aba -> mensagens da última conversão
+MAX_LINHAS_ERRO = 5
+
+
+# --- CONVERSÃO POR TIPO ---
+def _texto(serie):
+    if pd.api.types.is_numeric_dtype(serie):
+        # 7746.0 -> "7746" (a planilha devolve códigos como número)
+        inteiros = serie.notna() & (serie % 1 == 0)
+        texto = serie.astype(object).where(~inteiros, serie[inteiros].astype("int64").astype(str))
+        return texto.where(serie.notna(), "").astype(str)
+    texto = serie.fillna("").astype(str).str.strip()
+    return texto.mask(texto.isin(["nan", "None", "NaN"]), "")
+
+
+def _numero(serie):
+    """(números, máscara de valores preenchidos que não são número)."""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.astype(float), pd.Series(False, index=serie.index)
+    texto = _texto(serie)
+    numeros = pd.to_numeric(texto.str.replace(",", ".", regex=False), errors="coerce")
+    return numeros, numeros.isna() & (texto != "")
+
+
+def _data(serie):
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie, pd.Series(False, index=serie.index)
+    if pd.api.types.is_numeric_dtype(serie):
+        # Data reconhecida pela planilha: vem como número de série (dias desde 1899-12-30)
+        datas = pd.to_datetime(serie, unit="D", origin="1899-12-30", errors="coerce").dt.round("min")
+        return datas, datas.isna() & serie.notna()
+    texto = _texto(serie)
+    datas = pd.to_datetime(texto, format=FORMATO_DATA, errors="coerce")
+    return datas, datas.isna() & (texto != "")
+
+
+def _converter(serie, coluna):
+    """Retorna (série convertida, máscara de valores inválidos)."""
+    sem_erro = pd.Series(False, index=serie.index)
+    if coluna.tipo in (INTEIRO, DECIMAL):
+        numeros, invalidos = _numero(serie)
+        numeros = numeros.fillna(coluna.padrao or 0)
+        return (numeros.round().astype(np.int32) if coluna.tipo == INTEIRO else numeros), invalidos
+    if coluna.tipo == DATA:
+        return _data(serie)
+
+    texto = _texto(serie)
+    if coluna.padrao is not None:
+        texto = texto.mask(texto == "", coluna.padrao)
+    if coluna.tipo == CATEGORIA:
+        extras = sorted(set(texto.unique()) - set(coluna.categorias))
+        return texto.astype(pd.CategoricalDtype(list(coluna.categorias) + extras)), sem_erro
+    return texto, sem_erro
+
+
+def _vazio(esquema):
+    return pd.DataFrame({
+        nome: _converter(pd.Series([], dtype=object), coluna)[0] for nome, coluna in esquema.items()
+    })
+
+
+def aplicar_esquema(df, esquema_aba, aba=None):
+    """
+    Converte o DataFrame lido da aba `aba` pelo esquema de `esquema_aba`
+    (abas de arquivo usam o esquema da aba de origem). Colunas do esquema que
+    faltam são criadas; colunas fora do esquema ficam como vieram (vazios = "").
+    """
+    aba = aba or esquema_aba
+    esquema = ESQUEMAS[esquema_aba]
+    if df is None or df.empty:
+        _registrar_erros(aba, [])
+        return _vazio(esquema)
+
+    df = df.reset_index(drop=True)
+    convertido, erros = {}, []
+    for nome in list(df.columns) + [c for c in esquema if c not in df.columns]:
+        serie = df[nome] if nome in df.columns else pd.Series("", index=df.index, dtype=object)
+        if nome not in esquema:
+            convertido[nome] = serie.fillna("")
+            continue
+        convertido[nome], invalidos = _converter(serie, esquema[nome])
+        if invalidos.any():
+            # Linha na planilha = índice + 2 (cabeçalho na linha 1)
+            linhas = ", ".join(str(i + 2) for i in invalidos[invalidos].index[:MAX_LINHAS_ERRO])
+            exemplos = ", ".join(f"'{v}'" for v in serie[invalidos].astype(str).unique()[:3])
+            erros.append(f"'{nome}' ({esquema[nome].tipo}): {int(invalidos.sum())} valor(es) inválido(s) "
+                         f"— linhas {linhas}{'...' if invalidos.sum() > MAX_LINHAS_ERRO else ''}; ex.: {exemplos}")
+    _registrar_erros(aba, erros)
+    return pd.DataFrame(convertido)
+
+
+def _registrar_erros(aba, erros):
+    with _lock:
+        anteriores = _erros.get(aba)
+        if erros:
+            _erros[aba] = erros
+        else:
+            _erros.pop(aba, None)
+    if erros and erros != anteriores:
+        for erro in erros:
+            log.warning("%s: %s", aba, erro)
+
+
+def erros_validacao():
+    """{aba: [mensagens]} da última conversão de cada aba."""
+    with _lock:
+        return {aba: list(erros) for aba, erros in _erros.items()}
+
+
+# --- LEITURA TIPADA (CACHE COMPARTILHADO) ---
+@st.cache_data(ttl=3600, max_entries=32, show_spinner=False)
+@cronometrado("esquema: conversão")
+def _carregar(worksheet, esquema_aba, token):
+    return aplicar_esquema(ler_aba(worksheet), esquema_aba, worksheet)
+
+
+def carregar_aba(worksheet, esquema=None):
+    """
+    Aba já convertida pelo esquema (o de `esquema`, se for uma aba de arquivo).
+    Convertida uma vez por versão da aba, inclusive com a fila de gravação.
+    """
+    return _carregar(worksheet, esquema or worksheet, versao(worksheet))
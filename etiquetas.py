@@ -0,0 +1,270 @@
+import io
+from functools import lru_cache
+import qrcode
+from PIL import Image, ImageDraw, ImageFont
+
+# GERAÇÃO DE ETIQUETAS (IMAGEM, LOTE EM PDF)
+# Fica fora das páginas para ser importado só quando a aba de etiquetas abre.
+
+# Configurações de tamanho (em pixels, 200 DPI)
+TAMANHOS = {
+    "pequena": (236, 118),   # 30x15mm
+    "media": (394, 177),     # 50x22.5mm (altura reduzida)  
+    "grande": (591, 236)     # 75x30mm
+}
+FONTE_PONTOS = {"pequena": 10, "media": 14, "grande": 18}
+
+# Quantas etiquetas renderizadas ficam em memória (LRU das visualizações;
+# os lotes em PDF não passam por ele)
+MAX_ETIQUETAS_CACHE = 512
+
+
+# --- CAMADAS REAPROVEITADAS (FONTE E QR CODE) ---
+@lru_cache(maxsize=8)
+def _fonte(pontos):
+    try:
+        return ImageFont.truetype("arialbd.ttf", pontos)
+    except OSError:
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=MAX_ETIQUETAS_CACHE)
+def _qr_imagem(codigo, lado):
+    """QR Code do código já redimensionado (não alterar a imagem retornada)."""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=6,
+        border=1,
+    )
+    qr.add_data(codigo)
+    qr.make(fit=True)
+    
+    # Converter QR Code para imagem PIL
+    qr_img = qr.make_image(fill_color="black", back_color="white")
+    return qr_img.resize((lado, lado), Image.Resampling.LANCZOS)
+
+
+def quebrar_descricao(descricao, tamanho):
+    """Quebra a descrição em linhas (mesma regra para imagem e ZPL)."""
+    max_chars = 15 if tamanho == "pequena" else 25 if tamanho == "media" else 40
+    palavras = descricao.split()
+    linhas = []
+    linha_atual = ""
+    
+    for palavra in palavras:
+        if len(linha_atual + " " + palavra) <= max_chars:
+            linha_atual += " " + palavra if linha_atual else palavra
+        else:
+            if linha_atual:
+                linhas.append(linha_atual)
+            linha_atual = palavra
+    
+    if linha_atual:
+        linhas.append(linha_atual)
+    
+    # Limitar número de linhas conforme altura
+    max_linhas = 2 if tamanho == "pequena" else 3 if tamanho == "media" else 4
+    linhas = linhas[:max_linhas]
+    
+    # Se ainda houver texto, adicionar reticências na última linha
+    if len(descricao) > sum(len(l) for l in linhas) + len(linhas) - 1:
+        if linhas:
+            linhas[-1] = linhas[-1][:max_chars-3] + "..."
+    return linhas
+
+
+# --- FUNÇÃO PARA GERAR ETIQUETA (APENAS QR + DESCRIÇÃO) ---
+def gerar_etiqueta(codigo, descricao, tamanho="media"):
+    """
+    Gera etiqueta minimalista: apenas QR Code + Descrição centralizada.
+    Etiquetas iguais vêm do cache; a imagem retornada é uma cópia.
+    """
+    return _renderizar_etiqueta(str(codigo), str(descricao), tamanho).copy()
+
+
+@lru_cache(maxsize=MAX_ETIQUETAS_CACHE)
+def etiqueta_png(codigo, descricao, tamanho="media"):
+    """Etiqueta já codificada em PNG (para download/ZIP sem recodificar a cada cópia)."""
+    buf = io.BytesIO()
+    _renderizar_etiqueta(str(codigo), str(descricao), tamanho).save(buf, format='PNG')
+    return buf.getvalue()
+
+
+@lru_cache(maxsize=MAX_ETIQUETAS_CACHE)
+def _renderizar_etiqueta(codigo, descricao, tamanho):
+    return _desenhar_etiqueta(codigo, descricao, tamanho)
+
+
+def _desenhar_etiqueta(codigo, descricao, tamanho):
+    largura, altura = TAMANHOS.get(tamanho, TAMANHOS["media"])
+    
+    # QR Code ocupa 85% da altura da etiqueta
+    qr_tamanho = int(altura * 0.85)
+    qr_img = _qr_imagem(codigo, qr_tamanho)
+    
+    # Criar imagem da etiqueta
+    etiqueta = Image.new('RGB', (largura, altura), 'white')
+    draw = ImageDraw.Draw(etiqueta)
+    
+    # Colar QR Code à esquerda (centralizado verticalmente)
+    qr_pos_x = 8
+    qr_pos_y = (altura - qr_tamanho) // 2
+    etiqueta.paste(qr_img, (qr_pos_x, qr_pos_y))
+    
+    # Área disponível para texto (à direita do QR Code)
+    area_texto_x = qr_pos_x + qr_tamanho + 10
+    area_texto_largura = largura - area_texto_x - 8
+    
+    # Fonte proporcional ao tamanho da etiqueta
+    fonte_desc = _fonte(FONTE_PONTOS.get(tamanho, FONTE_PONTOS["grande"]))
+    
+    # Quebrar descrição em múltiplas linhas se necessário
+    linhas = quebrar_descricao(descricao, tamanho)
+    
+    # Calcular altura total do texto para centralização vertical
+    bbox = draw.textbbox((0, 0), "Ay", font=fonte_desc)  # Referência para altura
+    altura_linha = bbox[3] - bbox[1]
+    espacamento = 2  # Espaço entre linhas
+    altura_total_texto = len(linhas) * altura_linha + (len(linhas) - 1) * espacamento
+    
+    # Posição Y inicial (centralizada verticalmente)
+    y_inicial = (altura - altura_total_texto) // 2
+    
+    # Desenhar cada linha centralizada horizontalmente na área de texto
+    for i, linha in enumerate(linhas):
+        bbox_linha = draw.textbbox((0, 0), linha, font=fonte_desc)
+        largura_texto = bbox_linha[2] - bbox_linha[0]
+        
+        # Centralizar horizontalmente na área disponível
+        x_texto = area_texto_x + (area_texto_largura - largura_texto) // 2
+        y_texto = y_inicial + i * (altura_linha + espacamento)
+        
+        draw.text((x_texto, y_texto), linha, fill='black', font=fonte_desc)
+    
+    # Borda fina
+    draw.rectangle([(0, 0), (largura-1, altura-1)], outline='black', width=1)
+    
+    return etiqueta
+
+
+# --- LOTE DE ETIQUETAS EM PDF ---
+DPI = 200
+
+# Páginas em pixels a 200 DPI. "rolo" = uma etiqueta por página (tamanho da etiqueta)
+LAYOUTS = {
+    "a4": {"pagina": (1654, 2339), "margem": 40, "espaco": 12},
+    "rolo": {"pagina": None, "margem": 0, "espaco": 0},
+}
+
+
+def renderizar_lote(itens, tamanho="media"):
+    """
+    Renderiza cada (codigo, descricao) distinto uma única vez, em tons de cinza
+    e fora do LRU (um lote grande não expulsa as visualizações nem fica em
+    memória depois do PDF). Retorna dict -> imagem.
+    """
+    unicos = list(dict.fromkeys((str(c), str(d)) for c, d in itens))
+    return {(c, d): _desenhar_etiqueta(c, d, tamanho).convert("L") for c, d in unicos}
+
+
+def montar_pdf(itens, tamanho="media", layout="a4"):
+    """
+    Monta um PDF com as etiquetas lado a lado.
+    itens -- lista de (codigo, descricao, copias)
+    """
+    imagens = renderizar_lote([(c, d) for c, d, _ in itens], tamanho)
+    sequencia = [imagens[(str(c), str(d))] for c, d, copias in itens for _ in range(int(copias))]
+    if not sequencia:
+        return b""
+
+    larg_etq, alt_etq = sequencia[0].size
+    cfg = LAYOUTS[layout]
+    larg_pag, alt_pag = cfg["pagina"] or (larg_etq, alt_etq)
+    margem, espaco = cfg["margem"], cfg["espaco"]
+
+    colunas = max(1, (larg_pag - 2 * margem + espaco) // (larg_etq + espaco))
+    linhas = max(1, (alt_pag - 2 * margem + espaco) // (alt_etq + espaco))
+    por_pagina = colunas * linhas
+
+    paginas = []
+    for inicio in range(0, len(sequencia), por_pagina):
+        pagina = Image.new("L", (larg_pag, alt_pag), 255)
+        for i, img in enumerate(sequencia[inicio:inicio + por_pagina]):
+            x = margem + (i % colunas) * (larg_etq + espaco)
+            y = margem + (i // colunas) * (alt_etq + espaco)
+            pagina.paste(img, (x, y))
+        # Preto e branco puro: PDF ~15x menor e nítido para impressão
+        paginas.append(pagina.convert("1", dither=Image.Dither.NONE))
+
+    buf = io.BytesIO()
+    paginas[0].save(buf, format="PDF", save_all=True, append_images=paginas[1:], resolution=DPI)
+    return buf.getvalue()
+
+
+# --- SAÍDA NATIVA PARA IMPRESSORA TÉRMICA (ZPL) ---
+# Impressoras Zebra de 203 DPI (8 pontos/mm); mesmo desenho da versão em imagem
+ZPL_TAMANHOS = {
+    "pequena": (240, 120),   # 30x15mm
+    "media": (400, 180),     # 50x22.5mm
+    "grande": (600, 240)     # 75x30mm
+}
+
+
+def _zpl_campo(texto):
+    # ^FH permite escapar em hexadecimal os caracteres de controle do ZPL
+    texto = str(texto).replace("\\", "\\5C").replace("^", "\\5E").replace("~", "\\7E")
+    return f"^FH\\^FD{texto}^FS"
+
+
+def _modulos_qr(codigo):
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_M, border=0)
+    qr.add_data(codigo)
+    qr.make(fit=True)
+    return qr.modules_count
+
+
+def etiqueta_zpl(codigo, descricao, tamanho="media", copias=1):
+    """Etiqueta em ZPL: QR Code à esquerda e descrição centralizada à direita."""
+    codigo, descricao = str(codigo), str(descricao)
+    largura, altura = ZPL_TAMANHOS.get(tamanho, ZPL_TAMANHOS["media"])
+
+    # QR Code ocupa ~85% da altura (ampliação inteira de cada módulo)
+    ampliacao = max(1, min(10, int(altura * 0.85) // _modulos_qr(codigo)))
+    qr_lado = ampliacao * _modulos_qr(codigo)
+    qr_x, qr_y = 8, (altura - qr_lado) // 2
+
+    area_x = qr_x + qr_lado + 10
+    area_largura = largura - area_x - 8
+    # Fonte 0 (escalável): largura = corpo da fonte da imagem, altura 40% maior
+    fonte_largura = FONTE_PONTOS.get(tamanho, FONTE_PONTOS["grande"])
+    fonte = int(fonte_largura * 1.4)
+    espacamento = 2
+
+    linhas = quebrar_descricao(descricao, tamanho)
+    altura_texto = len(linhas) * fonte + (len(linhas) - 1) * espacamento
+    y_inicial = (altura - altura_texto) // 2
+
+    zpl = [
+        "^XA",
+        "^CI28",
+        f"^PW{largura}",
+        f"^LL{altura}",
+        f"^FO{qr_x},{qr_y}^BQN,2,{ampliacao}" + _zpl_campo(f"MA,{codigo}"),
+    ]
+    for i, linha in enumerate(linhas):
+        y = y_inicial + i * (fonte + espacamento)
+        zpl.append(f"^FO{area_x},{y}^A0N,{fonte},{fonte_largura}^FB{area_largura},1,0,C,0" + _zpl_campo(linha))
+    zpl.append(f"^FO0,0^GB{largura},{altura},1^FS")
+    if int(copias) > 1:
+        zpl.append(f"^PQ{int(copias)}")
+    zpl.append("^XZ")
+    return "\n".join(zpl) + "\n"
+
+
+def montar_zpl(itens, tamanho="media"):
+    """
+    Lote em ZPL: um bloco por item com ^PQ para as cópias (a impressora repete).
+    itens -- lista de (codigo, descricao, copias)
+    """
+    return "".join(etiqueta_zpl(c, d, tamanho, copias) for c, d, copias in itens)
@@ -0,0 +1,56 @@
+import hashlib
+import io
+import json
+import pandas as pd
+import streamlit as st
+from metricas import cronometrado
+
+# RELATÓRIOS DA SEPARAÇÃO (HISTÓRICO CONFERIDO -> EXCEL / CSV / TXT POR LOJA)
+# Colunas do histórico: pedido, item, desc, loja, qtd, hora
+# Os arquivos só são gerados quando alguém clica para baixar (download adiado)
+# e ficam em cache pelo conteúdo do histórico.
+
+
+def _pivot(df):
+    return df.pivot_table(index=['item', 'desc'], columns='loja', values='qtd', aggfunc='sum').reset_index().fillna(0)
+
+
+def gerar_excel(df):
+    """Planilha organizada: COD | DESC | LOJA 1 | LOJA 2..."""
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        _pivot(df).to_excel(writer, index=False, sheet_name='Relatorio')
+    return output.getvalue()
+
+
+def gerar_csv(df):
+    """Mesmo layout do Excel, sem openpyxl (";" e BOM para o Excel em português abrir direto)."""
+    return _pivot(df).to_csv(index=False, sep=";").encode("utf-8-sig")
+
+
+def gerar_zip(df):
+    """Um TXT por loja dentro de um ZIP."""
+    import zipfile
+    # Todas as linhas formatadas de uma vez e juntadas por loja (na ordem em que aparecem)
+    linhas = "ITEM: " + df['item'].astype(str) + " | DESC: " + df['desc'].astype(str) + " | QTD: " + df['qtd'].astype(str) + "\n"
+    por_loja = linhas.groupby(df['loja'], sort=False).agg("".join)
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as z:
+        for lj, corpo in por_loja.items():
+            z.writestr(f"{lj}.txt", f"LOJA: {lj}\n" + "-"*25 + "\n" + corpo)
+    return buf.getvalue()
+
+
+GERADORES = {"excel": gerar_excel, "csv": gerar_csv, "zip": gerar_zip}
+
+
+def chave_historico(historico):
+    """Hash do histórico conferido (lista de dicts da sessão)."""
+    return hashlib.sha1(json.dumps(historico, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+@st.cache_data(max_entries=16, show_spinner=False)
+@cronometrado("separação: exportação")
+def exportar(formato, chave, _df):
+    """Arquivo do formato pedido; `chave` (chave_historico) identifica o conteúdo de `_df`."""
+    return GERADORES[formato](_df)
@@ -0,0 +1,233 @@
+import io
+import os
+from datetime import datetime
+import pandas as pd
+import streamlit as st
+from dados import anexar_linhas, atualizar_varias, fila_escrita, renumerar_sufixo, FORMATO_DATA
+from esquemas import aplicar_esquema, erros_validacao
+from metricas import cronometrado
+
+# IMPORTAÇÃO EM LOTE (PLANILHAS CSV/XLSX)
+# O arquivo é lido em blocos, convertido pelo esquema da aba de destino e
+# comparado com o que já existe; a gravação é uma só requisição por tipo.
+PASTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "base")
+LINHAS_POR_BLOCO = 5_000
+
+# Cabeçalho do arquivo (minúsculo, sem espaços nas pontas) -> coluna da aba Produtos
+COLUNAS_CATALOGO = {
+    "item": "Item",
+    "codigo": "Item",
+    "código": "Item",
+    "descrição": "Descrição",
+    "descricao": "Descrição",
+    "embalagem": "Embalagem",
+    "tipo": "Categoria",
+    "categoria": "Categoria",
+    "estoque_inicial": "Estoque_Inicial",
+}
+ACAO_INSERIR = "inserir"
+ACAO_ATUALIZAR = "atualizar"
+ACAO_MANTER = "sem alteração"
+
+
+# --- LEITURA EM BLOCOS ---
+def _blocos_csv(conteudo):
+    # sep=None detecta "," ou ";" (exportações do Excel em português usam ";")
+    yield from pd.read_csv(
+        io.BytesIO(conteudo), dtype=str, encoding="utf-8-sig", sep=None, engine="python",
+        keep_default_na=False, chunksize=LINHAS_POR_BLOCO,
+    )
+
+
+def _blocos_xlsx(conteudo):
+    from openpyxl import load_workbook
+    livro = load_workbook(io.BytesIO(conteudo), read_only=True, data_only=True)
+    try:
+        linhas = livro.worksheets[0].iter_rows(values_only=True)
+        cabecalho = [str(c).strip() if c is not None else "" for c in next(linhas, [])]
+        bloco = []
+        for linha in linhas:
+            bloco.append(linha)
+            if len(bloco) == LINHAS_POR_BLOCO:
+                yield pd.DataFrame(bloco, columns=cabecalho)
+                bloco = []
+        if bloco or not cabecalho:
+            yield pd.DataFrame(bloco, columns=cabecalho)
+    finally:
+        livro.close()
+
+
+def ler_planilha(conteudo, nome_arquivo, colunas):
+    """
+    Lê um CSV/XLSX em blocos e devolve só as colunas reconhecidas, já com os
+    nomes da aba (`colunas` = {cabeçalho em minúsculas: coluna da aba}).
+    """
+    blocos = _blocos_xlsx(conteudo) if nome_arquivo.lower().endswith((".xlsx", ".xlsm")) else _blocos_csv(conteudo)
+    partes = []
+    for bloco in blocos:
+        bloco = bloco.rename(columns=lambda c: colunas.get(str(c).strip().lower(), None))
+        partes.append(bloco.loc[:, [c for c in bloco.columns if c is not None]])
+    df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame()
+    # Mesmo nome vindo de dois cabeçalhos (ex.: TIPO e Categoria): vale o primeiro
+    return df.loc[:, ~df.columns.duplicated()]
+
+
+# --- CATÁLOGO (ABA PRODUTOS) ---
+@st.cache_data(max_entries=4, show_spinner=False)
+@cronometrado("importação: ler catálogo")
+def ler_catalogo(conteudo, nome_arquivo):
+    """
+    (catálogo convertido pelo esquema de Produtos, células vazias no arquivo,
+    colunas presentes no arquivo, códigos repetidos, valores inválidos).
+    Linhas sem código são ignoradas; código repetido vale a última linha.
+    """
+    bruto = ler_planilha(conteudo, nome_arquivo, COLUNAS_CATALOGO)
+    if "Item" not in bruto.columns:
+        raise ValueError("O arquivo precisa de uma coluna Item (código do produto).")
+    colunas = list(bruto.columns)
+    aba = f"Importação: {nome_arquivo}"
+    # Vazio no arquivo é diferente de zero/texto vazio depois da conversão
+    vazios = bruto.fillna("").astype(str).apply(lambda c: c.str.strip() == "")
+    df = aplicar_esquema(bruto, "Produtos", aba=aba)[colunas]
+    manter = df["Item"] != ""
+    df, vazios = df[manter], vazios[manter]
+    repetidos = sorted(df.loc[df["Item"].duplicated(), "Item"].unique())
+    ultimas = ~df["Item"].duplicated(keep="last")
+    df, vazios = df[ultimas].reset_index(drop=True), vazios[ultimas].reset_index(drop=True)
+    return df, vazios, colunas, repetidos, erros_validacao().get(aba, [])
+
+
+def catalogo_padrao():
+    """(conteúdo, nome) do catálogo mestre que acompanha o sistema (base/)."""
+    for nome in ("BASE.csv", "BASE.xlsx"):
+        caminho = os.path.join(PASTA_BASE, nome)
+        if os.path.exists(caminho):
+            with open(caminho, "rb") as f:
+                return f.read(), nome
+    return None, None
+
+
+def comparar_catalogo(atual, novo, vazios, colunas, limpar=False):
+    """
+    Uma linha por código do arquivo com a ação (inserir / atualizar / sem
+    alteração), as colunas que mudam e as que ficariam vazias. Só compara as
+    colunas do arquivo; célula vazia só apaga o valor do cadastro com `limpar`.
+    """
+    comparadas = [c for c in colunas if c != "Item"]
+    # Código repetido na aba: a atualização vale para todas as linhas dele
+    atual = atual[["Item"] + comparadas].drop_duplicates("Item")
+    juntos = novo.merge(atual, on="Item", how="left", suffixes=("", "_atual"), indicator=True)
+    existe = juntos["_merge"] == "both"
+
+    alteradas = pd.Series("", index=juntos.index)
+    esvaziar = pd.Series("", index=juntos.index)
+    for c in comparadas:
+        difere = existe & (juntos[c].astype(str) != juntos[f"{c}_atual"].astype(str))
+        alteradas = alteradas.mask(difere & ~vazios[c], alteradas + ", " + c)
+        esvaziar = esvaziar.mask(difere & vazios[c], esvaziar + ", " + c)
+    alteradas = alteradas.str.removeprefix(", ")
+    esvaziar = esvaziar.str.removeprefix(", ")
+
+    resultado = juntos[list(novo.columns)].copy()
+    resultado.insert(0, "ação", ACAO_MANTER)
+    resultado.loc[~existe, "ação"] = ACAO_INSERIR
+    muda = (alteradas != "") | ((esvaziar != "") if limpar else False)
+    resultado.loc[existe & muda, "ação"] = ACAO_ATUALIZAR
+    resultado.insert(1, "alterações", alteradas)
+    resultado.insert(2, "esvaziar", esvaziar)
+    return resultado
+
+
+def aplicar_catalogo(diferencas, colunas, limpar=False):
+    """
+    Grava as diferenças: todas as atualizações numa requisição de intervalos e
+    todos os itens novos num único append. As colunas de "esvaziar" só são
+    gravadas com `limpar`. Retorna (inseridos, atualizados, conflitos).
+    """
+    # Edições individuais ainda na fila chegam antes do lote
+    fila_escrita().aguardar()
+    atualizar = diferencas[diferencas["ação"] == ACAO_ATUALIZAR]
+    operacoes = []
+    for linha in atualizar.astype(object).to_dict("records"):
+        gravar = [c for c in linha["alterações"].split(", ") if c]
+        if limpar:
+            gravar += [c for c in linha["esvaziar"].split(", ") if c]
+        operacoes.append(([linha["Item"]], {c: linha[c] for c in gravar}, None))
+    resultados = atualizar_varias("Produtos", "Item", operacoes)
+    conflitos = [str(r) for r in resultados if isinstance(r, Exception)]
+
+    inserir = diferencas.loc[diferencas["ação"] == ACAO_INSERIR, [c for c in diferencas.columns if c not in ("ação", "alterações", "esvaziar")]]
+    if "Estoque_Inicial" not in colunas:
+        inserir = inserir.assign(Estoque_Inicial=0.0)
+    anexar_linhas("Produtos", inserir, chave="Item")
+    return len(inserir), len(resultados) - len(conflitos), conflitos
+
+
+# --- MOVIMENTAÇÕES (NOTA / RECEBIMENTO) ---
+COLUNAS_MOVIMENTOS = {
+    "codigo": "codigo",
+    "código": "codigo",
+    "item": "codigo",
+    "quantidade": "quantidade",
+    "qtd": "quantidade",
+    "tipo": "tipo",
+    "obs": "obs",
+    "observação": "obs",
+    "observacao": "obs",
+}
+TIPOS_MOVIMENTO = {"entrada": "Entrada", "saida": "Saída", "saída": "Saída", "": "Entrada"}
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+@cronometrado("importação: ler movimentos")
+def ler_movimentos(conteudo, nome_arquivo):
+    """Linhas do arquivo (codigo, quantidade, tipo, obs); tipo vazio vale Entrada."""
+    bruto = ler_planilha(conteudo, nome_arquivo, COLUNAS_MOVIMENTOS)
+    faltam = [c for c in ("codigo", "quantidade") if c not in bruto.columns]
+    if faltam:
+        raise ValueError(f"O arquivo precisa das colunas {', '.join(faltam)}.")
+    df = aplicar_esquema(bruto, "Movimentacoes", aba=f"Importação: {nome_arquivo}")
+    df = df.loc[df["codigo"] != "", ["codigo", "quantidade", "tipo", "obs"]].reset_index(drop=True)
+    df["tipo"] = df["tipo"].astype(str).str.strip().str.lower().map(TIPOS_MOVIMENTO).fillna(df["tipo"].astype(str))
+    return df
+
+
+def validar_movimentos(df, produtos):
+    """
+    (válidas com a descrição do cadastro, rejeitadas com o motivo). Todos os
+    códigos são conferidos com a aba Produtos em um único merge.
+    """
+    cadastro = produtos[["Item", "Descrição"]].drop_duplicates("Item").rename(columns={"Item": "codigo", "Descrição": "descricao"})
+    juntos = df.merge(cadastro, on="codigo", how="left", indicator=True)
+    juntos["descricao"] = juntos["descricao"].fillna("")
+
+    motivo = pd.Series("", index=juntos.index)
+    motivo = motivo.mask(~juntos["tipo"].isin(["Entrada", "Saída"]), "tipo inválido")
+    motivo = motivo.mask(juntos["quantidade"] <= 0, "quantidade inválida")
+    motivo = motivo.mask(juntos["_merge"] == "left_only", "código não cadastrado")
+
+    colunas = ["codigo", "descricao", "tipo", "quantidade", "obs"]
+    rejeitadas = juntos.loc[motivo != "", colunas].assign(motivo=motivo[motivo != ""])
+    return juntos.loc[motivo == "", colunas].reset_index(drop=True), rejeitadas.reset_index(drop=True)
+
+
+def lancar_movimentos(validas, usuario, nome_arquivo):
+    """
+    Enfileira todas as linhas válidas como um único append em Movimentacoes
+    (uma invalidação de cache). Retorna as linhas no formato da aba.
+    """
+    agora = datetime.now()
+    novos = pd.DataFrame({
+        # Sufixo com letra: renumerar_sufixo só mexe no "-N" final, então ids
+        # do mesmo lote continuam distintos mesmo se colidirem com outra sessão
+        "id": [f"{agora:%Y%m%d%H%M%S}-L{i:03d}" for i in range(1, len(validas) + 1)],
+        "data": agora.strftime(FORMATO_DATA),
+        "codigo": validas["codigo"].to_numpy(),
+        "descricao": validas["descricao"].to_numpy(),
+        "tipo": validas["tipo"].astype(str).to_numpy(),
+        "quantidade": validas["quantidade"].astype(float).to_numpy(),
+        "usuario": usuario,
+        "obs": validas["obs"].mask(validas["obs"] == "", f"Importado de {nome_arquivo}").to_numpy(),
+    })
+    fila_escrita().anexar("Movimentacoes", novos, chave="id", renumerar=renumerar_sufixo("id"))
+    return novos
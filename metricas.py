@@ -0,0 +1,164 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# INSTRUMENTAÇÃO: TEMPO POR ETAPA, CHAMADAS À API DO GOOGLE, CACHE E BYTES
+# Tudo é agrupado por sessão do navegador; o que roda nas threads do processo
+# (fila de gravação, observadores) fica em SEGUNDO_PLANO.
+SEGUNDO_PLANO = "segundo plano"
+MAX_SESSOES = 100
+MAX_EXECUCOES = 20
+
+# Log estruturado (uma linha JSON por evento), para coleta externa.
+# Desligado por padrão (WARNING); METRICAS_LOG=INFO liga os eventos.
+log = logging.getLogger("metricas")
+if not log.handlers:
+    _saida = logging.StreamHandler()
+    _saida.setFormatter(logging.Formatter("%(message)s"))
+    log.addHandler(_saida)
+    log.setLevel(os.environ.get("METRICAS_LOG", "WARNING").upper())
+    log.propagate = False
+
+
+def _sessao():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx else SEGUNDO_PLANO
+
+
+def _registrar_log(evento, sessao, **campos):
+    if log.isEnabledFor(logging.INFO):
+        log.info(json.dumps({"evento": evento, "sessao": sessao, "ts": round(time.time(), 3), **campos}, ensure_ascii=False))
+
+
+class _Sessao:
+    def __init__(self):
+        self.etapas = {}            # nome -> [chamadas, total (s), máximo (s)]
+        self.contadores = Counter()
+        self.execucoes = deque(maxlen=MAX_EXECUCOES)   # [(início, [(nível, etapa, s)])]
+
+
+class Metricas:
+    """Acumula tempos e contadores por sessão (compartilhado pelo processo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessoes = OrderedDict()
+        self._pilha = threading.local()
+
+    def _dados(self, sessao):
+        # Chamar com o lock; descarta as sessões mais antigas
+        if sessao not in self._sessoes:
+            self._sessoes[sessao] = _Sessao()
+            while len(self._sessoes) > MAX_SESSOES:
+                self._sessoes.popitem(last=False)
+        self._sessoes.move_to_end(sessao)
+        return self._sessoes[sessao]
+
+    def nova_execucao(self):
+        """Marca o início de um rerun da sessão atual."""
+        with self._lock:
+            self._dados(_sessao()).execucoes.append((time.time(), []))
+
+    @contextmanager
+    def medir(self, etapa):
+        pilha = self._pilha.__dict__.setdefault("etapas", [])
+        nivel = len(pilha)
+        pilha.append(etapa)
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            duracao = time.perf_counter() - inicio
+            pilha.pop()
+            sessao = _sessao()
+            with self._lock:
+                dados = self._dados(sessao)
+                total = dados.etapas.setdefault(etapa, [0, 0.0, 0.0])
+                total[0] += 1
+                total[1] += duracao
+                total[2] = max(total[2], duracao)
+                if dados.execucoes:
+                    dados.execucoes[-1][1].append((nivel, etapa, duracao))
+            _registrar_log("etapa", sessao, etapa=etapa, ms=round(duracao * 1000, 2), nivel=nivel)
+
+    def contar(self, nome, quantidade=1):
+        sessao = _sessao()
+        with self._lock:
+            self._dados(sessao).contadores[nome] += quantidade
+
+    def chamada_api(self, metodo, url, enviados, recebidos, status):
+        sessao = _sessao()
+        with self._lock:
+            contadores = self._dados(sessao).contadores
+            contadores["api_google"] += 1
+            contadores["bytes_enviados"] += enviados
+            contadores["bytes_recebidos"] += recebidos
+        _registrar_log("api_google", sessao, metodo=metodo, url=url, status=status,
+                       bytes_enviados=enviados, bytes_recebidos=recebidos)
+
+    def resumo(self, sessao=None):
+        """(etapas, contadores, execuções concluídas) de uma sessão (padrão: a atual)."""
+        with self._lock:
+            dados = self._dados(sessao or _sessao())
+            # A última execução ainda está em andamento
+            return (
+                {k: list(v) for k, v in dados.etapas.items()},
+                Counter(dados.contadores),
+                [(inicio, list(etapas)) for inicio, etapas in list(dados.execucoes)[:-1]],
+            )
+
+
+@st.cache_resource
+def metricas():
+    return Metricas()
+
+
+def medir(etapa):
+    """Context manager que cronometra `etapa` na sessão atual."""
+    return metricas().medir(etapa)
+
+
+def cronometrado(etapa):
+    """
+    Decorador equivalente a `medir`. Abaixo de @st.cache_data, mede só quando
+    a função realmente roda (falta no cache).
+    """
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def medida(*args, **kwargs):
+            with medir(etapa):
+                return funcao(*args, **kwargs)
+        return medida
+    return decorador
+
+
+def contar(nome, quantidade=1):
+    metricas().contar(nome, quantidade)
+
+
+# --- CHAMADAS À API DO GOOGLE (HOOK NA SESSÃO HTTP DO GSPREAD) ---
+def _resposta(resposta, *args, **kwargs):
+    pedido = resposta.request
+    corpo = pedido.body or b""
+    recebidos = resposta.headers.get("Content-Length")
+    metricas().chamada_api(
+        pedido.method, pedido.path_url.split("?")[0], len(corpo),
+        int(recebidos) if recebidos else len(resposta.content), resposta.status_code,
+    )
+
+
+def instrumentar_conexao(conn):
+    """Conta chamadas e bytes da sessão HTTP do gspread (uma vez por conexão)."""
+    cliente = getattr(getattr(conn, "client", None), "_client", None)
+    sessao_http = getattr(getattr(cliente, "http_client", None), "session", None)
+    if sessao_http is None or getattr(sessao_http, "_metricas", False):
+        return
+    sessao_http.hooks.setdefault("response", []).append(_resposta)
+    sessao_http._metricas = True
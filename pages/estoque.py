@@ -1,10 +1,11 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 from datetime import datetime
-import qrcode
-from PIL import Image, ImageDraw, ImageFont
-import io
+from dados import fila_escrita, versao, mesmo_valor, renumerar_sufixo
+from esquemas import carregar_aba
+from busca import indice_produtos
+from saldos import obter_saldo, fechar_periodo, datas_movimentos, periodo_fechamento, ABA_FECHAMENTOS
+from metricas import cronometrado, medir
 
 # 1. SEGURANÇA: Verifica login
 if "logado" not in st.session_state or not st.session_state["logado"]:
@@ -17,657 +18,725 @@ st.title("📦 Controle de Estoque Operacional")
 nivel_usuario = st.session_state.get("nivel", "operador")
 usuario_atual = st.session_state.get("usuario_nome", "Usuário")
 
-# 3. CONEXÃO
-URL_PLANILHA = "https://docs.google.com/spreadsheets/d/1lIldvBHzJ3VIczDvZv-WRFtp3R7Jf5yfM2LrIlseshE/edit?usp=sharing"
-conn = st.connection("gsheets", type=GSheetsConnection)
-
-# 4. CARREGAMENTO DOS DADOS COM TRATAMENTO DE TIPOS (Blindagem)
-@st.cache_data(ttl=60)
+# 3. CARREGAMENTO DOS DADOS (tipos definidos em esquemas.py)
+# A conversão tem cache por versão da aba, compartilhado com as outras páginas
+@cronometrado("estoque: carregar_dados")
 def carregar_dados():
     try:
-        df_p = conn.read(spreadsheet=URL_PLANILHA, worksheet="Produtos", ttl=0).fillna("")
-        df_m = conn.read(spreadsheet=URL_PLANILHA, worksheet="Movimentacoes", ttl=0).fillna("")
-        
-        # FORÇAR TIPO TEXTO (Para evitar erro de merge Object vs Float)
-        df_p['Item'] = df_p['Item'].astype(str).str.strip()
-        df_p['Descrição'] = df_p['Descrição'].astype(str).str.strip()
-        df_p['Categoria'] = df_p['Categoria'].astype(str).str.strip()
-        df_p['Embalagem'] = df_p['Embalagem'].astype(str).str.strip()
-        
-        if not df_m.empty:
-            df_m['codigo'] = df_m['codigo'].astype(str).str.strip()
-            df_m['tipo'] = df_m['tipo'].astype(str).str.strip()
-        
-        return df_p, df_m
+        return carregar_aba("Produtos"), carregar_aba("Movimentacoes")
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}")
         return pd.DataFrame(), pd.DataFrame()
 
+# Fechamentos mensais (a aba pode ainda não existir)
+def carregar_fechamentos():
+    try:
+        return carregar_aba(ABA_FECHAMENTOS)
+    except Exception:
+        return pd.DataFrame()
+
 df_p, df_m = carregar_dados()
+df_f = carregar_fechamentos()
 
-# --- CÁLCULO DE SALDO (Correção do Erro de Merge) ---
-def calcular_estoque(p, m):
-    p_result = p.copy()
-    p_result['Estoque_Inicial'] = pd.to_numeric(p_result['Estoque_Inicial'], errors='coerce').fillna(0)
-    
-    if m.empty:
-        p_result['Entrada'] = 0
-        p_result['Saída'] = 0
-        p_result['Saldo_Atual'] = p_result['Estoque_Inicial']
-        return p_result
-    
-    m_copy = m.copy()
-    m_copy['quantidade'] = pd.to_numeric(m_copy['quantidade'], errors='coerce').fillna(0)
-    
-    # Agrupa por código e tipo
-    resumo = m_copy.groupby(['codigo', 'tipo'])['quantidade'].sum().unstack(fill_value=0)
-    
-    # Garante colunas de Entrada e Saída
-    for col in ['Entrada', 'Saída']:
-        if col not in resumo.columns:
-            resumo[col] = 0
-            
-    # FORÇA INDEX PARA STRING (Essencial para o merge funcionar)
-    resumo.index = resumo.index.astype(str)
-            
-    # Merge seguro (String com String)
-    df_res = p_result.merge(resumo[['Entrada', 'Saída']], left_on='Item', right_index=True, how='left').fillna(0)
-    df_res['Saldo_Atual'] = df_res['Estoque_Inicial'] + df_res['Entrada'] - df_res['Saída']
-    return df_res
+# Índice de busca do catálogo (um por versão da aba Produtos, para todos os filtros)
+indice = indice_produtos(versao("Produtos"), df_p)
 
-df_estoque = calcular_estoque(df_p, df_m)
-
-# --- FUNÇÃO PARA GERAR ETIQUETA (APENAS QR + DESCRIÇÃO) ---
-def gerar_etiqueta(codigo, descricao, tamanho="media"):
-    """
-    Gera etiqueta minimalista: apenas QR Code + Descrição centralizada
-    """
-    
-    # Configurações de tamanho (em pixels, 200 DPI)
-    tamanhos = {
-        "pequena": (236, 118),   # 30x15mm
-        "media": (394, 177),     # 50x22.5mm (altura reduzida)  
-        "grande": (591, 236)     # 75x30mm
-    }
-    
-    largura, altura = tamanhos.get(tamanho, tamanhos["media"])
-    
-    # Criar QR Code
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=6,
-        border=1,
-    )
-    qr.add_data(codigo)
-    qr.make(fit=True)
-    
-    # Converter QR Code para imagem PIL
-    qr_img = qr.make_image(fill_color="black", back_color="white")
-    
-    # QR Code ocupa 85% da altura da etiqueta
-    qr_tamanho = int(altura * 0.85)
-    qr_img = qr_img.resize((qr_tamanho, qr_tamanho), Image.Resampling.LANCZOS)
-    
-    # Criar imagem da etiqueta
-    etiqueta = Image.new('RGB', (largura, altura), 'white')
-    draw = ImageDraw.Draw(etiqueta)
-    
-    # Colar QR Code à esquerda (centralizado verticalmente)
-    qr_pos_x = 8
-    qr_pos_y = (altura - qr_tamanho) // 2
-    etiqueta.paste(qr_img, (qr_pos_x, qr_pos_y))
-    
-    # Área disponível para texto (à direita do QR Code)
-    area_texto_x = qr_pos_x + qr_tamanho + 10
-    area_texto_largura = largura - area_texto_x - 8
-    
-    # Fonte proporcional ao tamanho da etiqueta
-    try:
-        if tamanho == "pequena":
-            fonte_desc = ImageFont.truetype("arialbd.ttf", 10)
-        elif tamanho == "media":
-            fonte_desc = ImageFont.truetype("arialbd.ttf", 14)
-        else:  # grande
-            fonte_desc = ImageFont.truetype("arialbd.ttf", 18)
-    except:
-        fonte_desc = ImageFont.load_default()
-    
-    # Quebrar descrição em múltiplas linhas se necessário
-    max_chars = 15 if tamanho == "pequena" else 25 if tamanho == "media" else 40
-    palavras = descricao.split()
-    linhas = []
-    linha_atual = ""
-    
-    for palavra in palavras:
-        if len(linha_atual + " " + palavra) <= max_chars:
-            linha_atual += " " + palavra if linha_atual else palavra
-        else:
-            if linha_atual:
-                linhas.append(linha_atual)
-            linha_atual = palavra
-    
-    if linha_atual:
-        linhas.append(linha_atual)
-    
-    # Limitar número de linhas conforme altura
-    max_linhas = 2 if tamanho == "pequena" else 3 if tamanho == "media" else 4
-    linhas = linhas[:max_linhas]
-    
-    # Se ainda houver texto, adicionar reticências na última linha
-    if len(descricao) > sum(len(l) for l in linhas) + len(linhas) - 1:
-        if linhas:
-            linhas[-1] = linhas[-1][:max_chars-3] + "..."
-    
-    # Calcular altura total do texto para centralização vertical
-    bbox = draw.textbbox((0, 0), "Ay", font=fonte_desc)  # Referência para altura
-    altura_linha = bbox[3] - bbox[1]
-    espacamento = 2  # Espaço entre linhas
-    altura_total_texto = len(linhas) * altura_linha + (len(linhas) - 1) * espacamento
-    
-    # Posição Y inicial (centralizada verticalmente)
-    y_inicial = (altura - altura_total_texto) // 2
-    
-    # Desenhar cada linha centralizada horizontalmente na área de texto
-    for i, linha in enumerate(linhas):
-        bbox_linha = draw.textbbox((0, 0), linha, font=fonte_desc)
-        largura_texto = bbox_linha[2] - bbox_linha[0]
-        
-        # Centralizar horizontalmente na área disponível
-        x_texto = area_texto_x + (area_texto_largura - largura_texto) // 2
-        y_texto = y_inicial + i * (altura_linha + espacamento)
-        
-        draw.text((x_texto, y_texto), linha, fill='black', font=fonte_desc)
-    
-    # Borda fina
-    draw.rectangle([(0, 0), (largura-1, altura-1)], outline='black', width=1)
-    
-    return etiqueta
+# --- CÁLCULO DE SALDO (último fechamento + delta dos movimentos posteriores) ---
+saldo = obter_saldo()
+with medir("estoque: saldo"):
+    df_estoque = saldo.sincronizar(df_p, df_m, df_f)
 
 # --- INTERFACE POR ABAS ---
+# Só a aba aberta roda a cada rerun (trocar de aba faz um rerun); o que cada
+# aba importa (qrcode/PIL nas etiquetas) só carrega quando ela é aberta
 abas_nomes = ["📊 Saldo Atual", "📜 Histórico", "🔄 Lançar Movimento", "➕ Cadastrar/Editar Item", "🏷️ Gerar Etiqueta"]
 if nivel_usuario == "admin":
     abas_nomes.append("🛠️ Admin")
 
-abas = st.tabs(abas_nomes)
+abas = st.tabs(abas_nomes, key="abas_estoque", on_change="rerun")
 
 # ABA 1: SALDO ATUAL COM FILTRO DE CATEGORIA E BUSCA
 with abas[0]:
-    st.subheader("Consulta de Itens")
-    
-    col1, col2 = st.columns([1, 2])
-    with col1:
-        categorias = ["Todas"] + sorted(df_estoque['Categoria'].unique().tolist())
-        cat_filtro = st.selectbox("Filtrar por Categoria", categorias, key="sb_cat")
-    with col2:
-        busca_txt = st.text_input("🔍 Buscar Código ou Descrição", key="txt_busca").strip().lower()
-    
-    # Aplicação dos Filtros
-    df_exibir = df_estoque.copy()
-    if cat_filtro != "Todas":
-        df_exibir = df_exibir[df_exibir['Categoria'] == cat_filtro]
-    
-    if busca_txt:
-        df_exibir = df_exibir[
-            (df_exibir['Item'].str.contains(busca_txt)) | 
-            (df_exibir['Descrição'].str.lower().str.contains(busca_txt))
-        ]
-    
-    st.dataframe(
-        df_exibir[['Item', 'Descrição', 'Categoria', 'Embalagem', 'Saldo_Atual']], 
-        use_container_width=True, 
-        hide_index=True
-    )
+    if abas[0].open:
+        st.subheader("Consulta de Itens")
+    
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            categorias = ["Todas"] + sorted(df_estoque['Categoria'].unique().tolist())
+            cat_filtro = st.selectbox("Filtrar por Categoria", categorias, key="sb_cat")
+        with col2:
+            busca_txt = st.text_input("🔍 Buscar Código ou Descrição", key="txt_busca").strip()
+    
+        # Aplicação dos Filtros
+        df_exibir = df_estoque
+        if cat_filtro != "Todas":
+            df_exibir = df_exibir[df_exibir['Categoria'] == cat_filtro]
+    
+        if busca_txt:
+            df_exibir = indice.filtrar(df_exibir, busca_txt)
+    
+        st.dataframe(
+            df_exibir[['Item', 'Descrição', 'Categoria', 'Embalagem', 'Saldo_Atual']], 
+            use_container_width=True, 
+            hide_index=True
+        )
 
 # ABA 2: HISTÓRICO
 with abas[1]:
-    st.subheader("Histórico Recente")
-    if not df_m.empty:
-        # Ordena pelo ID (que é timestamp) decrescente
-        st.dataframe(df_m.sort_values(by='id', ascending=False), use_container_width=True, hide_index=True)
-    else:
-        st.info("Nenhuma movimentação encontrada.")
+    if abas[1].open:
+        st.subheader("Histórico Recente")
+        if not df_m.empty:
+            # Ordena pelo ID (que é timestamp) decrescente
+            st.dataframe(
+                df_m.sort_values(by='id', ascending=False), use_container_width=True, hide_index=True,
+                column_config={"data": st.column_config.DatetimeColumn("data", format="DD/MM/YYYY HH:mm")}
+            )
+        else:
+            st.info("Nenhuma movimentação encontrada.")
 
 # ABA 3: LANÇAR MOVIMENTO COM FILTRO INTELIGENTE
 with abas[2]:
-    st.subheader("Novo Lançamento")
-    
-    # Filtro prévio para não poluir o selectbox
-    c1, c2 = st.columns([1, 2])
-    with c1:
-        l_cat = st.selectbox("1. Escolha a Categoria", ["Todas"] + sorted(df_p['Categoria'].unique().tolist()))
-    with c2:
-        l_busca = st.text_input("2. Digite código ou nome p/ filtrar").strip().lower()
-    
-    # Filtragem dos produtos para o selectbox
-    df_lanca = df_p.copy()
-    if l_cat != "Todas":
-        df_lanca = df_lanca[df_lanca['Categoria'] == l_cat]
-    if l_busca:
-        df_lanca = df_lanca[
-            (df_lanca['Item'].str.contains(l_busca)) | 
-            (df_lanca['Descrição'].str.lower().str.contains(l_busca))
-        ]
-    
-    if not df_lanca.empty:
-        opcoes = (df_lanca['Item'] + " - " + df_lanca['Descrição']).tolist()
+    if abas[2].open:
+        st.subheader("Novo Lançamento")
+    
+        # Filtro prévio para não poluir o selectbox
+        c1, c2 = st.columns([1, 2])
+        with c1:
+            l_cat = st.selectbox("1. Escolha a Categoria", ["Todas"] + sorted(df_p['Categoria'].unique().tolist()))
+        with c2:
+            l_busca = st.text_input("2. Digite código ou nome p/ filtrar").strip()
+    
+        # Filtragem dos produtos para o selectbox
+        df_lanca = df_p
+        if l_cat != "Todas":
+            df_lanca = df_lanca[df_lanca['Categoria'] == l_cat]
+        if l_busca:
+            df_lanca = indice.filtrar(df_lanca, l_busca)
+    
+        if not df_lanca.empty:
+            opcoes = (df_lanca['Item'] + " - " + df_lanca['Descrição']).tolist()
         
-        with st.form("form_estoque", clear_on_submit=True):
-            item_sel = st.selectbox("3. Selecione o Produto", opcoes)
-            col_t, col_q, col_o = st.columns([1,1,2])
+            with st.form("form_estoque", clear_on_submit=True):
+                item_sel = st.selectbox("3. Selecione o Produto", opcoes)
+                col_t, col_q, col_o = st.columns([1,1,2])
             
-            tipo = col_t.selectbox("Tipo", ["Entrada", "Saída"])
-            qtd = col_q.number_input("Qtd", min_value=0.1, step=1.0)
-            obs = col_o.text_input("Obs/Motivo")
+                tipo = col_t.selectbox("Tipo", ["Entrada", "Saída"])
+                qtd = col_q.number_input("Qtd", min_value=0.1, step=1.0)
+                obs = col_o.text_input("Obs/Motivo")
             
-            if st.form_submit_button("Confirmar Lançamento", use_container_width=True):
-                c_item = item_sel.split(" - ")[0]
-                d_item = item_sel.split(" - ")[1]
+                if st.form_submit_button("Confirmar Lançamento", use_container_width=True):
+                    c_item = item_sel.split(" - ")[0]
+                    d_item = item_sel.split(" - ")[1]
                 
-                novo_mov = pd.DataFrame([{
-                    "id": datetime.now().strftime("%Y%m%d%H%M%S"),
-                    "data": datetime.now().strftime("%d/%m/%Y %H:%M"),
-                    "codigo": str(c_item),
-                    "descricao": d_item,
-                    "tipo": tipo,
-                    "quantidade": float(qtd),
-                    "usuario": usuario_atual,
-                    "obs": obs
-                }])
+                    novo_mov = pd.DataFrame([{
+                        "id": datetime.now().strftime("%Y%m%d%H%M%S"),
+                        "data": datetime.now().strftime("%d/%m/%Y %H:%M"),
+                        "codigo": str(c_item),
+                        "descricao": d_item,
+                        "tipo": tipo,
+                        "quantidade": float(qtd),
+                        "usuario": usuario_atual,
+                        "obs": obs
+                    }])
                 
-                # Update na planilha
-                df_m_final = pd.concat([df_m, novo_mov], ignore_index=True)
-                conn.update(spreadsheet=URL_PLANILHA, worksheet="Movimentacoes", data=df_m_final)
+                    # Append na planilha (envia só a linha nova); id repetido por
+                    # outra sessão no mesmo segundo ganha sufixo em vez de colidir
+                    fila_escrita().anexar("Movimentacoes", novo_mov, chave="id", renumerar=renumerar_sufixo("id"))
+                    saldo.aplicar_movimentos(novo_mov)
                 
-                st.cache_data.clear()
-                st.success(f"✅ Lançamento de {tipo} realizado com sucesso!")
-                st.rerun()
-    else:
-        st.warning("Nenhum item corresponde aos filtros.")
+                    st.success(f"✅ Lançamento de {tipo} realizado com sucesso!")
+                    st.rerun()
+        else:
+            st.warning("Nenhum item corresponde aos filtros.")
+
+        # Recebimento de nota: vários lançamentos de uma planilha em uma só gravação
+        with st.expander("📥 Importar lançamentos de planilha (nota / recebimento)"):
+            st.caption("CSV ou XLSX com as colunas codigo, quantidade, tipo (Entrada/Saída; vazio = Entrada) e obs.")
+            arquivo_mov = st.file_uploader("Planilha de lançamentos", type=["csv", "xlsx"], key="import_movimentos")
+            if arquivo_mov:
+                from importacao import ler_movimentos, validar_movimentos, lancar_movimentos
+
+                try:
+                    lidas = ler_movimentos(arquivo_mov.getvalue(), arquivo_mov.name)
+                except Exception as e:
+                    st.error(f"❌ Não foi possível ler {arquivo_mov.name}: {e}")
+                    lidas = None
+
+                if lidas is not None:
+                    validas, rejeitadas = validar_movimentos(lidas, df_p)
+                    c1, c2 = st.columns(2)
+                    c1.metric("Linhas válidas", len(validas))
+                    c2.metric("Rejeitadas", len(rejeitadas))
+                    if not rejeitadas.empty:
+                        desconhecidos = sorted(rejeitadas.loc[rejeitadas["motivo"] == "código não cadastrado", "codigo"].unique())
+                        if desconhecidos:
+                            st.warning(f"⚠️ Código(s) não cadastrado(s): {', '.join(desconhecidos)}")
+                        st.dataframe(rejeitadas, hide_index=True, use_container_width=True)
+
+                    # O arquivo continua no campo depois do rerun: não deixa lançar duas vezes
+                    if st.session_state.get("movimentos_importados") == arquivo_mov.file_id:
+                        st.success("✅ Lançamentos deste arquivo já enviados.")
+                    elif not validas.empty:
+                        st.dataframe(validas, hide_index=True, use_container_width=True)
+                        if st.button(f"✅ Lançar {len(validas)} movimento(s)", type="primary", use_container_width=True):
+                            novos = lancar_movimentos(validas, usuario_atual, arquivo_mov.name)
+                            saldo.aplicar_movimentos(novos)
+                            st.session_state["movimentos_importados"] = arquivo_mov.file_id
+                            st.rerun()
 
 # ABA 4: CADASTRAR/EDITAR ITEM (COM AMBAS FUNCIONALIDADES)
 with abas[3]:
-    st.subheader("➕ Cadastrar / ✏️ Editar Item")
+    if abas[3].open:
+        st.subheader("➕ Cadastrar / ✏️ Editar Item")
     
-    # Escolher entre cadastrar novo ou editar existente
-    modo = st.radio("Selecione a ação:", ["Cadastrar Novo Item", "Editar Item Existente"], horizontal=True)
+        # Escolher entre cadastrar novo ou editar existente
+        modos = ["Cadastrar Novo Item", "Editar Item Existente"]
+        if nivel_usuario == "admin":
+            modos.append("Importar Catálogo")
+        modo = st.radio("Selecione a ação:", modos, horizontal=True)
     
-    cats_existentes = sorted(df_p['Categoria'].unique().tolist()) if not df_p.empty else []
+        cats_existentes = sorted(df_p['Categoria'].unique().tolist()) if not df_p.empty else []
     
-    if modo == "Cadastrar Novo Item":
-        st.info("Preencha os dados para cadastrar um novo item no estoque.")
+        if modo == "Cadastrar Novo Item":
+            st.info("Preencha os dados para cadastrar um novo item no estoque.")
         
-        with st.form("form_novo_item", clear_on_submit=True):
-            col1, col2 = st.columns(2)
+            with st.form("form_novo_item", clear_on_submit=True):
+                col1, col2 = st.columns(2)
             
-            with col1:
-                # Código/Item - único e obrigatório
-                novo_item = st.text_input("Código do Item *", 
-                                        placeholder="Ex: PROD-001",
-                                        help="Código único de identificação").strip().upper()
+                with col1:
+                    # Código/Item - único e obrigatório
+                    novo_item = st.text_input("Código do Item *", 
+                                            placeholder="Ex: PROD-001",
+                                            help="Código único de identificação").strip().upper()
                 
-                # Categoria - selectbox + texto livre
-                cat_opcao = st.selectbox("Categoria", ["Nova categoria..."] + cats_existentes)
-                nova_categoria = st.text_input("Nova Categoria (se selecionado acima)", placeholder="Ex: Eletrônicos").strip()
+                    # Categoria - selectbox + texto livre
+                    cat_opcao = st.selectbox("Categoria", ["Nova categoria..."] + cats_existentes)
+                    nova_categoria = st.text_input("Nova Categoria (se selecionado acima)", placeholder="Ex: Eletrônicos").strip()
             
-            with col2:
-                # Descrição
-                nova_descricao = st.text_input("Descrição *", 
-                                             placeholder="Ex: Smartphone Samsung Galaxy").strip()
+                with col2:
+                    # Descrição
+                    nova_descricao = st.text_input("Descrição *", 
+                                                 placeholder="Ex: Smartphone Samsung Galaxy").strip()
                 
-                # Embalagem/Unidade
-                nova_embalagem = st.selectbox("Embalagem/Unidade *", 
-                                            ["UN", "CX", "KG", "LT", "MT", "PC", "PAR", "RL", "FD", "OUTRO"])
-                especifique_emb = st.text_input("Especifique (quantidade/embalagem)", placeholder="Ex: PT").strip().upper()
+                    # Embalagem/Unidade
+                    nova_embalagem = st.selectbox("Embalagem/Unidade *", 
+                                                ["UN", "CX", "KG", "LT", "MT", "PC", "PAR", "RL", "FD", "OUTRO"])
+                    especifique_emb = st.text_input("Especifique (quantidade/embalagem)", placeholder="Ex: PT").strip().upper()
                 
-                # Estoque Inicial (padrão 0)
-                estoque_inicial = st.number_input("Estoque Inicial", 
-                                                min_value=0.0, 
-                                                value=0.0, 
-                                                step=1.0,
-                                                help="Quantidade inicial em estoque (padrão: 0)")
+                    # Estoque Inicial (padrão 0)
+                    estoque_inicial = st.number_input("Estoque Inicial", 
+                                                    min_value=0.0, 
+                                                    value=0.0, 
+                                                    step=1.0,
+                                                    help="Quantidade inicial em estoque (padrão: 0)")
             
-            # Validação visual
-            st.markdown("---")
-            st.caption("Campos marcados com * são obrigatórios")
+                # Validação visual
+                st.markdown("---")
+                st.caption("Campos marcados com * são obrigatórios")
             
-            submitted = st.form_submit_button("💾 Salvar Novo Item", use_container_width=True, type="primary")
+                submitted = st.form_submit_button("💾 Salvar Novo Item", use_container_width=True, type="primary")
             
-            if submitted:
-                # Definir valores finais
-                categoria_final = nova_categoria if cat_opcao == "Nova categoria..." else cat_opcao
-                embalagem_final = especifique_emb if nova_embalagem == "OUTRO" else nova_embalagem
+                if submitted:
+                    # Definir valores finais
+                    categoria_final = nova_categoria if cat_opcao == "Nova categoria..." else cat_opcao
+                    embalagem_final = especifique_emb if nova_embalagem == "OUTRO" else nova_embalagem
                 
-                # VALIDAÇÕES DE CONSISTÊNCIA
-                erros = []
+                    # VALIDAÇÕES DE CONSISTÊNCIA
+                    erros = []
                 
-                if not novo_item:
-                    erros.append("O Código do Item é obrigatório")
-                elif novo_item in df_p['Item'].values:
-                    erros.append(f"O código '{novo_item}' já existe no cadastro")
+                    if not novo_item:
+                        erros.append("O Código do Item é obrigatório")
+                    elif novo_item in df_p['Item'].values:
+                        erros.append(f"O código '{novo_item}' já existe no cadastro")
                 
-                if not categoria_final:
-                    erros.append("A Categoria é obrigatória")
+                    if not categoria_final:
+                        erros.append("A Categoria é obrigatória")
                 
-                if not nova_descricao:
-                    erros.append("A Descrição é obrigatória")
+                    if not nova_descricao:
+                        erros.append("A Descrição é obrigatória")
                 
-                if not embalagem_final:
-                    erros.append("A Embalagem/Unidade é obrigatória")
+                    if not embalagem_final:
+                        erros.append("A Embalagem/Unidade é obrigatória")
                 
-                if erros:
-                    for erro in erros:
-                        st.error(f"❌ {erro}")
-                else:
-                    try:
-                        # Cria o novo registro
-                        novo_produto = pd.DataFrame([{
-                            "Item": str(novo_item),
-                            "Descrição": str(nova_descricao),
-                            "Categoria": str(categoria_final),
-                            "Embalagem": str(embalagem_final),
-                            "Estoque_Inicial": float(estoque_inicial)
-                        }])
-                        
-                        # Concatena com os dados existentes
-                        df_p_novo = pd.concat([df_p, novo_produto], ignore_index=True)
-                        
-                        # Atualiza a planilha
-                        conn.update(spreadsheet=URL_PLANILHA, worksheet="Produtos", data=df_p_novo)
+                    if erros:
+                        for erro in erros:
+                            st.error(f"❌ {erro}")
+                    else:
+                        try:
+                            # Cria o novo registro
+                            novo_produto = pd.DataFrame([{
+                                "Item": str(novo_item),
+                                "Descrição": str(nova_descricao),
+                                "Categoria": str(categoria_final),
+                                "Embalagem": str(embalagem_final),
+                                "Estoque_Inicial": float(estoque_inicial)
+                            }])
                         
-                        # Limpa cache e recarrega
-                        st.cache_data.clear()
+                            # Acrescenta apenas o novo item na planilha (pela fila de gravação)
+                            fila_escrita().anexar("Produtos", novo_produto, chave="Item")
                         
-                        st.success(f"✅ Item '{novo_item} - {nova_descricao}' cadastrado com sucesso!")
-                        st.balloons()
-                        st.rerun()
+                            st.success(f"✅ Item '{novo_item} - {nova_descricao}' cadastrado com sucesso!")
+                            st.balloons()
+                            st.rerun()
                         
-                    except Exception as e:
-                        st.error(f"❌ Erro ao salvar na planilha: {e}")
+                        except Exception as e:
+                            st.error(f"❌ Erro ao salvar na planilha: {e}")
     
-    else:  # Modo Editar
-        st.info("Selecione o item que deseja editar.")
+        elif modo == "Editar Item Existente":
+            st.info("Selecione o item que deseja editar.")
         
-        if not df_p.empty:
-            # Selecionar item para editar (fora do form para atualizar os valores padrão)
-            opcoes_edit = (df_p['Item'] + " - " + df_p['Descrição']).tolist()
-            item_para_editar = st.selectbox("Selecione o item para editar", opcoes_edit, key="edit_select")
+            if not df_p.empty:
+                # Selecionar item para editar (fora do form para atualizar os valores padrão)
+                opcoes_edit = (df_p['Item'] + " - " + df_p['Descrição']).tolist()
+                item_para_editar = st.selectbox("Selecione o item para editar", opcoes_edit, key="edit_select")
             
-            if item_para_editar:
-                codigo_edit = item_para_editar.split(" - ")[0]
-                produto_atual = df_p[df_p['Item'] == codigo_edit].iloc[0]
+                if item_para_editar:
+                    codigo_edit = item_para_editar.split(" - ")[0]
+                    produto_atual = df_p[df_p['Item'] == codigo_edit].iloc[0]
                 
-                # Verifica se tem movimentações
-                tem_movimentacao = codigo_edit in df_m['codigo'].values if not df_m.empty else False
+                    # Verifica se tem movimentações
+                    tem_movimentacao = codigo_edit in df_m['codigo'].values if not df_m.empty else False
                 
-                st.markdown("---")
-                st.subheader(f"Editando: {codigo_edit}")
+                    st.markdown("---")
+                    st.subheader(f"Editando: {codigo_edit}")
                 
-                if tem_movimentacao:
-                    st.warning("⚠️ Este item possui movimentações no histórico. Exclusão desabilitada.", icon="ℹ️")
+                    if tem_movimentacao:
+                        st.warning("⚠️ Este item possui movimentações no histórico. Exclusão desabilitada.", icon="ℹ️")
                 
-                # INICIALIZAR VALORES DEFAULT NO SESSION STATE PARA EVITAR ERROS
-                if 'edit_cat_opcao' not in st.session_state:
-                    st.session_state.edit_cat_opcao = produto_atual['Categoria'] if produto_atual['Categoria'] in cats_existentes else "Nova categoria..."
+                    # INICIALIZAR VALORES DEFAULT NO SESSION STATE PARA EVITAR ERROS
+                    if 'edit_cat_opcao' not in st.session_state:
+                        st.session_state.edit_cat_opcao = produto_atual['Categoria'] if produto_atual['Categoria'] in cats_existentes else "Nova categoria..."
                 
-                with st.form("form_editar_item", clear_on_submit=False):
-                    col1, col2 = st.columns(2)
+                    with st.form("form_editar_item", clear_on_submit=False):
+                        col1, col2 = st.columns(2)
                     
-                    with col1:
-                        # Código (somente leitura)
-                        st.text_input("Código do Item", value=str(produto_atual['Item']), disabled=True, help="Código não pode ser alterado")
+                        with col1:
+                            # Código (somente leitura)
+                            st.text_input("Código do Item", value=str(produto_atual['Item']), disabled=True, help="Código não pode ser alterado")
                         
-                        # Categoria
-                        cat_atual = str(produto_atual['Categoria'])
-                        cat_options = ["Nova categoria..."] + cats_existentes
+                            # Categoria
+                            cat_atual = str(produto_atual['Categoria'])
+                            cat_options = ["Nova categoria..."] + cats_existentes
                         
-                        # Determinar índice correto
-                        if cat_atual in cats_existentes:
-                            cat_index = cat_options.index(cat_atual)
-                        else:
-                            cat_index = 0
+                            # Determinar índice correto
+                            if cat_atual in cats_existentes:
+                                cat_index = cat_options.index(cat_atual)
+                            else:
+                                cat_index = 0
                             
-                        cat_opcao_edit = st.selectbox("Categoria", cat_options, index=cat_index, key="edit_cat_select")
+                            cat_opcao_edit = st.selectbox("Categoria", cat_options, index=cat_index, key="edit_cat_select")
                         
-                        # Campo de nova categoria (sempre visível mas apenas usado se necessário)
-                        default_nova_cat = "" if cat_index > 0 else cat_atual
-                        nova_categoria_edit = st.text_input("Nova Categoria (se selecionado acima)", value=default_nova_cat).strip()
+                            # Campo de nova categoria (sempre visível mas apenas usado se necessário)
+                            default_nova_cat = "" if cat_index > 0 else cat_atual
+                            nova_categoria_edit = st.text_input("Nova Categoria (se selecionado acima)", value=default_nova_cat).strip()
                     
-                    with col2:
-                        # Descrição
-                        descricao_edit = st.text_input("Descrição *", value=str(produto_atual['Descrição'])).strip()
+                        with col2:
+                            # Descrição
+                            descricao_edit = st.text_input("Descrição *", value=str(produto_atual['Descrição'])).strip()
                         
-                        # Embalagem
-                        emb_atual = str(produto_atual['Embalagem'])
-                        opcoes_emb = ["UN", "CX", "KG", "LT", "MT", "PC", "PAR", "RL", "FD", "OUTRO"]
+                            # Embalagem
+                            emb_atual = str(produto_atual['Embalagem'])
+                            opcoes_emb = ["UN", "CX", "KG", "LT", "MT", "PC", "PAR", "RL", "FD", "OUTRO"]
                         
-                        try:
-                            idx_emb = opcoes_emb.index(emb_atual)
-                        except ValueError:
-                            idx_emb = 9  # OUTRO
+                            try:
+                                idx_emb = opcoes_emb.index(emb_atual)
+                            except ValueError:
+                                idx_emb = 9  # OUTRO
                         
-                        embalagem_edit = st.selectbox("Embalagem/Unidade", opcoes_emb, index=idx_emb)
+                            embalagem_edit = st.selectbox("Embalagem/Unidade", opcoes_emb, index=idx_emb)
                         
-                        # Campo específico para OUTRO
-                        default_especifique = emb_atual if idx_emb == 9 else ""
-                        especifique_emb_edit = st.text_input("Especifique (emb)", value=default_especifique).strip().upper()
+                            # Campo específico para OUTRO
+                            default_especifique = emb_atual if idx_emb == 9 else ""
+                            especifique_emb_edit = st.text_input("Especifique (emb)", value=default_especifique).strip().upper()
                         
-                        # Estoque Inicial com tratamento de erro
-                        try:
-                            estoque_val = float(produto_atual['Estoque_Inicial']) if pd.notna(produto_atual['Estoque_Inicial']) else 0.0
-                        except:
-                            estoque_val = 0.0
+                            # Estoque Inicial com tratamento de erro
+                            try:
+                                estoque_val = float(produto_atual['Estoque_Inicial']) if pd.notna(produto_atual['Estoque_Inicial']) else 0.0
+                            except:
+                                estoque_val = 0.0
                             
-                        estoque_edit = st.number_input("Estoque Inicial", 
-                                                     min_value=0.0, 
-                                                     value=estoque_val, 
-                                                     step=1.0,
-                                                     help="Altere apenas se necessário corrigir o valor inicial")
+                            estoque_edit = st.number_input("Estoque Inicial", 
+                                                         min_value=0.0, 
+                                                         value=estoque_val, 
+                                                         step=1.0,
+                                                         help="Altere apenas se necessário corrigir o valor inicial")
                     
-                    # Botão de submit ÚNICO E OBRIGATÓRIO - SEMPRE PRESENTE
-                    st.markdown("---")
-                    submitted = st.form_submit_button("💾 Salvar Alterações", use_container_width=True, type="primary")
+                        # Botão de submit ÚNICO E OBRIGATÓRIO - SEMPRE PRESENTE
+                        st.markdown("---")
+                        submitted = st.form_submit_button("💾 Salvar Alterações", use_container_width=True, type="primary")
                     
-                    if submitted:
-                        # Definir valores finais
-                        categoria_final_edit = nova_categoria_edit if cat_opcao_edit == "Nova categoria..." else cat_opcao_edit
-                        embalagem_final_edit = especifique_emb_edit if embalagem_edit == "OUTRO" else embalagem_edit
+                        if submitted:
+                            # Definir valores finais
+                            categoria_final_edit = nova_categoria_edit if cat_opcao_edit == "Nova categoria..." else cat_opcao_edit
+                            embalagem_final_edit = especifique_emb_edit if embalagem_edit == "OUTRO" else embalagem_edit
                         
-                        # Validações
-                        erros = []
-                        if not descricao_edit:
-                            erros.append("A Descrição é obrigatória")
-                        if not categoria_final_edit:
-                            erros.append("A Categoria é obrigatória")
-                        if not embalagem_final_edit:
-                            erros.append("A Embalagem é obrigatória")
+                            # Validações
+                            erros = []
+                            if not descricao_edit:
+                                erros.append("A Descrição é obrigatória")
+                            if not categoria_final_edit:
+                                erros.append("A Categoria é obrigatória")
+                            if not embalagem_final_edit:
+                                erros.append("A Embalagem é obrigatória")
                         
-                        if erros:
-                            for erro in erros:
-                                st.error(f"❌ {erro}")
-                        else:
-                            try:
-                                # Atualiza o dataframe
-                                idx = df_p.index[df_p['Item'] == codigo_edit].tolist()[0]
-                                df_p.at[idx, 'Descrição'] = str(descricao_edit)
-                                df_p.at[idx, 'Categoria'] = str(categoria_final_edit)
-                                df_p.at[idx, 'Embalagem'] = str(embalagem_final_edit)
-                                df_p.at[idx, 'Estoque_Inicial'] = float(estoque_edit)
+                            if erros:
+                                for erro in erros:
+                                    st.error(f"❌ {erro}")
+                            else:
+                                try:
+                                    novos_valores = {
+                                        'Descrição': str(descricao_edit),
+                                        'Categoria': str(categoria_final_edit),
+                                        'Embalagem': str(embalagem_final_edit),
+                                        'Estoque_Inicial': float(estoque_edit),
+                                    }
+                                    # Grava só os campos alterados, e só se ninguém mexeu
+                                    # neles desde a leitura (outros campos podem ter mudado)
+                                    alterados = {
+                                        c: v for c, v in novos_valores.items() if not mesmo_valor(v, produto_atual[c])
+                                    }
+                                    fila_escrita().atualizar(
+                                        "Produtos", "Item", [codigo_edit], alterados,
+                                        esperado={c: produto_atual[c] for c in alterados}
+                                    )
+                                    st.success(f"✅ Item '{codigo_edit}' atualizado com sucesso!")
+                                    st.rerun()
                                 
-                                # Salva na planilha
-                                conn.update(spreadsheet=URL_PLANILHA, worksheet="Produtos", data=df_p)
-                                st.cache_data.clear()
-                                st.success(f"✅ Item '{codigo_edit}' atualizado com sucesso!")
-                                st.rerun()
-                                
-                            except Exception as e:
-                                st.error(f"❌ Erro ao atualizar: {e}")
+                                except Exception as e:
+                                    st.error(f"❌ Erro ao atualizar: {e}")
                 
-                # SEÇÃO DE EXCLUSÃO (FORA DO FORM)
-                if not tem_movimentacao:
-                    st.markdown("---")
-                    st.markdown("### 🗑️ Zona de Perigo")
-                    st.error("⚠️ Atenção: A exclusão não pode ser desfeita!", icon="⚠️")
+                    # SEÇÃO DE EXCLUSÃO (FORA DO FORM)
+                    if not tem_movimentacao:
+                        st.markdown("---")
+                        st.markdown("### 🗑️ Zona de Perigo")
+                        st.error("⚠️ Atenção: A exclusão não pode ser desfeita!", icon="⚠️")
                     
-                    with st.form("form_excluir_item", clear_on_submit=False):
-                        st.write(f"Você está prestes a excluir: **{codigo_edit} - {produto_atual['Descrição']}**")
-                        confirmacao = st.checkbox("Confirmo que desejo excluir este item permanentemente")
+                        with st.form("form_excluir_item", clear_on_submit=False):
+                            st.write(f"Você está prestes a excluir: **{codigo_edit} - {produto_atual['Descrição']}**")
+                            confirmacao = st.checkbox("Confirmo que desejo excluir este item permanentemente")
                         
-                        # Botão de excluir em form separado
-                        excluir_submit = st.form_submit_button("🗑️ EXCLUIR ITEM DEFINITIVAMENTE", type="primary", use_container_width=True)
+                            # Botão de excluir em form separado
+                            excluir_submit = st.form_submit_button("🗑️ EXCLUIR ITEM DEFINITIVAMENTE", type="primary", use_container_width=True)
                         
-                        if excluir_submit and confirmacao:
+                            if excluir_submit and confirmacao:
+                                try:
+                                    fila_escrita().excluir("Produtos", "Item", [codigo_edit])
+                                    st.success(f"✅ Item '{codigo_edit}' excluído com sucesso!")
+                                    st.rerun()
+                                except Exception as e:
+                                    st.error(f"❌ Erro ao excluir: {e}")
+                            elif excluir_submit and not confirmacao:
+                                st.error("❌ Você precisa confirmar a exclusão marcando a checkbox!")
+            else:
+                st.warning("Não há itens cadastrados para editar.")
+
+        else:  # Importar Catálogo (só admin)
+            from importacao import ler_catalogo, catalogo_padrao, comparar_catalogo, aplicar_catalogo, ACAO_INSERIR, ACAO_ATUALIZAR
+
+            st.info("Cadastra e atualiza vários itens de uma vez a partir de uma planilha (colunas Item, Descrição, Embalagem e TIPO ou Categoria).")
+            origem = st.radio("Origem", ["Catálogo mestre do sistema (base/)", "Enviar arquivo"], horizontal=True, key="import_origem")
+            if origem == "Enviar arquivo":
+                arquivo = st.file_uploader("Planilha CSV ou XLSX", type=["csv", "xlsx"], key="import_arquivo")
+                conteudo, nome_arquivo = (arquivo.getvalue(), arquivo.name) if arquivo else (None, None)
+            else:
+                conteudo, nome_arquivo = catalogo_padrao()
+
+            if conteudo:
+                try:
+                    novo, vazios, colunas, repetidos, invalidos = ler_catalogo(conteudo, nome_arquivo)
+                except Exception as e:
+                    st.error(f"❌ Não foi possível ler {nome_arquivo}: {e}")
+                    novo = None
+
+                if novo is not None:
+                    # Célula vazia no arquivo não apaga o cadastro, a não ser que seja pedido
+                    limpar = st.checkbox("Apagar no cadastro os campos que estão vazios no arquivo", key="import_limpar")
+                    diferencas = comparar_catalogo(df_p, novo, vazios, colunas, limpar=limpar)
+                    qtd = diferencas["ação"].value_counts()
+                    c1, c2, c3 = st.columns(3)
+                    c1.metric("Novos", int(qtd.get(ACAO_INSERIR, 0)))
+                    c2.metric("Alterados", int(qtd.get(ACAO_ATUALIZAR, 0)))
+                    c3.metric("Sem alteração", int(len(diferencas) - qtd.get(ACAO_INSERIR, 0) - qtd.get(ACAO_ATUALIZAR, 0)))
+                    if repetidos:
+                        st.warning(f"⚠️ {len(repetidos)} código(s) repetido(s) no arquivo (vale a última linha): {', '.join(repetidos[:10])}{'...' if len(repetidos) > 10 else ''}")
+                    for mensagem in invalidos:
+                        st.warning(f"⚠️ {mensagem}")
+                    com_vazios = int((diferencas["esvaziar"] != "").sum())
+                    if com_vazios and not limpar:
+                        st.info(f"ℹ️ {com_vazios} item(ns) têm campos vazios no arquivo; esses campos serão mantidos como estão no cadastro.")
+                    elif com_vazios:
+                        st.warning(f"⚠️ {com_vazios} item(ns) terão os campos da coluna 'esvaziar' apagados no cadastro.")
+
+                    mudancas = diferencas[diferencas["ação"].isin([ACAO_INSERIR, ACAO_ATUALIZAR])]
+                    if mudancas.empty:
+                        st.success("✅ O cadastro já está igual ao arquivo.")
+                    else:
+                        st.dataframe(
+                            mudancas if com_vazios else mudancas.drop(columns="esvaziar"), hide_index=True, use_container_width=True
+                        )
+                        if st.button(f"📥 Aplicar {len(mudancas)} alteração(ões)", type="primary", use_container_width=True):
                             try:
-                                df_p_novo = df_p[df_p['Item'] != codigo_edit]
-                                conn.update(spreadsheet=URL_PLANILHA, worksheet="Produtos", data=df_p_novo)
-                                st.cache_data.clear()
-                                st.success(f"✅ Item '{codigo_edit}' excluído com sucesso!")
-                                st.rerun()
+                                with st.spinner("Gravando na planilha..."):
+                                    inseridos, atualizados, conflitos = aplicar_catalogo(diferencas, colunas, limpar=limpar)
+                                st.success(f"✅ {inseridos} item(ns) cadastrado(s) e {atualizados} atualizado(s).")
+                                for conflito in conflitos:
+                                    st.warning(f"⚠️ {conflito}")
+                                if not conflitos:
+                                    st.rerun()
                             except Exception as e:
-                                st.error(f"❌ Erro ao excluir: {e}")
-                        elif excluir_submit and not confirmacao:
-                            st.error("❌ Você precisa confirmar a exclusão marcando a checkbox!")
-        else:
-            st.warning("Não há itens cadastrados para editar.")
+                                st.error(f"❌ Erro ao gravar: {e}")
 
 # ABA 5: GERAR ETIQUETA COM QR CODE
 with abas[4]:
-    st.subheader("🏷️ Gerador de Etiquetas com QR Code")
+    if abas[4].open:
+        import io
+        from etiquetas import gerar_etiqueta, etiqueta_png, etiqueta_zpl, montar_pdf, montar_zpl, LAYOUTS
+
+        st.subheader("🏷️ Gerador de Etiquetas com QR Code")
     
-    # Layout em colunas para filtros e preview
-    col_filtros, col_preview = st.columns([1, 2])
+        # Layout em colunas para filtros e preview
+        col_filtros, col_preview = st.columns([1, 2])
     
-    with col_filtros:
-        st.markdown("### 1. Selecione o Item")
+        with col_filtros:
+            st.markdown("### 1. Selecione o Item")
         
-        # Filtros para encontrar o item
-        e_cat = st.selectbox("Filtrar por Categoria", 
-                            ["Todas"] + sorted(df_p['Categoria'].unique().tolist()),
-                            key="etq_cat")
-        e_busca = st.text_input("Buscar código ou descrição", 
-                               key="etq_busca").strip().lower()
+            # Filtros para encontrar o item
+            e_cat = st.selectbox("Filtrar por Categoria", 
+                                ["Todas"] + sorted(df_p['Categoria'].unique().tolist()),
+                                key="etq_cat")
+            e_busca = st.text_input("Buscar código ou descrição", 
+                                   key="etq_busca").strip()
         
-        # Filtrar dataframe
-        df_etq = df_p.copy()
-        if e_cat != "Todas":
-            df_etq = df_etq[df_etq['Categoria'] == e_cat]
-        if e_busca:
-            df_etq = df_etq[
-                (df_etq['Item'].str.contains(e_busca)) | 
-                (df_etq['Descrição'].str.lower().str.contains(e_busca))
-            ]
+            # Filtrar dataframe
+            df_etq = df_p
+            if e_cat != "Todas":
+                df_etq = df_etq[df_etq['Categoria'] == e_cat]
+            if e_busca:
+                df_etq = indice.filtrar(df_etq, e_busca)
         
-        if not df_etq.empty:
-            opcoes_etq = (df_etq['Item'] + " - " + df_etq['Descrição']).tolist()
-            item_etq_sel = st.selectbox("Selecione o produto", opcoes_etq, key="etq_sel")
+            if not df_etq.empty:
+                opcoes_etq = (df_etq['Item'] + " - " + df_etq['Descrição']).tolist()
+                item_etq_sel = st.selectbox("Selecione o produto", opcoes_etq, key="etq_sel")
             
-            # Configurações da etiqueta
-            st.markdown("### 2. Configurações")
-            tamanho_etq = st.selectbox(
-                "Tamanho da Etiqueta",
-                ["pequena (30x15mm)", "media (50x22mm)", "grande (75x30mm)"],
-                index=1
-            )
+                # Configurações da etiqueta
+                st.markdown("### 2. Configurações")
+                tamanho_etq = st.selectbox(
+                    "Tamanho da Etiqueta",
+                    ["pequena (30x15mm)", "media (50x22mm)", "grande (75x30mm)"],
+                    index=1
+                )
             
-            # Quantidade de cópias
-            qtd_copias = st.number_input("Quantidade", min_value=1, max_value=50, value=1)
+                # Quantidade de cópias
+                qtd_copias = st.number_input("Quantidade", min_value=1, max_value=50, value=1)
             
-            # Botão gerar
-            gerar = st.button("🖨️ Gerar Etiqueta(s)", type="primary", use_container_width=True)
-        else:
-            st.warning("Nenhum item encontrado.")
-            gerar = False
-            item_etq_sel = None
-    
-    with col_preview:
-        if gerar and item_etq_sel:
-            # Extrair código e descrição
-            codigo_etq = item_etq_sel.split(" - ")[0]
-            produto_info = df_p[df_p['Item'] == codigo_etq].iloc[0]
+                # Botão gerar
+                gerar = st.button("🖨️ Gerar Etiqueta(s)", type="primary", use_container_width=True)
+            else:
+                st.warning("Nenhum item encontrado.")
+                gerar = False
+                item_etq_sel = None
+    
+        with col_preview:
+            if gerar and item_etq_sel:
+                # Extrair código e descrição
+                codigo_etq = item_etq_sel.split(" - ")[0]
+                produto_info = df_p[df_p['Item'] == codigo_etq].iloc[0]
             
-            descricao_etq = produto_info['Descrição']
+                descricao_etq = produto_info['Descrição']
             
-            # Mapear tamanho selecionado
-            tamanho_map = {
-                "pequena (30x15mm)": "pequena",
-                "media (50x22mm)": "media", 
-                "grande (75x30mm)": "grande"
-            }
-            tam_selecionado = tamanho_map[tamanho_etq]
+                # Mapear tamanho selecionado
+                tamanho_map = {
+                    "pequena (30x15mm)": "pequena",
+                    "media (50x22mm)": "media", 
+                    "grande (75x30mm)": "grande"
+                }
+                tam_selecionado = tamanho_map[tamanho_etq]
             
-            # Gerar etiquetas
-            etiquetas_geradas = []
-            for i in range(qtd_copias):
-                img_etiqueta = gerar_etiqueta(
-                    codigo_etq, 
-                    descricao_etq, 
-                    tam_selecionado
-                )
-                etiquetas_geradas.append(img_etiqueta)
+                # Gerar etiqueta (as cópias são idênticas: renderiza e codifica uma vez só)
+                img_etiqueta = gerar_etiqueta(codigo_etq, descricao_etq, tam_selecionado)
+                png_etiqueta = etiqueta_png(codigo_etq, descricao_etq, tam_selecionado)
             
-            # Exibir preview
-            with st.container():
-                st.markdown("### Preview")
-                st.image(etiquetas_geradas[0], width=400)
+                # Exibir preview
+                with st.container():
+                    st.markdown("### Preview")
+                    st.image(img_etiqueta, width=400)
             
-            # Botões de download
-            col_down1, col_down2 = st.columns(2)
+                # Botões de download
+                col_down1, col_down2, col_down3 = st.columns(3)
             
-            with col_down1:
-                # Download individual
-                buf = io.BytesIO()
-                etiquetas_geradas[0].save(buf, format='PNG')
-                buf.seek(0)
-                
-                st.download_button(
-                    label="📥 PNG",
-                    data=buf,
-                    file_name=f"etiqueta_{codigo_etq}.png",
-                    mime="image/png",
-                    use_container_width=True
-                )
+                with col_down1:
+                    # Download individual
+                    st.download_button(
+                        label="📥 PNG",
+                        data=png_etiqueta,
+                        file_name=f"etiqueta_{codigo_etq}.png",
+                        mime="image/png",
+                        use_container_width=True
+                    )
             
-            with col_down2:
-                # Se múltiplas etiquetas, criar ZIP
-                if qtd_copias > 1:
-                    import zipfile
+                with col_down2:
+                    # Se múltiplas etiquetas, criar ZIP
+                    if qtd_copias > 1:
+                        import zipfile
                     
-                    zip_buf = io.BytesIO()
-                    with zipfile.ZipFile(zip_buf, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-                        for idx, img in enumerate(etiquetas_geradas):
-                            img_buf = io.BytesIO()
-                            img.save(img_buf, format='PNG')
-                            img_buf.seek(0)
-                            zip_file.writestr(f"etiqueta_{codigo_etq}_{idx+1}.png", img_buf.getvalue())
+                        zip_buf = io.BytesIO()
+                        with zipfile.ZipFile(zip_buf, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+                            for idx in range(qtd_copias):
+                                zip_file.writestr(f"etiqueta_{codigo_etq}_{idx+1}.png", png_etiqueta)
                     
-                    zip_buf.seek(0)
+                        zip_buf.seek(0)
+                        st.download_button(
+                            label=f"📦 ZIP ({qtd_copias})",
+                            data=zip_buf,
+                            file_name=f"etiquetas_{codigo_etq}.zip",
+                            mime="application/zip",
+                            use_container_width=True
+                        )
+            
+                with col_down3:
+                    # Impressora térmica: as cópias viram ^PQ, sem repetir a etiqueta
                     st.download_button(
-                        label=f"📦 ZIP ({qtd_copias})",
-                        data=zip_buf,
-                        file_name=f"etiquetas_{codigo_etq}.zip",
-                        mime="application/zip",
+                        label="🦓 ZPL",
+                        data=etiqueta_zpl(codigo_etq, descricao_etq, tam_selecionado, qtd_copias),
+                        file_name=f"etiqueta_{codigo_etq}.zpl",
+                        mime="text/plain",
                         use_container_width=True
                     )
+    
+        # ETIQUETAS EM LOTE: vários itens em um único PDF (várias por folha)
+        st.divider()
+        st.markdown("### 📚 Etiquetas em Lote (PDF / ZPL)")
+    
+        origem_lote = st.radio("Origem dos itens", ["Categoria", "Lista de produtos", "Entradas de um dia"], horizontal=True, key="lote_origem")
+        itens_lote = []
+    
+        col_l1, col_l2, col_l3 = st.columns(3)
+        tamanho_lote = col_l2.selectbox("Tamanho", ["pequena", "media", "grande"], index=1, key="lote_tam")
+        layout_lote = col_l3.selectbox(
+            "Formato",
+            list(LAYOUTS.keys()) + ["zpl"],
+            format_func=lambda l: {"a4": "A4 (várias por folha)", "rolo": "Rolo (uma por página)"}.get(l, "ZPL (impressora térmica)"),
+            key="lote_layout"
+        )
+    
+        if origem_lote == "Categoria":
+            cat_lote = col_l1.selectbox("Categoria", sorted(df_p['Categoria'].unique().tolist()), key="lote_cat")
+            copias_lote = st.number_input("Cópias por item", min_value=1, max_value=500, value=1, key="lote_copias_cat")
+            sel_lote = df_p[df_p['Categoria'] == cat_lote]
+            itens_lote = [(c, d, copias_lote) for c, d in zip(sel_lote['Item'], sel_lote['Descrição'])]
+    
+        elif origem_lote == "Lista de produtos":
+            escolhidos = st.multiselect("Produtos", (df_p['Item'] + " - " + df_p['Descrição']).tolist(), key="lote_lista")
+            copias_lote = st.number_input("Cópias por item", min_value=1, max_value=500, value=1, key="lote_copias_lista")
+            itens_lote = [(e.split(" - ", 1)[0], e.split(" - ", 1)[1], copias_lote) for e in escolhidos]
+    
+        else:
+            entradas = df_m[df_m['tipo'] == 'Entrada'] if not df_m.empty else df_m
+            if entradas.empty:
+                st.info("Nenhuma entrada registrada.")
+            else:
+                dias_entrada = datas_movimentos(entradas).dt.strftime("%d/%m/%Y")
+                dias = sorted(dias_entrada.dropna().unique().tolist(), key=lambda d: d[6:] + d[3:5] + d[:2], reverse=True)
+                dia_lote = col_l1.selectbox("Dia da entrada", dias, key="lote_dia")
+                por_unidade = st.checkbox("Uma etiqueta por unidade recebida", value=True, key="lote_unidade")
+            
+                recebidos = entradas[dias_entrada == dia_lote].groupby('codigo', as_index=False)['quantidade'].sum()
+                desc_por_item = dict(zip(df_p['Item'], df_p['Descrição']))
+                itens_lote = [
+                    (c, desc_por_item.get(c, ""), max(1, int(q)) if por_unidade else 1)
+                    for c, q in zip(recebidos['codigo'], recebidos['quantidade'])
+                ]
+    
+        total_lote = sum(int(c) for _, _, c in itens_lote)
+        col_l1.caption(f"{total_lote} etiqueta(s) de {len(itens_lote)} item(ns)")
+    
+        if st.button("🖨️ Gerar Lote", type="primary", use_container_width=True, disabled=not itens_lote):
+            nome_lote = f"etiquetas_lote_{datetime.now().strftime('%Y%m%d_%H%M')}"
+            if layout_lote == "zpl":
+                # Texto puro enviado direto à impressora: sem rasterizar nada
+                st.download_button(
+                    label=f"🦓 Baixar ZPL ({total_lote} etiquetas)",
+                    data=montar_zpl(itens_lote, tamanho_lote),
+                    file_name=f"{nome_lote}.zpl",
+                    mime="text/plain",
+                    use_container_width=True
+                )
+            else:
+                with st.spinner("Renderizando etiquetas..."):
+                    pdf_lote = montar_pdf(itens_lote, tamanho_lote, layout_lote)
+                st.download_button(
+                    label=f"📄 Baixar PDF ({total_lote} etiquetas)",
+                    data=pdf_lote,
+                    file_name=f"{nome_lote}.pdf",
+                    mime="application/pdf",
+                    use_container_width=True
+                )
 
 # ABA 6: ADMIN (se for admin) - Índice muda para 5
 if nivel_usuario == "admin":
     with abas[5]:
-        st.subheader("🛠️ Gerenciamento Administrativo")
+        if abas[5].open:
+            st.subheader("🛠️ Gerenciamento Administrativo")
         
-        # Seção para exclusão de movimentações
-        st.markdown("### 🗑️ Excluir Movimentação")
-        if not df_m.empty:
-            id_del = st.selectbox("Selecione ID para excluir", df_m['id'].unique().tolist())
-            if st.button("❌ EXCLUIR REGISTRO", type="primary"):
-                df_m_nova = df_m[df_m['id'] != id_del]
-                conn.update(spreadsheet=URL_PLANILHA, worksheet="Movimentacoes", data=df_m_nova)
-                st.cache_data.clear()
-                st.rerun()
-        else:
-            st.info("Nenhuma movimentação para excluir.")
+            # Seção para exclusão de movimentações
+            st.markdown("### 🗑️ Excluir Movimentação")
+            if not df_m.empty:
+                id_del = st.selectbox("Selecione ID para excluir", df_m['id'].unique().tolist())
+                if st.button("❌ EXCLUIR REGISTRO", type="primary"):
+                    df_m_nova = df_m[df_m['id'] != id_del]
+                    fila_escrita().excluir("Movimentacoes", "id", [id_del])
+                    saldo.remover_movimentos(df_m[df_m['id'] == id_del], df_m_nova)
+                    st.rerun()
+            else:
+                st.info("Nenhuma movimentação para excluir.")
         
-        st.markdown("---")
+            st.markdown("---")
+        
+            # Seção de conferência do saldo materializado contra o recálculo completo
+            st.markdown("### 🧮 Verificar Saldos")
+            st.caption("Recalcula todo o histórico e compara com o saldo mantido em memória.")
+            if st.button("🔎 Verificar e Reparar Saldos"):
+                divergencias = saldo.verificar(df_p, df_m, df_f)
+                if divergencias.empty:
+                    st.success("✅ Nenhuma divergência encontrada.")
+                else:
+                    st.warning(f"⚠️ {len(divergencias)} item(ns) divergente(s). Saldo reconstruído.")
+                    st.dataframe(divergencias, use_container_width=True, hide_index=True)
+                    saldo.reconstruir(df_p, df_m, df_f)
+        
+            st.markdown("---")
+        
+            # Fechamento mensal: grava o saldo acumulado e arquiva os movimentos do período
+            st.markdown("### 📦 Fechamento Mensal")
+            ultimo_fech = periodo_fechamento(df_f)
+            st.caption(f"Último fechamento: {ultimo_fech % 100:02d}/{ultimo_fech // 100}" if ultimo_fech else "Nenhum fechamento realizado.")
+        
+            periodos_abertos = []
+            if not df_m.empty:
+                datas = datas_movimentos(df_m).dropna()
+                mes_atual = int(datetime.now().strftime("%Y%m"))
+                periodos = sorted(set((datas.dt.year * 100 + datas.dt.month).astype(int).tolist()))
+                periodos_abertos = [pr for pr in periodos if pr < mes_atual and (ultimo_fech is None or pr > ultimo_fech)]
+        
+            if periodos_abertos:
+                periodo_sel = st.selectbox(
+                    "Fechar até o mês",
+                    periodos_abertos,
+                    index=len(periodos_abertos) - 1,
+                    format_func=lambda pr: f"{pr % 100:02d}/{pr // 100}"
+                )
+                if st.button("🔒 Gerar Fechamento e Arquivar"):
+                    try:
+                        qtd_arquivada = fechar_periodo(df_m, df_f, periodo_sel)
+                        st.success(f"✅ Fechamento gravado. {qtd_arquivada} movimentação(ões) arquivada(s).")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(f"❌ Erro no fechamento: {e}")
+            else:
+                st.info("Nenhum mês encerrado pendente de fechamento.")
+        
+            st.markdown("---")
         
-        # Seção para editar/excluir produtos (mantida para admins, mas agora redundante com a aba 4)
-        st.markdown("### 📝 Gerenciar Produtos (Admin)")
-        st.info("Use a aba 'Cadastrar/Editar Item' para editar produtos de forma mais prática.")
+            # Seção para editar/excluir produtos (mantida para admins, mas agora redundante com a aba 4)
+            st.markdown("### 📝 Gerenciar Produtos (Admin)")
+            st.info("Use a aba 'Cadastrar/Editar Item' para editar produtos de forma mais prática.")
@@ -1,7 +1,11 @@
 import streamlit as st
-from streamlit_gsheets import GSheetsConnection
 import pandas as pd
 from datetime import datetime
+from dados import fila_escrita, versao, renumerar_sufixo, FORMATO_DATA
+from esquemas import carregar_aba
+from busca import indice_produtos
+from metricas import cronometrado
+from arquivo_pedidos import STATUS_CONCLUIDO, arquivar_concluidos, concluidos, periodos_arquivados, ler_arquivo, aba_arquivo
 
 # 1. SEGURANÇA E CONEXÃO
 if "logado" not in st.session_state or not st.session_state["logado"]:
@@ -16,270 +20,358 @@ if "carrinho" not in st.session_state:
 if "form_version" not in st.session_state:
     st.session_state["form_version"] = 0
 
-URL_PLANILHA = "https://docs.google.com/spreadsheets/d/1lIldvBHzJ3VIczDvZv-WRFtp3R7Jf5yfM2LrIlseshE/edit?usp=sharing"
-conn = st.connection("gsheets", type=GSheetsConnection)
 
+def sem_linhas_vazias(df_s):
+    # Remove linhas inúteis/vazias que costumam vir da planilha
+    return df_s[df_s["id_pedido"] != ""].reset_index(drop=True)
 
-def limpar_coluna_texto(df, coluna):
-    if coluna not in df.columns:
-        df[coluna] = ""
-    df[coluna] = df[coluna].fillna("").astype(str).str.strip()
-    df[coluna] = df[coluna].replace(["nan", "None", "NaN"], "")
-    return df
 
-
-@st.cache_data(ttl=300)
+@cronometrado("pedidos: carregar_dados_pedidos")
 def carregar_dados_pedidos():
+    # Tipos, status vazio = Pendente etc. definidos em esquemas.py
     try:
-        df_p = conn.read(spreadsheet=URL_PLANILHA, worksheet="Produtos").fillna("")
-        df_s = conn.read(spreadsheet=URL_PLANILHA, worksheet="Pedidos").fillna("")
-
-        # ===== PRODUTOS =====
-        for col in ["Item", "Descrição", "Categoria"]:
-            df_p = limpar_coluna_texto(df_p, col)
-
-        # ===== PEDIDOS =====
-        for col in ["id_pedido", "data", "usuario", "status", "loja", "item_codigo", "descricao"]:
-            df_s = limpar_coluna_texto(df_s, col)
-
-        if "quantidade" not in df_s.columns:
-            df_s["quantidade"] = 0
-
-        df_s["quantidade"] = pd.to_numeric(df_s["quantidade"], errors="coerce").fillna(0).astype(int)
-
-        # Remove linhas inúteis/vazias que costumam vir da planilha
-        if "id_pedido" in df_s.columns:
-            df_s = df_s[df_s["id_pedido"] != ""].copy()
-
-        return df_p, df_s
+        return carregar_aba("Produtos"), sem_linhas_vazias(carregar_aba("Pedidos"))
 
     except Exception as e:
         st.error(f"⚠️ Erro ao carregar a interface: {e}")
         return None, None
 
 
+@st.cache_data(max_entries=4)
+@cronometrado("pedidos: resumo_pedidos")
+def resumo_pedidos(token, _df_s):
+    """
+    Uma linha por pedido (índice = id_pedido): status, data, quantidade de
+    linhas, total de unidades e lojas. Calculado uma vez por versão da aba.
+    """
+    if _df_s.empty:
+        return pd.DataFrame(columns=["data", "usuario", "status", "linhas", "unidades", "lojas", "dia"])
+
+    grupos = _df_s.groupby("id_pedido", sort=False)
+    resumo = grupos.agg(
+        data=("data", "first"),
+        usuario=("usuario", "first"),
+        status=("status", "first"),
+        linhas=("item_codigo", "size"),
+        unidades=("quantidade", "sum"),
+    )
+    lojas = _df_s[_df_s["loja"] != ""].drop_duplicates(["id_pedido", "loja"])
+    resumo["lojas"] = lojas.groupby("id_pedido")["loja"].agg(", ".join).reindex(resumo.index).fillna("")
+    resumo["dia"] = resumo["data"].dt.date
+    resumo["data"] = resumo["data"].dt.strftime(FORMATO_DATA).fillna("")
+    return resumo.sort_index(ascending=False)
+
+
+token_pedidos = versao("Produtos", "Pedidos")
 df_p, df_s = carregar_dados_pedidos()
 
 if df_p is None:
     st.stop()
 
-# --- INTERFACE ---
-tab_novo, tab_hist = st.tabs(["🆕 Montar Pedido", "📜 Gestão e Envio"])
+indice = indice_produtos(versao("Produtos"), df_p)
 
-with tab_novo:
-    with st.container(border=True):
-        st.subheader("🔍 Localizar Produto")
+# Número do pedido só é confirmado depois da gravação (a fila pode renumerar)
+SEGUNDOS_AVISO_PEDIDO = 15
 
-        col_cat, col_txt = st.columns([1, 2])
 
-        with col_cat:
-            categorias_validas = [c for c in df_p["Categoria"].tolist() if str(c).strip() != ""]
-            cats = ["Todas"] + sorted(list(set(categorias_validas)))
-            cat_sel = st.selectbox("Filtrar Categoria", cats)
+@st.fragment(run_every=2)
+def aviso_pedido_enviado():
+    if not st.session_state.get("pedido_enviado"):
+        return
+    id_p, gravacao, concluido_em = st.session_state["pedido_enviado"]
+    if gravacao.gravadas is not None:
+        final = gravacao.gravadas["id_pedido"].iloc[0]
+        ajuste = f" (#{id_p} já existia, número ajustado)" if final != id_p else ""
+        st.success(f"Pedido #{final} registrado com sucesso!{ajuste}")
+    elif gravacao in fila_escrita().falhas:
+        st.error(f"❌ Pedido #{id_p} não foi gravado: {gravacao.erro}. Veja as gravações com falha na barra lateral.")
+    else:
+        st.info(f"⏳ Gravando pedido #{id_p}... o número pode mudar se outro pedido foi salvo no mesmo minuto.")
+        return
+    if concluido_em is None:
+        st.session_state["pedido_enviado"] = (id_p, gravacao, datetime.now())
+    elif (datetime.now() - concluido_em).total_seconds() > SEGUNDOS_AVISO_PEDIDO:
+        st.session_state["pedido_enviado"] = None
 
-        with col_txt:
-            busca_txt = st.text_input("Buscar por Código ou Descrição").strip().lower()
 
-        # Aplicando filtros no DataFrame de produtos
-        df_p_filtrado = df_p.copy()
+# --- INTERFACE ---
+# Só a aba aberta roda a cada rerun
+tab_novo, tab_hist = st.tabs(["🆕 Montar Pedido", "📜 Gestão e Envio"], key="abas_pedidos", on_change="rerun")
 
-        if cat_sel != "Todas":
-            df_p_filtrado = df_p_filtrado[df_p_filtrado["Categoria"] == cat_sel]
+with tab_novo:
+    if tab_novo.open:
+        aviso_pedido_enviado()
+        with st.container(border=True):
+            st.subheader("🔍 Localizar Produto")
 
-        if busca_txt:
-            filtro_item = df_p_filtrado["Item"].astype(str).str.lower().str.contains(busca_txt, na=False, regex=False)
-            filtro_desc = df_p_filtrado["Descrição"].astype(str).str.lower().str.contains(busca_txt, na=False, regex=False)
-            df_p_filtrado = df_p_filtrado[filtro_item | filtro_desc]
+            col_cat, col_txt = st.columns([1, 2])
 
-        if not df_p_filtrado.empty:
-            lista_prods = (
-                df_p_filtrado["Item"].astype(str).str.strip()
-                + " - "
-                + df_p_filtrado["Descrição"].astype(str).str.strip()
-            ).tolist()
+            with col_cat:
+                categorias_validas = [c for c in df_p["Categoria"].tolist() if str(c).strip() != ""]
+                cats = ["Todas"] + sorted(list(set(categorias_validas)))
+                cat_sel = st.selectbox("Filtrar Categoria", cats)
 
-            idx_edicao = 0
-            if "editando_item" in st.session_state:
-                try:
-                    idx_edicao = [
-                        i for i, s in enumerate(lista_prods)
-                        if s.startswith(st.session_state["editando_item"])
-                    ][0]
-                except Exception:
-                    idx_edicao = 0
+            with col_txt:
+                busca_txt = st.text_input("Buscar por Código ou Descrição").strip()
 
-            prod_sel = st.selectbox("Selecione o item para o pedido", lista_prods, index=idx_edicao)
+            # Aplicando filtros no DataFrame de produtos
+            df_p_filtrado = df_p
 
-            partes = prod_sel.split(" - ", 1)
-            cod_at = partes[0]
-            desc_at = partes[1] if len(partes) > 1 else ""
+            if cat_sel != "Todas":
+                df_p_filtrado = df_p_filtrado[df_p_filtrado["Categoria"] == cat_sel]
 
-            st.divider()
-            st.subheader(f"🏬 Quantidades para: {desc_at}")
-
-            lojas_qtds = {}
-            for r_idx in range(0, 20, 5):
-                cols = st.columns(5)
-                for i in range(5):
-                    id_loja = r_idx + i + 1
-                    nome_loja = f"Loja {id_loja:02d}"
-                    chave = f"tmp_{nome_loja}_v{st.session_state.form_version}"
-
-                    v_padrao = 0
-                    if "dados_edicao" in st.session_state and nome_loja in st.session_state["dados_edicao"]:
-                        try:
-                            v_padrao = int(st.session_state["dados_edicao"][nome_loja])
-                        except Exception:
-                            v_padrao = 0
-
-                    with cols[i]:
-                        cor_f = "#FFD700" if v_padrao > 0 else "transparent"
-                        st.markdown(
-                            f'<div style="background-color:{cor_f}; border-radius:4px; text-align:center;"><b>{nome_loja}</b></div>',
-                            unsafe_allow_html=True
-                        )
-                        lojas_qtds[nome_loja] = st.number_input(
-                            nome_loja,
-                            min_value=0,
-                            step=1,
-                            value=v_padrao,
-                            key=chave,
-                            label_visibility="collapsed"
-                        )
+            if busca_txt:
+                df_p_filtrado = indice.filtrar(df_p_filtrado, busca_txt)
 
-            txt_btn = "💾 Salvar Alterações" if "editando_item" in st.session_state else "➕ Adicionar à Lista"
+            if not df_p_filtrado.empty:
+                lista_prods = (
+                    df_p_filtrado["Item"].astype(str).str.strip()
+                    + " - "
+                    + df_p_filtrado["Descrição"].astype(str).str.strip()
+                ).tolist()
 
-            if st.button(txt_btn, use_container_width=True, type="primary"):
+                idx_edicao = 0
                 if "editando_item" in st.session_state:
-                    st.session_state["carrinho"] = [
-                        item for item in st.session_state["carrinho"]
-                        if item["item_codigo"] != st.session_state["editando_item"]
-                    ]
-                    del st.session_state["editando_item"]
-                    del st.session_state["dados_edicao"]
-
-                novos = [
-                    {
-                        "loja": l,
-                        "item_codigo": cod_at,
-                        "descricao": desc_at,
-                        "quantidade": int(q)
-                    }
-                    for l, q in lojas_qtds.items()
-                    if int(q) > 0
-                ]
-
-                if novos:
-                    st.session_state["carrinho"].extend(novos)
-                    st.session_state["form_version"] += 1
-                    st.success(f"Item {cod_at} adicionado!")
-                    st.rerun()
-                else:
-                    st.warning("Informe ao menos uma quantidade maior que zero.")
-
-    # --- LISTAGEM DO CARRINHO ---
-    if st.session_state["carrinho"]:
-        st.divider()
-        st.subheader("📋 Resumo do Pedido Atual")
-        df_c = pd.DataFrame(st.session_state["carrinho"])
-
-        if not df_c.empty:
-            df_c["quantidade"] = pd.to_numeric(df_c["quantidade"], errors="coerce").fillna(0).astype(int)
-
-            for cod in df_c["item_codigo"].unique():
-                d_item = df_c[df_c["item_codigo"] == cod]
-
-                with st.container(border=True):
-                    c_t, c_e, c_c = st.columns([3, 1, 1])
-                    c_t.markdown(f"**Item: {cod}** | Total: **{int(d_item['quantidade'].sum())}** un")
-
-                    if c_e.button("📝 Editar", key=f"ed_{cod}"):
-                        st.session_state["editando_item"] = cod
-                        st.session_state["dados_edicao"] = d_item.set_index("loja")["quantidade"].to_dict()
-                        st.rerun()
-
-                    if c_c.button("❌", key=f"can_{cod}"):
+                    try:
+                        idx_edicao = [
+                            i for i, s in enumerate(lista_prods)
+                            if s.startswith(st.session_state["editando_item"])
+                        ][0]
+                    except Exception:
+                        idx_edicao = 0
+
+                prod_sel = st.selectbox("Selecione o item para o pedido", lista_prods, index=idx_edicao)
+
+                partes = prod_sel.split(" - ", 1)
+                cod_at = partes[0]
+                desc_at = partes[1] if len(partes) > 1 else ""
+
+                st.divider()
+                st.subheader(f"🏬 Quantidades para: {desc_at}")
+
+                lojas_qtds = {}
+                for r_idx in range(0, 20, 5):
+                    cols = st.columns(5)
+                    for i in range(5):
+                        id_loja = r_idx + i + 1
+                        nome_loja = f"Loja {id_loja:02d}"
+                        chave = f"tmp_{nome_loja}_v{st.session_state.form_version}"
+
+                        v_padrao = 0
+                        if "dados_edicao" in st.session_state and nome_loja in st.session_state["dados_edicao"]:
+                            try:
+                                v_padrao = int(st.session_state["dados_edicao"][nome_loja])
+                            except Exception:
+                                v_padrao = 0
+
+                        with cols[i]:
+                            cor_f = "#FFD700" if v_padrao > 0 else "transparent"
+                            st.markdown(
+                                f'<div style="background-color:{cor_f}; border-radius:4px; text-align:center;"><b>{nome_loja}</b></div>',
+                                unsafe_allow_html=True
+                            )
+                            lojas_qtds[nome_loja] = st.number_input(
+                                nome_loja,
+                                min_value=0,
+                                step=1,
+                                value=v_padrao,
+                                key=chave,
+                                label_visibility="collapsed"
+                            )
+
+                txt_btn = "💾 Salvar Alterações" if "editando_item" in st.session_state else "➕ Adicionar à Lista"
+
+                if st.button(txt_btn, use_container_width=True, type="primary"):
+                    if "editando_item" in st.session_state:
                         st.session_state["carrinho"] = [
-                            i for i in st.session_state["carrinho"]
-                            if i["item_codigo"] != cod
+                            item for item in st.session_state["carrinho"]
+                            if item["item_codigo"] != st.session_state["editando_item"]
                         ]
+                        del st.session_state["editando_item"]
+                        del st.session_state["dados_edicao"]
+
+                    novos = [
+                        {
+                            "loja": l,
+                            "item_codigo": cod_at,
+                            "descricao": desc_at,
+                            "quantidade": int(q)
+                        }
+                        for l, q in lojas_qtds.items()
+                        if int(q) > 0
+                    ]
+
+                    if novos:
+                        st.session_state["carrinho"].extend(novos)
+                        st.session_state["form_version"] += 1
+                        st.success(f"Item {cod_at} adicionado!")
                         st.rerun()
+                    else:
+                        st.warning("Informe ao menos uma quantidade maior que zero.")
 
-        if st.button("💾 FINALIZAR E SALVAR PEDIDO", type="primary", use_container_width=True):
-            id_p = datetime.now().strftime("%Y%m%d%H%M")
+        # --- LISTAGEM DO CARRINHO ---
+        if st.session_state["carrinho"]:
+            st.divider()
+            st.subheader("📋 Resumo do Pedido Atual")
+            df_c = pd.DataFrame(st.session_state["carrinho"])
 
-            df_final = pd.DataFrame(st.session_state["carrinho"]).copy()
-            df_final["quantidade"] = pd.to_numeric(df_final["quantidade"], errors="coerce").fillna(0).astype(int)
-            df_final["id_pedido"] = str(id_p)
-            df_final["data"] = datetime.now().strftime("%d/%m/%Y %H:%M")
-            df_final["usuario"] = str(st.session_state.get("usuario_nome", "Admin")).strip()
-            df_final["status"] = "Pendente"
+            if not df_c.empty:
+                df_c["quantidade"] = pd.to_numeric(df_c["quantidade"], errors="coerce").fillna(0).astype(int)
 
-            # Alinha colunas antes do concat
-            colunas = sorted(set(df_s.columns.tolist()) | set(df_final.columns.tolist()))
-            df_s_alinhado = df_s.reindex(columns=colunas, fill_value="")
-            df_final_alinhado = df_final.reindex(columns=colunas, fill_value="")
+                for cod in df_c["item_codigo"].unique():
+                    d_item = df_c[df_c["item_codigo"] == cod]
 
-            df_atualizado = pd.concat([df_s_alinhado, df_final_alinhado], ignore_index=True)
+                    with st.container(border=True):
+                        c_t, c_e, c_c = st.columns([3, 1, 1])
+                        c_t.markdown(f"**Item: {cod}** | Total: **{int(d_item['quantidade'].sum())}** un")
 
-            conn.update(spreadsheet=URL_PLANILHA, worksheet="Pedidos", data=df_atualizado)
+                        if c_e.button("📝 Editar", key=f"ed_{cod}"):
+                            st.session_state["editando_item"] = cod
+                            st.session_state["dados_edicao"] = d_item.set_index("loja")["quantidade"].to_dict()
+                            st.rerun()
 
-            st.cache_data.clear()
-            st.session_state["carrinho"] = []
-            st.success(f"Pedido #{id_p} registrado com sucesso!")
-            st.rerun()
+                        if c_c.button("❌", key=f"can_{cod}"):
+                            st.session_state["carrinho"] = [
+                                i for i in st.session_state["carrinho"]
+                                if i["item_codigo"] != cod
+                            ]
+                            st.rerun()
 
-# --- ABA 2: GESTÃO ---
-with tab_hist:
-    st.subheader("📜 Histórico e Status")
+            if st.button("💾 FINALIZAR E SALVAR PEDIDO", type="primary", use_container_width=True):
+                id_p = datetime.now().strftime("%Y%m%d%H%M")
 
-    if df_s.empty:
-        st.info("Nenhum pedido registrado no banco de dados.")
-    else:
-        if "status" not in df_s.columns:
-            df_s["status"] = "Pendente"
+                df_final = pd.DataFrame(st.session_state["carrinho"]).copy()
+                df_final["quantidade"] = pd.to_numeric(df_final["quantidade"], errors="coerce").fillna(0).astype(int)
+                df_final["id_pedido"] = str(id_p)
+                df_final["data"] = datetime.now().strftime("%d/%m/%Y %H:%M")
+                df_final["usuario"] = str(st.session_state.get("usuario_nome", "Admin")).strip()
+                df_final["status"] = "Pendente"
 
-        df_s["status"] = df_s["status"].replace("", "Pendente")
+                # Envia só as linhas do novo pedido (append), sem regravar o histórico.
+                # Dois pedidos no mesmo minuto: o segundo ganha sufixo (-2, -3...)
+                gravacao = fila_escrita().anexar("Pedidos", df_final, chave="id_pedido", renumerar=renumerar_sufixo("id_pedido"))
 
-        # Tudo como texto antes de agrupar/ordenar
-        for col in ["id_pedido", "data", "status"]:
-            df_s = limpar_coluna_texto(df_s, col)
+                st.session_state["carrinho"] = []
+                st.session_state["pedido_enviado"] = (id_p, gravacao, None)
+                st.rerun()
 
-        df_s = df_s[df_s["id_pedido"] != ""].copy()
+# --- ABA 2: GESTÃO ---
+PEDIDOS_POR_PAGINA = 20
+
+with tab_hist:
+    if tab_hist.open:
+        st.subheader("📜 Histórico e Status")
+
+        resumo = resumo_pedidos(token_pedidos, df_s)
+
+        # Concluídos marcados direto na planilha ainda estão na aba ativa
+        if st.session_state.get("nivel") == "admin" and not df_s.empty and concluidos(df_s).any():
+            n_fechados = df_s.loc[concluidos(df_s), "id_pedido"].nunique()
+            if st.button(f"📦 Arquivar {n_fechados} pedido(s) concluído(s)", use_container_width=True):
+                arquivar_concluidos(df_s)
+                st.rerun()
 
-        if df_s.empty:
-            st.info("Nenhum pedido válido encontrado.")
+        if resumo.empty:
+            st.info("Nenhum pedido registrado no banco de dados.")
         else:
-            peds = (
-                df_s.groupby(["id_pedido", "data"], dropna=False)
-                .first()
-                .reset_index()
-                .sort_values("id_pedido", ascending=False)
-            )
-
-            for _, p in peds.iterrows():
-                pedido_id = str(p["id_pedido"]).strip()
-                status = df_s[df_s["id_pedido"] == pedido_id]["status"].iloc[0]
-
-                icon = "🟡" if status == "Pendente" else "🚚" if status == "Em Separação" else "✅"
-
-                with st.container(border=True):
-                    c1, c2, c3 = st.columns([3, 1.5, 0.5])
-                    c1.markdown(f"#### {icon} Pedido: `{pedido_id}`")
-                    c1.caption(f"📅 {p['data']} | Status: **{status}**")
-
-                    if status == "Pendente":
-                        if c2.button("🚀 Iniciar Separação", key=f"env_{pedido_id}", use_container_width=True):
-                            df_s.loc[df_s["id_pedido"] == pedido_id, "status"] = "Em Separação"
-                            conn.update(spreadsheet=URL_PLANILHA, worksheet="Pedidos", data=df_s)
-                            st.cache_data.clear()
-                            st.rerun()
-                    else:
-                        c2.info(f"Ocupado: {status}")
+            # Filtros aplicados sobre o resumo (uma linha por pedido), não sobre os itens
+            f1, f2, f3 = st.columns([1.5, 1.5, 1])
+            status_opcoes = sorted(resumo["status"].unique().tolist())
+            # Filtros vazios = sem filtro: o estado dos widgets (key) não guarda
+            # uma seleção antiga que esconderia pedidos/status que chegarem depois
+            status_sel = f1.multiselect("Status", status_opcoes, key="filtro_status", placeholder="Todos")
+
+            dias_validos = resumo["dia"].dropna()
+            periodo = ()
+            if not dias_validos.empty:
+                periodo = f2.date_input(
+                    "Período",
+                    value=(),
+                    format="DD/MM/YYYY",
+                    key="filtro_periodo",
+                    help=f"Pedidos de {dias_validos.min():%d/%m/%Y} a {dias_validos.max():%d/%m/%Y}; vazio mostra todos",
+                )
+            busca_ped = f3.text_input("Pedido / usuário", key="filtro_pedido").strip().lower()
+
+            filtro = resumo["status"].isin(status_sel) if status_sel else pd.Series(True, index=resumo.index)
+            if len(periodo) == 2:
+                # Pedidos sem data válida continuam visíveis
+                filtro &= resumo["dia"].isna() | resumo["dia"].between(periodo[0], periodo[1])
+            if busca_ped:
+                filtro &= (
+                    resumo.index.str.lower().str.contains(busca_ped, regex=False)
+                    | resumo["usuario"].str.lower().str.contains(busca_ped, regex=False)
+                )
+            filtrados = resumo[filtro]
+
+            if filtrados.empty:
+                st.info("Nenhum pedido encontrado com esses filtros.")
+            else:
+                n_paginas = (len(filtrados) - 1) // PEDIDOS_POR_PAGINA + 1
+                if st.session_state.get("pagina_pedidos", 1) > n_paginas:
+                    st.session_state["pagina_pedidos"] = 1
+
+                p1, p2 = st.columns([1, 3])
+                pagina = p1.number_input("Página", min_value=1, max_value=n_paginas, step=1, key="pagina_pedidos")
+                p2.caption(f"{len(filtrados)} pedido(s) de {len(resumo)} | página {pagina} de {n_paginas}")
+
+                inicio = (pagina - 1) * PEDIDOS_POR_PAGINA
+                for pedido_id, p in filtrados.iloc[inicio:inicio + PEDIDOS_POR_PAGINA].iterrows():
+                    status = p["status"]
+
+                    icon = "🟡" if status == "Pendente" else "🚚" if status == "Em Separação" else "✅"
+
+                    with st.container(border=True):
+                        c1, c2, c3 = st.columns([3, 1.5, 0.5])
+                        c1.markdown(f"#### {icon} Pedido: `{pedido_id}`")
+                        c1.caption(
+                            f"📅 {p['data']} | Status: **{status}** | "
+                            f"{p['linhas']} linha(s), {int(p['unidades'])} un | 🏪 {p['lojas'] or '-'}"
+                        )
 
-                    if st.session_state.get("nivel") == "admin":
-                        if c3.button("🗑️", key=f"del_{pedido_id}"):
-                            df_upd = df_s[df_s["id_pedido"] != pedido_id].copy()
-                            conn.update(spreadsheet=URL_PLANILHA, worksheet="Pedidos", data=df_upd)
-                            st.cache_data.clear()
-                            st.rerun()
+                        if status == "Pendente":
+                            if c2.button("🚀 Iniciar Separação", key=f"env_{pedido_id}", use_container_width=True):
+                                # Só as células de status deste pedido, se ainda estiver pendente
+                                fila_escrita().atualizar(
+                                    "Pedidos", "id_pedido", [pedido_id], {"status": "Em Separação"},
+                                    esperado={"status": ["Pendente", ""]}
+                                )
+                                st.rerun()
+                        elif status == "Em Separação":
+                            if c2.button("✅ Concluir", key=f"fim_{pedido_id}", use_container_width=True):
+                                # Concluído sai da aba ativa e vai para o arquivo do mês
+                                df_s.loc[df_s["id_pedido"] == pedido_id, "status"] = STATUS_CONCLUIDO
+                                arquivar_concluidos(df_s)
+                                st.rerun()
+                        else:
+                            c2.info(f"Ocupado: {status}")
+
+                        if st.session_state.get("nivel") == "admin":
+                            if c3.button("🗑️", key=f"del_{pedido_id}"):
+                                fila_escrita().excluir("Pedidos", "id_pedido", [pedido_id])
+                                st.rerun()
+
+        # Consulta ao arquivo: só baixa a aba do mês escolhido
+        with st.expander("🗄️ Pedidos arquivados"):
+            periodos = periodos_arquivados(versao("Pedidos"))
+            if not periodos:
+                st.info("Nenhum pedido arquivado ainda.")
+            else:
+                periodo_arq = st.selectbox(
+                    "Mês", periodos, format_func=lambda p: f"{p[4:]}/{p[:4]}", key="periodo_arquivo"
+                )
+                df_arq = sem_linhas_vazias(ler_arquivo(periodo_arq))
+
+                resumo_arq = resumo_pedidos(versao(aba_arquivo(periodo_arq)), df_arq)
+                st.dataframe(
+                    resumo_arq.drop(columns="dia").reset_index(),
+                    hide_index=True,
+                    use_container_width=True
+                )
+                ped_arq = st.selectbox("Ver itens do pedido", ["-"] + resumo_arq.index.tolist(), key="pedido_arquivo")
+                if ped_arq != "-":
+                    st.dataframe(
+                        df_arq.loc[df_arq["id_pedido"] == ped_arq, ["loja", "item_codigo", "descricao", "quantidade"]],
+                        hide_index=True,
+                        use_container_width=True
+                    )
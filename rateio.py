@@ -0,0 +1,106 @@
+import numpy as np
+import pandas as pd
+
+# MOTOR DE RATEIO DA SEPARAÇÃO (VETORIZADO, SEM PERDA DE UNIDADES)
+
+
+def _maior_resto(grupo, peso, total, n_grupos):
+    """
+    Distribui `total[g]` unidades inteiras entre as linhas de cada grupo,
+    proporcionalmente a `peso`, pelo método do maior resto.
+    Retorna (alocado por linha, total efetivamente distribuído por grupo).
+    """
+    soma = np.bincount(grupo, weights=peso, minlength=n_grupos)
+    total = np.where(soma > 0, total, 0).astype(np.int64)
+
+    cota = np.zeros(len(peso))
+    com_peso = soma[grupo] > 0
+    cota[com_peso] = peso[com_peso] * total[grupo][com_peso] / soma[grupo][com_peso]
+
+    base = np.floor(cota + 1e-9).astype(np.int64)
+    falta = total - np.bincount(grupo, weights=base, minlength=n_grupos).astype(np.int64)
+
+    # Ordena dentro de cada grupo: maior resto primeiro, desempate pelo maior pedido
+    resto = cota - base
+    ordem = np.lexsort((-peso, -resto, grupo))
+    g_ord = grupo[ordem]
+    inicio = np.searchsorted(g_ord, g_ord, side="left")
+    posicao = np.arange(len(ordem)) - inicio
+    extra = (posicao < falta[g_ord]) & (peso[ordem] > 0)
+
+    alocado = base.copy()
+    alocado[ordem] += extra.astype(np.int64)
+    return alocado, total
+
+
+def ratear_grupos(grupo, pedido, recebido, fixo=None, embalagem=None):
+    """
+    Rateio de vários itens de uma vez.
+
+    grupo      -- índice do item (0..G-1) de cada linha (loja)
+    pedido     -- quantidade pedida por linha
+    recebido   -- quantidade recebida por item (tamanho G)
+    fixo       -- linhas de lojas fixas (recebem o pedido integral, se houver saldo)
+    embalagem  -- múltiplo de embalagem por item (tamanho G); 1 = unidade
+
+    Retorna (qtd_final por linha, sobra não distribuída por item).
+    """
+    grupo = np.asarray(grupo, dtype=np.int64)
+    pedido = np.nan_to_num(np.asarray(pedido, dtype=float)).clip(min=0)
+    recebido = np.nan_to_num(np.asarray(recebido, dtype=float)).clip(min=0).astype(np.int64)
+    n_grupos = len(recebido)
+    fixo = np.zeros(len(grupo), dtype=bool) if fixo is None else np.asarray(fixo, dtype=bool)
+    embalagem = np.ones(n_grupos, dtype=np.int64) if embalagem is None else np.asarray(embalagem, dtype=np.int64).clip(min=1)
+
+    # 1. Lojas fixas: pedido integral (ou rateio entre elas se o recebido não cobrir)
+    soma_fixas = np.bincount(grupo, weights=pedido * fixo, minlength=n_grupos)
+    total_fixas = np.minimum(np.ceil(soma_fixas - 1e-9).astype(np.int64), recebido)
+    qtd_fixas, total_fixas = _maior_resto(grupo, pedido * fixo, total_fixas, n_grupos)
+
+    # 2. Demais lojas: o restante, em embalagens fechadas, proporcional ao pedido
+    restante = recebido - total_fixas
+    embalagens = restante // embalagem
+    qtd_emb, distribuidas = _maior_resto(grupo, pedido * ~fixo, embalagens, n_grupos)
+
+    qtd_final = np.where(fixo, qtd_fixas, qtd_emb * embalagem[grupo])
+    sobra = restante - distribuidas * embalagem
+    return qtd_final, sobra
+
+
+def multiplo_embalagem(valor):
+    """Converte a coluna Embalagem em múltiplo inteiro (texto como 'CX' vale 1)."""
+    n = pd.to_numeric(pd.Series(valor), errors="coerce").fillna(1)
+    return n.where(n >= 1, 1).astype(int).to_numpy()
+
+
+def ratear_pedido(linhas, recebidos, lojas_fixas=None, embalagens=None):
+    """
+    Rateia todos os itens de um pedido em uma única passada.
+
+    linhas       -- DataFrame com 'item_codigo', 'loja' e 'quantidade'
+    recebidos    -- dict código -> quantidade recebida (ausente = total pedido)
+    lojas_fixas  -- dict código -> lojas fixas daquele item
+    embalagens   -- dict código -> múltiplo de embalagem
+
+    Retorna (cópia de `linhas` com 'qtd_final', Series de sobra por código).
+    """
+    df = linhas.copy()
+    df['quantidade'] = pd.to_numeric(df['quantidade'], errors='coerce').fillna(0)
+    codigos, grupo = np.unique(df['item_codigo'].astype(str).to_numpy(), return_inverse=True)
+
+    recebidos = recebidos or {}
+    pedido_total = np.bincount(grupo, weights=df['quantidade'].to_numpy(), minlength=len(codigos))
+    recebido = np.array([recebidos.get(c, t) for c, t in zip(codigos, pedido_total)], dtype=float)
+
+    fixo = None
+    if lojas_fixas:
+        pares = {(c, l) for c, lojas in lojas_fixas.items() for l in lojas}
+        fixo = [(c, l) in pares for c, l in zip(df['item_codigo'].astype(str), df['loja'])]
+
+    emb = None
+    if embalagens:
+        emb = np.array([embalagens.get(c, 1) for c in codigos])
+
+    qtd_final, sobra = ratear_grupos(grupo, df['quantidade'].to_numpy(), recebido, fixo, emb)
+    df['qtd_final'] = qtd_final
+    return df, pd.Series(sobra, index=codigos)
@@ -0,0 +1,229 @@
+import threading
+import streamlit as st
+import pandas as pd
+from dados import anexar_linhas, excluir_linhas, fila_escrita, FORMATO_DATA
+
+# SALDO DE ESTOQUE MATERIALIZADO (ATUALIZADO POR DELTA)
+TIPOS_SALDO = ["Entrada", "Saída"]
+COLUNAS_SALDO = TIPOS_SALDO + ["Saldo_Atual"]
+
+# Fechamentos mensais: Entrada/Saída acumuladas por código até o fim do período
+ABA_FECHAMENTOS = "Saldos_Fechamento"
+ABA_ARQUIVO_MOV = "Movimentacoes_Arquivo"
+
+
+def totais_movimentos(m):
+    """Soma Entrada/Saída por código. Index = código (string)."""
+    if m.empty or 'codigo' not in m.columns:
+        return pd.DataFrame(columns=TIPOS_SALDO, dtype=float)
+
+    validos = m[m['tipo'].isin(TIPOS_SALDO)]
+    qtd = pd.to_numeric(validos['quantidade'], errors='coerce').fillna(0)
+    resumo = qtd.groupby([validos['codigo'].astype(str), validos['tipo']], observed=True).sum().unstack(fill_value=0)
+    resumo = resumo.reindex(columns=TIPOS_SALDO, fill_value=0).astype(float)
+    resumo.index = resumo.index.astype(str)
+    return resumo
+
+
+# --- FECHAMENTOS (SNAPSHOTS) ---
+def datas_movimentos(m):
+    if pd.api.types.is_datetime64_any_dtype(m['data']):
+        return m['data']  # já convertida pelo esquema
+    return pd.to_datetime(m['data'].astype(str).str.strip(), format=FORMATO_DATA, errors='coerce')
+
+
+def _corte(periodo):
+    # periodo = AAAAMM (inteiro, para a planilha não converter em data)
+    return pd.Timestamp(year=periodo // 100, month=periodo % 100, day=1) + pd.DateOffset(months=1)
+
+
+def periodo_fechamento(f):
+    """Período (AAAAMM) do fechamento mais recente, ou None."""
+    if f is None or f.empty or 'periodo' not in f.columns:
+        return None
+    periodos = pd.to_numeric(f['periodo'], errors='coerce').dropna()
+    return int(periodos.max()) if not periodos.empty else None
+
+
+def ultimo_fechamento(f):
+    """Retorna (periodo, totais por código) do fechamento mais recente."""
+    periodo = periodo_fechamento(f)
+    if periodo is None:
+        return None, pd.DataFrame(columns=TIPOS_SALDO, dtype=float)
+
+    ult = f[pd.to_numeric(f['periodo'], errors='coerce') == periodo]
+    totais = ult[TIPOS_SALDO].apply(pd.to_numeric, errors='coerce').fillna(0).astype(float)
+    totais.index = ult['codigo'].astype(str).str.strip()
+    return periodo, totais.groupby(level=0).sum()
+
+
+def movimentos_apos(m, periodo):
+    """Movimentos ainda não consolidados no fechamento (datas inválidas ficam sempre ativas)."""
+    if periodo is None or m.empty:
+        return m
+    return m[~(datas_movimentos(m) < _corte(periodo))]
+
+
+def gerar_fechamento(m, f, periodo):
+    """
+    Calcula o fechamento do período e separa o que sai da aba ativa.
+    Retorna (linhas do fechamento, movimentos a arquivar).
+    """
+    anterior, totais_ant = ultimo_fechamento(f)
+    if anterior is not None and periodo <= anterior:
+        raise ValueError(f"Já existe fechamento para {anterior}.")
+
+    antigos = datas_movimentos(m) < _corte(periodo)
+    pendentes = movimentos_apos(m[antigos], anterior)
+    totais = totais_ant.add(totais_movimentos(pendentes), fill_value=0)
+
+    linhas = totais.reset_index(names='codigo')
+    linhas.insert(0, 'periodo', periodo)
+    return linhas, m[antigos]
+
+
+def fechar_periodo(m, f, periodo):
+    """Grava o fechamento, arquiva os movimentos antigos e os remove da aba ativa."""
+    # Lançamentos ainda na fila entram na planilha antes de arquivar
+    fila_escrita().aguardar()
+    linhas, arquivar = gerar_fechamento(m, f, periodo)
+    # A ordem importa: com o fechamento gravado, movimentos antigos que
+    # sobrarem na aba ativa já são ignorados pelo cálculo de saldo.
+    # chave='periodo' recusa um segundo fechamento gravado por outra sessão.
+    anexar_linhas(ABA_FECHAMENTOS, linhas, criar=True, chave='periodo')
+    anexar_linhas(ABA_ARQUIVO_MOV, arquivar, criar=True)
+    # Remove só as linhas arquivadas: lançamentos feitos enquanto isso ficam
+    excluir_linhas("Movimentacoes", 'id', arquivar['id'])
+    return len(arquivar)
+
+
+def _montar_saldo(p, totais):
+    # Junta o cadastro com os totais (O(produtos), sem tocar no histórico)
+    p_result = p.copy()
+    p_result['Estoque_Inicial'] = pd.to_numeric(p_result['Estoque_Inicial'], errors='coerce').fillna(0)
+    valores = totais.reindex(p_result['Item'].astype(str)).fillna(0)
+    p_result['Entrada'] = valores['Entrada'].to_numpy()
+    p_result['Saída'] = valores['Saída'].to_numpy()
+    p_result['Saldo_Atual'] = p_result['Estoque_Inicial'] + p_result['Entrada'] - p_result['Saída']
+    return p_result
+
+
+def _totais_com_fechamento(m, f):
+    periodo, base = ultimo_fechamento(f)
+    return periodo, base.add(totais_movimentos(movimentos_apos(m, periodo)), fill_value=0)
+
+
+def calcular_estoque(p, m, f=None):
+    """Recálculo completo (último fechamento + movimentos posteriores). Usado só para verificação/reparo."""
+    return _montar_saldo(p, _totais_com_fechamento(m, f)[1])
+
+
+class SaldoMaterializado:
+    """
+    Tabela de saldo por item mantida em memória (compartilhada pelo processo).
+    Lançamentos e exclusões aplicam apenas a diferença; o histórico completo
+    só é reprocessado quando a planilha diverge do que já foi consolidado.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totais = None          # Entrada/Saída por código (todos os códigos)
+        self.tabela = None          # Cadastro + Entrada, Saída, Saldo_Atual
+        self._produtos = None       # Item/Estoque_Inicial usados na tabela
+        self._n_movimentos = 0
+        self._ultimo_id = None
+        self._periodo = None        # Fechamento usado como ponto de partida
+
+    @staticmethod
+    def _id(valor):
+        # A planilha pode devolver o id como número ("20240101120000.0")
+        texto = str(valor).strip()
+        return texto[:-2] if texto.endswith(".0") else texto
+
+    def _ultimo(self, m):
+        if m.empty or 'id' not in m.columns:
+            return None
+        return self._id(m['id'].iloc[-1])
+
+    def _chave_produtos(self, p):
+        return p[['Item', 'Estoque_Inicial']].astype(str)
+
+    def reconstruir(self, p, m, f=None):
+        with self._lock:
+            self._periodo, self.totais = _totais_com_fechamento(m, f)
+            self._n_movimentos = len(m)
+            self._ultimo_id = self._ultimo(m)
+            self._produtos = self._chave_produtos(p)
+            self.tabela = _montar_saldo(p, self.totais)
+            return self.tabela
+
+    def _somar(self, m, sinal):
+        delta = totais_movimentos(m) * sinal
+        if delta.empty:
+            return
+        self.totais = self.totais.add(delta, fill_value=0)
+        if self.tabela is not None:
+            tabela = self.tabela.copy()
+            afetados = tabela['Item'].astype(str).isin(delta.index)
+            codigos = tabela.loc[afetados, 'Item'].astype(str)
+            valores = self.totais.reindex(codigos).fillna(0)
+            tabela.loc[afetados, 'Entrada'] = valores['Entrada'].to_numpy()
+            tabela.loc[afetados, 'Saída'] = valores['Saída'].to_numpy()
+            tabela.loc[afetados, 'Saldo_Atual'] = (
+                tabela.loc[afetados, 'Estoque_Inicial'] + tabela.loc[afetados, 'Entrada'] - tabela.loc[afetados, 'Saída']
+            )
+            self.tabela = tabela
+
+    def aplicar_movimentos(self, novos):
+        """Soma ao saldo os movimentos recém-lançados."""
+        if self.totais is None or novos.empty:
+            return
+        with self._lock:
+            self._somar(novos, 1)
+            self._n_movimentos += len(novos)
+            self._ultimo_id = self._ultimo(novos)
+
+    def remover_movimentos(self, removidos, restante):
+        """Desfaz no saldo os movimentos excluídos. `restante` é a aba já sem eles."""
+        if self.totais is None or removidos.empty:
+            return
+        with self._lock:
+            self._somar(removidos, -1)
+            self._n_movimentos = len(restante)
+            self._ultimo_id = self._ultimo(restante)
+
+    def sincronizar(self, p, m, f=None):
+        """Retorna o saldo atual, consolidando só o que mudou desde a última chamada."""
+        if self.totais is None or periodo_fechamento(f) != self._periodo:
+            return self.reconstruir(p, m, f)
+
+        n = self._n_movimentos
+        if len(m) < n or (n and self._id(m['id'].iloc[n - 1]) != self._ultimo_id):
+            # Histórico alterado fora do app: reprocessa tudo
+            return self.reconstruir(p, m, f)
+
+        if len(m) > n:
+            # Movimentos lançados por outra sessão: consolida só a cauda
+            self.aplicar_movimentos(m.iloc[n:])
+
+        if not self._chave_produtos(p).equals(self._produtos):
+            with self._lock:
+                self._produtos = self._chave_produtos(p)
+                self.tabela = _montar_saldo(p, self.totais)
+
+        return self.tabela
+
+    def verificar(self, p, m, f=None):
+        """Compara a tabela materializada com o recálculo completo e devolve as divergências."""
+        completo = calcular_estoque(p, m, f)
+        atual = self.sincronizar(p, m, f)
+        diferentes = (atual[COLUNAS_SALDO].to_numpy() - completo[COLUNAS_SALDO].to_numpy())
+        diferentes = abs(diferentes).max(axis=1) > 1e-9 if len(completo) else []
+        divergencias = completo.loc[diferentes, ['Item', 'Descrição'] + COLUNAS_SALDO].copy()
+        divergencias['Saldo_Materializado'] = atual.loc[diferentes, 'Saldo_Atual'].to_numpy()
+        return divergencias
+
+
+@st.cache_resource
+def obter_saldo():
+    return SaldoMaterializado()